@@ -0,0 +1,3 @@
+"""
+Benchmarks over synthetic agency data
+"""
@@ -0,0 +1,167 @@
+"""
+Measure what streamlit_app.py costs to import, per phase, with Python's
+-X importtime, and write the report as JSON.
+
+    python -m benchmarks.import_profile --output imports.json
+    python -m benchmarks.import_profile --baseline imports.json
+
+Phases run in order in one fresh interpreter, so a phase only pays for the
+modules earlier phases did not load:
+    startup  what every worker imports before the page renders
+    submit   what the first submit imports (prewarmed in the background)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List, Optional
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = {
+    "startup": [
+        "streamlit",
+        "yaml",
+        "src.rag_helper.streaming",
+        "src.utilities.logger",
+        "src.utilities.metrics",
+        "src.utilities.prewarm",
+        "src.utilities.tracing",
+    ],
+    "submit": [
+        "src.geo_helper.geo_helper",
+        "src.rag_helper.pipeline_registry",
+    ],
+}
+
+PHASE_MARKER = "phase:"
+
+
+def _phase_script(phases: Dict[str, List[str]]) -> str:
+    # Everything before the first marker is interpreter startup (site, ...).
+    lines = ["import sys, time", f"sys.stderr.write('{PHASE_MARKER}interpreter:0\\n')"]
+    for phase, modules in phases.items():
+        lines.append("start = time.perf_counter()")
+        lines += [f"import {name}" for name in modules]
+        lines.append(
+            f"sys.stderr.write('{PHASE_MARKER}{phase}:%f\\n' % (time.perf_counter() - start))"
+        )
+    return "\n".join(lines)
+
+
+def parse_importtime(stderr: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Split ``-X importtime`` output into phases: each phase's wall time and
+    the modules it imported (self and cumulative microseconds, nesting depth).
+    """
+    phases: Dict[str, Dict[str, Any]] = {}
+    rows: List[Dict[str, Any]] = []
+    for line in stderr.splitlines():
+        if line.startswith(PHASE_MARKER):
+            _, phase, seconds = line.split(":")
+            phases[phase] = {"wall_s": float(seconds), "modules": rows}
+            rows = []
+        elif line.startswith("import time:") and "self [us]" not in line:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            rows.append({
+                "module": name.strip(),
+                "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                "self_us": int(self_us),
+                "cumulative_us": int(cumulative_us),
+            })
+    return phases
+
+
+def profile_once(phases: Dict[str, List[str]]) -> Dict[str, Dict[str, Any]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _phase_script(phases)],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def _top_packages(modules: List[Dict[str, Any]], top: int) -> List[Dict[str, Any]]:
+    # Self time summed per top-level package, e.g. every langchain.* module.
+    totals: Dict[str, int] = {}
+    for row in modules:
+        package = row["module"].split(".")[0]
+        totals[package] = totals.get(package, 0) + row["self_us"]
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{"package": package, "self_ms": round(us / 1000, 1)} for package, us in ranked]
+
+
+def run(args) -> Dict[str, Any]:
+    runs = [profile_once(PHASES) for _ in range(args.repeat)]
+    report = {"python": sys.version.split()[0], "repeat": args.repeat, "phases": {}}
+    for phase, modules in PHASES.items():
+        walls = [r[phase]["wall_s"] for r in runs]
+        # The breakdown comes from the run with the median wall time.
+        median_run = sorted(runs, key=lambda r: r[phase]["wall_s"])[len(runs) // 2]
+        imported = median_run[phase]["modules"]
+        report["phases"][phase] = {
+            "modules": modules,
+            "wall_s": {"min": min(walls), "median": statistics.median(walls), "max": max(walls)},
+            "imported_modules": len(imported),
+            "top_packages": _top_packages(imported, args.top),
+            "top_modules": [
+                {"module": row["module"], "cumulative_ms": round(row["cumulative_us"] / 1000, 1)}
+                for row in sorted(imported, key=lambda row: row["cumulative_us"], reverse=True)
+                if row["depth"] == 0
+            ][:args.top],
+        }
+    return report
+
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Median wall time per phase against an earlier report.
+    """
+    rows = []
+    for phase, result in report["phases"].items():
+        before = baseline.get("phases", {}).get(phase)
+        if before is None:
+            continue
+        old, new = before["wall_s"]["median"], result["wall_s"]["median"]
+        rows.append({
+            "phase": phase,
+            "baseline_median": old,
+            "median": new,
+            "ratio": new / old if old else None,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="fresh interpreters to time; the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="packages/modules listed per phase")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare medians against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report)
+        for row in report["comparison"]:
+            ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "n/a"
+            print(f"{row['phase']}: {row['median']:.3f}s ({ratio} baseline)", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+"""
+Time the pipeline's data-heavy steps over synthetic agencies and write the
+results as JSON.
+
+    python -m benchmarks.run_benchmarks --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.run_benchmarks --sizes 1000 --baseline bench.json
+
+Suites:
+    geo         find_nearby_food_assistance's distance/sort step (NumPy
+                haversine over all agencies) and the in-memory spatial index
+    sql         QueryBuilder.build_query + execute_query, per dietary filter
+    backends    the same queries on SQLite and on DuckDB over Parquet: the
+                candidate lookup and the fused radius search per dietary
+                filter, and a regional aggregate; the report's
+                backend_comparison names the faster one per size and query
+    ingest      excel_to_sql: cold, Parquet-cached and unchanged runs
+    markets_sp  build_markets_sp over the six raw workbooks
+    formatting  the result formatting helpers for one response (50 rows)
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from benchmarks.synthetic import (
+    SERVICE_AREA,
+    generate_arcgis_agencies,
+    generate_combined_data,
+    generate_raw_workbooks,
+    write_arcgis_snapshot,
+)
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUITES = ["geo", "sql", "backends", "ingest", "markets_sp", "formatting"]
+
+# Dietary preference cases for the SQL suite.
+SQL_CASES = {
+    "no_filter": {},
+    "halal": {"religious_dietary_restrictions": ["Halal Meal"]},
+    "diabetic": {"health_dietary_restrictions": ["Diabetic Meal"]},
+}
+
+# Scan-and-group query over the wide combined_data rows for the backends suite.
+AGGREGATE_SQL = """
+SELECT "Agency Region" AS region,
+    COUNT(DISTINCT "Agency ID") AS agencies,
+    COUNT(*) AS slots
+FROM combined_data
+WHERE "Wraparound Service" LIKE :service
+GROUP BY "Agency Region"
+ORDER BY region"""
+
+
+def _timeit(
+    fn: Callable[..., Any],
+    repeat: int,
+    setup: Optional[Callable[[], tuple]] = None
+) -> Dict[str, float]:
+    """
+    Wall-clock seconds of ``fn`` over ``repeat`` runs; ``setup`` (untimed)
+    returns the arguments of each run.
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "repeat": repeat,
+        "min": times[0],
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p95": times[min(len(times) - 1, int(round(0.95 * (len(times) - 1))))],
+        "max": times[-1],
+    }
+
+
+def _query_points(count: int, seed: int = 1) -> List[tuple]:
+    rng = np.random.default_rng(seed)
+    lat_min, lat_max, lon_min, lon_max = SERVICE_AREA
+    return list(zip(rng.uniform(lat_min, lat_max, count), rng.uniform(lon_min, lon_max, count)))
+
+
+def _log(message: str) -> None:
+    print(message, file=sys.stderr, flush=True)
+
+
+def bench_geo(agencies: pd.DataFrame, workdir: str, repeat: int, args) -> List[Dict[str, Any]]:
+    from src.geo_helper.distance import nearest_within
+    from src.geo_helper.spatial_index import AgencySpatialIndex
+
+    lats = agencies["latitude"].to_numpy()
+    lons = agencies["longitude"].to_numpy()
+    points = iter(_query_points(repeat * 3))
+    results = []
+
+    results.append({"name": "geo.nearest_within", **_timeit(
+        lambda lat, lon: nearest_within(
+            lat, lon, lats, lons, radius_miles=args.radius_miles, limit=args.limit
+        ),
+        repeat,
+        setup=lambda: next(points)
+    )})
+
+    # The index only reads these fields, so the snapshot skips the rest.
+    snapshot_path = os.path.join(workdir, "arcgis_data.json")
+    write_arcgis_snapshot(agencies, snapshot_path, ["agency_ref", "name", "latitude", "longitude"])
+    results.append({"name": "geo.spatial_index.build", **_timeit(
+        lambda: AgencySpatialIndex(snapshot_path), max(1, repeat // 2)
+    )})
+    index = AgencySpatialIndex(snapshot_path)
+    results.append({"name": "geo.spatial_index.query_radius", **_timeit(
+        lambda lat, lon: index.query_radius(lat, lon, args.radius_miles, limit=args.limit),
+        repeat,
+        setup=lambda: next(points)
+    )})
+    results.append({"name": "geo.spatial_index.query_nearest", **_timeit(
+        lambda lat, lon: index.query_nearest(lat, lon, k=args.limit),
+        repeat,
+        setup=lambda: next(points)
+    )})
+    return results
+
+
+def _candidates(agencies: pd.DataFrame, lat: float, lon: float, args) -> List[Dict[str, Any]]:
+    """
+    The geo search results for (lat, lon), as FoodAssistanceRAG receives them.
+    """
+    from src.geo_helper.distance import nearest_within
+
+    indices, distances = nearest_within(
+        lat, lon,
+        agencies["latitude"].to_numpy(),
+        agencies["longitude"].to_numpy(),
+        radius_miles=args.radius_miles,
+        limit=args.limit
+    )
+    return [
+        {"Agency ID": agency_id, "Agency Name": name, "Distance": float(distance)}
+        for agency_id, name, distance in zip(
+            agencies["agency_ref"].to_numpy()[indices],
+            agencies["name"].to_numpy()[indices],
+            distances
+        )
+    ]
+
+
+def _rule_engine(fts_table: Optional[str]):
+    from src.rag_helper.dietary_rules import DietaryRuleEngine
+    from src.rag_helper.langchain import DietaryFilterGenerator
+    from src.utilities.config_parser import load_config
+
+    return DietaryRuleEngine(
+        DietaryFilterGenerator.DIETARY_RULES,
+        load_config()["user_preferences"]["valid_options"],
+        fts_table=fts_table
+    )
+
+
+def bench_sql(
+    agencies: pd.DataFrame,
+    combined: pd.DataFrame,
+    workdir: str,
+    repeat: int,
+    args
+) -> List[Dict[str, Any]]:
+    from src.db_helper.backends import SQLiteBackend
+    from src.db_helper.sql_helper import FTS_SPECS, build_indexes
+    from src.rag_helper.langchain import QueryBuilder, execute_agency_query
+
+    db_path = os.path.join(workdir, "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as connection:
+        combined.to_sql("combined_data", connection, index=False, if_exists="replace", chunksize=5000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_indexes(engine)
+    engine.dispose()
+
+    backend = SQLiteBackend(db_path)
+    rule_engine = _rule_engine(FTS_SPECS["combined_data"]["fts_table"])
+    candidates = _candidates(agencies, *_query_points(1)[0], args)
+
+    results = []
+    for case, user_prefs in SQL_CASES.items():
+        dietary_filter = rule_engine.compile(user_prefs)
+        rows = execute_agency_query(backend, QueryBuilder.build_query(candidates, dietary_filter))
+        results.append({
+            "name": f"sql.build_query+execute_query.{case}",
+            "candidates": len(candidates),
+            "rows": len(rows),
+            **_timeit(
+                lambda: execute_agency_query(
+                    backend, QueryBuilder.build_query(candidates, dietary_filter)
+                ),
+                repeat
+            )
+        })
+    backend.dispose()
+    return results
+
+
+def bench_backends(
+    agencies: pd.DataFrame,
+    combined: pd.DataFrame,
+    workdir: str,
+    repeat: int,
+    args
+) -> List[Dict[str, Any]]:
+    from src.db_helper.agencies import write_agencies_table
+    from src.db_helper.backends import DuckDBBackend, SQLiteBackend
+    from src.db_helper.sql_helper import FTS_SPECS, build_indexes, export_parquet
+    from src.rag_helper.langchain import QueryBuilder, execute_agency_query
+
+    db_path = os.path.join(workdir, "backends.db")
+    parquet_dir = os.path.join(workdir, "parquet")
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as connection:
+        combined.to_sql("combined_data", connection, index=False, if_exists="replace", chunksize=5000)
+        write_agencies_table(connection)
+    with contextlib.redirect_stdout(io.StringIO()):
+        build_indexes(engine)
+        export_parquet(db_path, parquet_dir)
+    engine.dispose()
+
+    backends = {"sqlite": SQLiteBackend(db_path)}
+    try:
+        backends["duckdb"] = DuckDBBackend(parquet_dir)
+    except ImportError as e:
+        _log(f"  backends: skipping duckdb ({str(e)})")
+
+    lat, lon = _query_points(1)[0]
+    candidates = _candidates(agencies, lat, lon, args)
+    fts_table = FTS_SPECS["combined_data"]["fts_table"]
+    results = []
+    for backend_name, backend in backends.items():
+        rule_engine = _rule_engine(fts_table if backend.has_table(fts_table) else None)
+        queries = {}
+        for case, user_prefs in SQL_CASES.items():
+            dietary_filter = rule_engine.compile(user_prefs)
+            queries[f"candidates.{case}"] = QueryBuilder.build_query(
+                candidates, dietary_filter, dialect=backend.dialect
+            )
+            queries[f"fused.{case}"] = QueryBuilder.build_fused_query(
+                lat, lon, args.radius_miles, dietary_filter, dialect=backend.dialect
+            )
+        for case, query in queries.items():
+            rows = execute_agency_query(backend, query)
+            results.append({
+                "name": f"backends.{backend_name}.{case}",
+                "backend": backend_name,
+                "case": case,
+                "rows": len(rows),
+                **_timeit(lambda: execute_agency_query(backend, query), repeat)
+            })
+        params = {"service": "%Housing%"}
+        rows = execute_agency_query(backend, AGGREGATE_SQL, params)
+        results.append({
+            "name": f"backends.{backend_name}.aggregate",
+            "backend": backend_name,
+            "case": "aggregate",
+            "rows": len(rows),
+            **_timeit(lambda: execute_agency_query(backend, AGGREGATE_SQL, params), repeat)
+        })
+        backend.dispose()
+    return results
+
+
+def bench_ingest(combined: pd.DataFrame, workdir: str, repeat: int, args) -> List[Dict[str, Any]]:
+    from src.db_helper.sql_helper import excel_to_sql
+
+    if len(combined) > args.ingest_max_rows:
+        _log(f"  ingest: capping combined_data at {args.ingest_max_rows} rows")
+        combined = combined.head(args.ingest_max_rows)
+    source_path = os.path.join(workdir, "combined_data.xlsx")
+    combined.to_excel(source_path, index=False)
+    data_dir = os.path.join(workdir, "ingest")
+    db_path = os.path.join(workdir, "ingest.db")
+
+    def reset() -> tuple:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        os.makedirs(data_dir)
+        shutil.copy(source_path, os.path.join(data_dir, "combined_data.xlsx"))
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        return ()
+
+    def ingest(force: bool = False) -> None:
+        # excel_to_sql reports progress and query plans on stdout.
+        with contextlib.redirect_stdout(io.StringIO()):
+            excel_to_sql(data_dir, force=force, db_path=db_path)
+
+    results = [{"name": "ingest.excel_to_sql.cold", "rows": len(combined), **_timeit(
+        ingest, repeat, setup=reset
+    )}]
+    # The last cold run left the Parquet cache and manifest behind.
+    results.append({"name": "ingest.excel_to_sql.parquet_cached", "rows": len(combined), **_timeit(
+        lambda: ingest(force=True), repeat
+    )})
+    results.append({"name": "ingest.excel_to_sql.unchanged", "rows": len(combined), **_timeit(
+        ingest, repeat
+    )})
+    return results
+
+
+def bench_markets_sp(size: int, repeat: int, args) -> List[Dict[str, Any]]:
+    from src.preprocess.build_markets_sp import build_markets_sp
+
+    frames = generate_raw_workbooks(size, seed=args.seed)
+    # The filters modify the frames in place; every run gets fresh copies.
+    return [{"name": "markets_sp.build_markets_sp", **_timeit(
+        build_markets_sp,
+        repeat,
+        setup=lambda: ({key: frame.copy() for key, frame in frames.items()},)
+    )}]
+
+
+def bench_formatting(combined: pd.DataFrame, repeat: int, args) -> List[Dict[str, Any]]:
+    from src.rag_helper.langchain import ResponseGenerator
+    from src.rag_helper.coverage import annotate_service_coverage
+    from src.rag_helper.renderer import AgencyCardRenderer, format_row
+    from src.rag_helper.services import ServiceVocabulary
+    from src.utilities.config_parser import load_config
+
+    config = load_config()
+    # One response's worth of query results, nearest first.
+    head = combined.head(50)
+    head = head.assign(Distance=np.linspace(0.1, 10.0, len(head)))
+    rows = head.astype(object).where(head.notna(), None).to_dict(orient="records")
+    vocabulary = ServiceVocabulary(
+        config["wraparound_services"],
+        config["user_preferences"]["valid_options"]["services"],
+        service_bits=config.get("wraparound_service_bits")
+    )
+    renderer = AgencyCardRenderer(config["response_labels"], vocabulary)
+    user_prefs = {"language": "en", "services": ["Housing", "Child care"]}
+    results = [
+        {"name": "formatting.format_row", "rows": len(rows), **_timeit(
+            lambda: [format_row(row) for row in rows], repeat
+        )},
+        {"name": "formatting.render_cards", "rows": len(rows), **_timeit(
+            lambda: renderer.render(rows, user_prefs), repeat
+        )},
+        {"name": "formatting.service_coverage", "rows": len(rows), **_timeit(
+            lambda: annotate_service_coverage(rows, user_prefs["services"], vocabulary), repeat
+        )},
+        {"name": "formatting.format_sql_results_tool", "rows": len(rows), **_timeit(
+            lambda: ResponseGenerator.format_sql_results_tool(rows), repeat
+        )},
+    ]
+    try:
+        from src.rag_helper.context_budget import ContextBudget
+        budget = ContextBudget(config["llm_config"]["LangChainRAGHelper"]["model_name"])
+        results.append({"name": "formatting.context_budget", "rows": len(rows), **_timeit(
+            lambda: budget.fit(rows, ResponseGenerator.RESPONSE_TEMPLATE), repeat
+        )})
+    except Exception as e:
+        # tiktoken fetches its encoding on first use; skip when offline.
+        _log(f"  formatting: skipping context budget ({str(e)})")
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "sizes": args.sizes,
+            "suites": args.suites,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": [],
+    }
+    for size in args.sizes:
+        _log(f"size {size}: generating agencies")
+        agencies = generate_arcgis_agencies(size, seed=args.seed)
+        combined = generate_combined_data(agencies, seed=args.seed)
+        workdir = tempfile.mkdtemp(prefix=f"bench_{size}_")
+        try:
+            for suite in args.suites:
+                _log(f"size {size}: {suite}")
+                if suite == "geo":
+                    results = bench_geo(agencies, workdir, args.repeat, args)
+                elif suite == "sql":
+                    results = bench_sql(agencies, combined, workdir, args.repeat, args)
+                elif suite == "backends":
+                    results = bench_backends(agencies, combined, workdir, args.repeat, args)
+                elif suite == "ingest":
+                    results = bench_ingest(combined, workdir, args.repeat, args)
+                elif suite == "markets_sp":
+                    results = bench_markets_sp(size, args.repeat, args)
+                else:
+                    results = bench_formatting(combined, args.repeat, args)
+                for result in results:
+                    report["results"].append({"suite": suite, "size": size, **result})
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return report
+
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Median time of each (name, size) relative to the baseline report.
+    """
+    previous = {(r["name"], r["size"]): r for r in baseline["results"]}
+    rows = []
+    for result in report["results"]:
+        before = previous.get((result["name"], result["size"]))
+        if before is None:
+            continue
+        rows.append({
+            "name": result["name"],
+            "size": result["size"],
+            "baseline_median": before["median"],
+            "median": result["median"],
+            "ratio": result["median"] / before["median"] if before["median"] else None,
+        })
+    return rows
+
+
+def compare_backends(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Median time of each backends-suite query per backend, with the faster
+    backend, by size.
+    """
+    medians: Dict[tuple, Dict[str, float]] = {}
+    for result in report["results"]:
+        if "backend" in result:
+            medians.setdefault((result["size"], result["case"]), {})[result["backend"]] = result["median"]
+    rows = []
+    for (size, case), by_backend in sorted(medians.items()):
+        winner = min(by_backend, key=by_backend.get)
+        slowest = max(by_backend.values())
+        rows.append({
+            "size": size,
+            "case": case,
+            "medians": by_backend,
+            "winner": winner,
+            "speedup": slowest / by_backend[winner] if by_backend[winner] else None,
+        })
+    return rows
+
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="number of synthetic agencies (up to 1000000)")
+    parser.add_argument("--suites", nargs="+", choices=SUITES, default=SUITES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--radius-miles", type=float, default=10.0)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--ingest-max-rows", type=int, default=100000,
+                        help="cap on rows written to Excel for the ingest suite")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare medians against")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    if "backends" in args.suites:
+        report["backend_comparison"] = compare_backends(report)
+        for row in report["backend_comparison"]:
+            speedup = f"{row['speedup']:.2f}x" if row["speedup"] is not None else "n/a"
+            _log(f"backends {row['case']} [{row['size']}]: {row['winner']} ({speedup})")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["comparison"] = compare(json.load(f), report)
+        for row in report["comparison"]:
+            ratio = f"{row['ratio']:.2f}x" if row["ratio"] is not None else "n/a"
+            _log(f"{row['name']} [{row['size']}]: {row['median']:.6f}s ({ratio} baseline)")
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+        _log(f"Results written to {args.output}")
+    else:
+        print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
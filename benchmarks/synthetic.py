@@ -0,0 +1,315 @@
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Value vocabularies as they appear in the CAFB exports.
+CULTURES = [
+    "Central/South Asian",
+    "East African",
+    "East Asian",
+    "Eastern European",
+    "Latin American",
+    "Middle Eastern/ North African",
+    "West African",
+]
+WRAPAROUND_SERVICES = [
+    "Behavioral Healthcare",
+    "Case management",
+    "Childcare",
+    "ESL",
+    "Financial advising",
+    "Financial assistance",
+    "Gov't benefits enrollment",
+    "Healthcare",
+    "Housing",
+    "Info on gov't benefits",
+    "Job training/ workforce development",
+    "Legal services",
+    "Non-food items",
+    "Nutrition Education Materials and Resources",
+    "Programming/ support for older adults",
+]
+FREQUENCIES = [
+    "Every week",
+    "1st of the Month",
+    "2nd of the Month",
+    "3rd of the Month",
+    "4th of the Month",
+    "Every Other Week",
+    "2nd and 4th of the Month",
+]
+FOOD_FORMATS = ["Loose groceries", "Pre-bagged or boxed groceries", "Prepared meals"]
+DISTRIBUTION_MODELS = ["Drive thru", "Home Delivery", "Walk up"]
+REGIONS = ["DC", "MD", "VA"]
+# (start, end) of a distribution slot.
+SLOTS = [("08:00:00", "10:00:00"), ("09:00:00", "16:00:00"), ("12:00:00", "14:00:00"), ("17:00:00", "19:00:00")]
+
+# CAFB service area: lat min, lat max, lon min, lon max.
+SERVICE_AREA = (38.6, 39.4, -77.6, -76.6)
+
+# Per-day fields of an arcgis_data.json record, in file order.
+ARCGIS_DAY_FIELDS = [
+    "Hours", "ByAppointmentOnly", "ResidentsOnly", "Notes", "Reqs",
+    "start1", "start2", "start3", "end1", "end2", "end3",
+]
+ARCGIS_COLUMNS = (
+    [
+        "agency_ref", "name", "address1", "address2", "city", "state",
+        "county_name", "zip", "phone", "email", "tefap", "latitude",
+        "longitude", "Date_of_Last_SO",
+    ]
+    + [f"{field}_{day}" for day in DAYS for field in ARCGIS_DAY_FIELDS]
+    + ["TEFAP_Auto_Eligible", "TEFAP_Income_Levels", "ObjectId"]
+)
+
+COMBINED_COLUMNS = [
+    "Agency ID", "Agency Name", "Shipping Address", "Day or Week",
+    "Starting Time", "Ending Time", "Frequency", "Agency Region",
+    "By Appointment Only", "Status", "agency_type", "Is Market",
+    "Cultural Populations Served", "Wraparound Service", "Score", "x", "y",
+    "Food Format ", "Choice Options ", "Distribution Models", "Phone", "URL",
+    "Last SO Create Date", "County/Ward", "Date of Last Verification",
+    "Additional Note on Hours of Operations", "Food Pantry Requirements",
+]
+
+
+def _choice(rng: np.random.Generator, values: Sequence, n: int) -> np.ndarray:
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def _random_lists(
+    rng: np.random.Generator,
+    n: int,
+    vocabulary: Sequence[str],
+    p: float,
+    sep: str = ","
+) -> np.ndarray:
+    """
+    n random subsets of ``vocabulary`` (each item kept with probability p),
+    joined with ``sep``; empty subsets are None.
+    """
+    picks = rng.random((n, len(vocabulary))) < p
+    codes = picks @ (1 << np.arange(len(vocabulary), dtype=np.int64))
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    joined = np.array([
+        sep.join(v for bit, v in enumerate(vocabulary) if code >> bit & 1) or None
+        for code in unique_codes
+    ], dtype=object)
+    return joined[inverse]
+
+
+def _agency_refs(n: int, is_market: np.ndarray) -> np.ndarray:
+    kind = np.where(is_market, "MOMK", "PART")
+    return np.array([f"{10000 + i}-{k}-01" for i, k in enumerate(kind)], dtype=object)
+
+
+def generate_arcgis_agencies(n: int, seed: int = 0) -> pd.DataFrame:
+    """
+    n agency records with the columns of data/external/arcgis_data.json,
+    scattered uniformly over the CAFB service area. Each agency is open on
+    one day of the week.
+    """
+    rng = np.random.default_rng(seed)
+    lat_min, lat_max, lon_min, lon_max = SERVICE_AREA
+    is_market = rng.random(n) < 0.08
+    open_day = rng.integers(0, len(DAYS), n)
+    slot = rng.integers(0, len(SLOTS), n)
+    starts = np.array([s for s, _ in SLOTS], dtype=object)[slot]
+    ends = np.array([e for _, e in SLOTS], dtype=object)[slot]
+    hours = np.array([
+        f"{int(s[:2]) % 12 or 12}:00 {'AM' if int(s[:2]) < 12 else 'PM'} to "
+        f"{int(e[:2]) % 12 or 12}:00 {'AM' if int(e[:2]) < 12 else 'PM'}; Every week"
+        for s, e in SLOTS
+    ], dtype=object)[slot]
+    state = _choice(rng, REGIONS, n)
+
+    data: Dict[str, np.ndarray] = {
+        "agency_ref": _agency_refs(n, is_market),
+        "name": np.array([f"Agency {i}" for i in range(n)], dtype=object),
+        "address1": np.array([f"{100 + i % 9900} Main Street" for i in range(n)], dtype=object),
+        "address2": np.full(n, None, dtype=object),
+        "city": _choice(rng, ["Washington", "Silver Spring", "Arlington", "Hyattsville"], n),
+        "state": state,
+        "county_name": _choice(rng, ["DC Ward 8", "Prince George's", "Montgomery", "Fairfax"], n),
+        "zip": np.char.mod("%05d", rng.integers(20001, 22999, n)).astype(object),
+        "phone": np.char.mod("(202) 555-%04d", rng.integers(0, 10000, n)).astype(object),
+        "email": np.full(n, None, dtype=object),
+        "tefap": _choice(rng, ["TEFAP", "Non-TEFAP"], n),
+        "latitude": rng.uniform(lat_min, lat_max, n),
+        "longitude": rng.uniform(lon_min, lon_max, n),
+        "Date_of_Last_SO": rng.integers(1_700_000_000, 1_745_000_000, n) * 1000,
+    }
+    none = np.full(n, None, dtype=object)
+    for d, day in enumerate(DAYS):
+        is_open = open_day == d
+        values = {
+            "Hours": hours, "ByAppointmentOnly": np.full(n, "No", dtype=object),
+            "ResidentsOnly": np.full(n, "No", dtype=object), "Notes": none,
+            "Reqs": np.full(n, " ", dtype=object),
+            "start1": starts, "start2": starts, "start3": starts,
+            "end1": ends, "end2": ends, "end3": ends,
+        }
+        for field in ARCGIS_DAY_FIELDS:
+            data[f"{field}_{day}"] = np.where(is_open, values[field], None)
+    data["TEFAP_Auto_Eligible"] = np.full(n, "N/A", dtype=object)
+    data["TEFAP_Income_Levels"] = np.full(n, "N/A", dtype=object)
+    data["ObjectId"] = np.arange(1, n + 1)
+    return pd.DataFrame(data, columns=ARCGIS_COLUMNS)
+
+
+def write_arcgis_snapshot(
+    agencies: pd.DataFrame,
+    path: str,
+    columns: Optional[List[str]] = None
+) -> None:
+    """
+    Write agencies as an arcgis_data.json-style snapshot (a JSON list of
+    records), optionally restricted to ``columns``.
+    """
+    frame = agencies if columns is None else agencies[columns]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(frame.to_json(orient="records"))
+
+
+def generate_combined_data(
+    agencies: pd.DataFrame,
+    max_slots: int = 3,
+    seed: int = 0
+) -> pd.DataFrame:
+    """
+    combined_data rows for the given agencies: one row per distribution slot,
+    1 to ``max_slots`` slots per agency, sharing the agency's ID, name and
+    coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    n_slots = rng.integers(1, max_slots + 1, len(agencies))
+    idx = np.repeat(np.arange(len(agencies)), n_slots)
+    n = len(idx)
+    ids = agencies["agency_ref"].to_numpy()[idx]
+    names = agencies["name"].to_numpy()[idx]
+    is_market = np.char.find(ids.astype(str), "-MOMK-") >= 0
+    slot = rng.integers(0, len(SLOTS), n)
+    region = agencies["state"].to_numpy()[idx]
+
+    data = {
+        "Agency ID": ids,
+        "Agency Name": names,
+        "Shipping Address": (
+            names + " " + agencies["address1"].to_numpy()[idx] + " "
+            + agencies["city"].to_numpy()[idx] + " " + region + " "
+            + agencies["zip"].to_numpy()[idx]
+        ),
+        "Day or Week": _choice(rng, DAYS, n),
+        "Starting Time": np.array([s for s, _ in SLOTS], dtype=object)[slot],
+        "Ending Time": np.array([e for _, e in SLOTS], dtype=object)[slot],
+        "Frequency": _choice(rng, FREQUENCIES, n),
+        "Agency Region": region,
+        "By Appointment Only": _choice(rng, ["No", "No", "No", "Yes"], n),
+        "Status": np.full(n, "Active", dtype=object),
+        "agency_type": np.where(is_market, "Markets", "Shopping Partners").astype(object),
+        "Is Market": is_market.astype(int),
+        "Cultural Populations Served": _random_lists(rng, n, CULTURES, 0.3),
+        "Wraparound Service": _random_lists(rng, n, WRAPAROUND_SERVICES, 0.2, sep=", "),
+        "Score": np.round(rng.uniform(90, 100, n), 2),
+        "x": agencies["longitude"].to_numpy()[idx],
+        "y": agencies["latitude"].to_numpy()[idx],
+        "Food Format ": _random_lists(rng, n, FOOD_FORMATS, 0.4),
+        "Choice Options ": np.where(rng.random(n) < 0.01, "Full Choice", None),
+        "Distribution Models": _random_lists(rng, n, DISTRIBUTION_MODELS, 0.4),
+        "Phone": agencies["phone"].to_numpy()[idx],
+        "URL": np.full(n, None, dtype=object),
+        "Last SO Create Date": np.full(n, "2025-01-21 00:00:00", dtype=object),
+        "County/Ward": agencies["county_name"].to_numpy()[idx],
+        "Date of Last Verification": np.full(n, "2024-10-01 00:00:00", dtype=object),
+        "Additional Note on Hours of Operations": np.where(rng.random(n) < 0.1, "walk-ins", None),
+        "Food Pantry Requirements": np.full(n, None, dtype=object),
+    }
+    return pd.DataFrame(data, columns=COMBINED_COLUMNS)
+
+
+def generate_raw_workbooks(n: int, seed: int = 0) -> Dict[str, pd.DataFrame]:
+    """
+    The six data/raw_data workbooks, as frames keyed like
+    preprocess.build_markets_sp.WORKBOOKS, for about n HOO rows in total
+    (markets and shopping partners in the CAFB ratio).
+    """
+    rng = np.random.default_rng(seed)
+    n_markets = max(1, n // 12)
+    n_partners = max(1, n - n_markets)
+
+    def hoo_rows(count: int, kind: str):
+        # About two slots per agency.
+        agency = rng.integers(0, max(1, count // 2), count)
+        ids = np.array([f"{10000 + a}-{kind}-01" for a in agency], dtype=object)
+        names = np.array([f"Agency {kind} {a}" for a in agency], dtype=object)
+        slot = rng.integers(0, len(SLOTS), count)
+        return ids, names, slot
+
+    ids, names, slot = hoo_rows(n_markets, "MOMK")
+    markets_hoo = pd.DataFrame({
+        "Agency ID": ids,
+        "Agency Name": ids + " " + names,
+        "Shipping Address": names + " 2315 18th Pl NE Washington DC 20018",
+        "Day or Week": _choice(rng, DAYS, n_markets),
+        "Starting Time": np.array([s for s, _ in SLOTS], dtype=object)[slot],
+        "Ending Time": np.array([e for _, e in SLOTS], dtype=object)[slot],
+        "Frequency": _choice(rng, FREQUENCIES, n_markets),
+        "Food Format ": _random_lists(rng, n_markets, FOOD_FORMATS, 0.4),
+        "Choice Options ": np.where(rng.random(n_markets) < 0.1, "Full Choice", None),
+        "Distribution Models": _random_lists(rng, n_markets, DISTRIBUTION_MODELS, 0.4),
+    })
+    market_ids = pd.unique(ids)
+
+    ids, names, slot = hoo_rows(n_partners, "PART")
+    # Some partner names carry a "Company : Site" prefix.
+    display_names = np.where(rng.random(n_partners) < 0.2, names + " : " + names, names)
+    sp_hoo = pd.DataFrame({
+        "External ID": ids,
+        "Name": display_names,
+        "Status": np.full(n_partners, "Active", dtype=object),
+        "Last SO Create Date": np.full(n_partners, "2025-01-21 00:00:00", dtype=object),
+        "Agency Region": _choice(rng, REGIONS, n_partners),
+        "County/Ward": _choice(rng, ["DC Ward 8", "Prince George's", "Montgomery"], n_partners),
+        "Shipping Address": names + " 2263 mount view place, se washington DC 20020",
+        "Phone": np.char.mod("(202) 555-%04d", rng.integers(0, 10000, n_partners)).astype(object),
+        "Day or Week": _choice(rng, DAYS, n_partners),
+        "Monthly Options": _choice(rng, FREQUENCIES, n_partners),
+        "Starting Time": np.array([s for s, _ in SLOTS], dtype=object)[slot],
+        "Ending Time": np.array([e for _, e in SLOTS], dtype=object)[slot],
+        "By Appointment Only": _choice(rng, ["No", "No", "No", "Yes"], n_partners),
+        "Date of Last Verification": np.full(n_partners, "2024-10-01 00:00:00", dtype=object),
+        "Additional Note on Hours of Operations": np.where(rng.random(n_partners) < 0.1, "walk-ins", None),
+        "Food Format ": _random_lists(rng, n_partners, FOOD_FORMATS, 0.4),
+        "Distribution Models": _random_lists(rng, n_partners, DISTRIBUTION_MODELS, 0.4),
+    })
+    partner_ids = pd.unique(ids)
+
+    def cultures(agency_ids: np.ndarray, name_column: str) -> pd.DataFrame:
+        return pd.DataFrame({
+            "Agency ID": agency_ids,
+            name_column: np.array([f"Agency {i}" for i in agency_ids], dtype=object),
+            "Cultural Populations Served": _random_lists(rng, len(agency_ids), CULTURES, 0.3),
+        })
+
+    def wrap_services(agency_ids: np.ndarray) -> pd.DataFrame:
+        # One row per (agency, service), like the source sheets.
+        picks = rng.random((len(agency_ids), len(WRAPAROUND_SERVICES))) < 0.2
+        agency_idx, service_idx = np.nonzero(picks)
+        return pd.DataFrame({
+            "Agency ID": agency_ids[agency_idx],
+            "Agency Name": np.array([f"Agency {i}" for i in agency_ids[agency_idx]], dtype=object),
+            "Wraparound Service": np.asarray(WRAPAROUND_SERVICES, dtype=object)[service_idx],
+        })
+
+    return {
+        "markets_hoo": markets_hoo,
+        "markets_cultures": cultures(market_ids, "Agency Name"),
+        "markets_wrap_serv": wrap_services(market_ids),
+        "sp_hoo": sp_hoo,
+        "sp_cultures": cultures(partner_ids, "Company Name"),
+        "sp_wrap_serv": wrap_services(partner_ids),
+    }
+
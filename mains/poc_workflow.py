@@ -1,3 +1,4 @@
+import asyncio
 import sys
 import os
 import logging
@@ -12,13 +13,19 @@ logger = logging.getLogger(__name__)
 from src.utilities.config_parser import load_config
 from src.user_preferences.user_preferences import get_user_preferences
 from src.geo_helper.geo_helper import GeoHelper
-import src.rag_helper.langchain as lc
+from src.rag_helper.pipeline_registry import get_pipeline_from_config
+from src.utilities.logger import configure_logging
+from src.utilities.metrics import configure_metrics, flush_metrics
+from src.utilities.tracing import configure_tracing, trace_stage
 
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(PROJECT_DIR, 'data', 'cafb.db')
+
 def filter_by_distance(
         user_prefs, 
         config,
@@ -26,7 +33,7 @@ def filter_by_distance(
     ):
     max_distance = float(user_prefs.get('max_distance'))
     logger.info("Filtering by distance using max_distance: %s", max_distance)
-    geo_helper = GeoHelper()
+    geo_helper = GeoHelper.from_config(config)
     distance_data = geo_helper.find_nearby_food_assistance(
         user_prefs["address"], 
         radius_miles=max(max_distance, config["distance"]["max_threshold"]),
@@ -43,28 +50,38 @@ def rag_search(user_prefs, distance_data, config):
     logger.info("Performing RAG search/comparison with user preferences...")
     logger.info("Running inference...")
     INPUT_INFO = {"USER_PREFS": user_prefs, "Arcgis": distance_data}
-    rag_system = lc.FoodAssistanceRAG(
-        openai_api_key="",  # TODO
-        db_path="/Users/johnson.huang/py_ds/AI-la-Carte/data/cafb.db",
-        dietary_model="gpt-4o-mini",
-        response_model="gpt-4o-mini"
-    )
+    rag_system = get_pipeline_from_config(config, DB_PATH)
     response = rag_system.process_request(INPUT_INFO)
     return response
 
+def rag_search_async(user_prefs, config, limit=100):
+    """
+    Geo lookup and RAG search in one async pipeline: the nearby-agency search
+    and dietary filtering run concurrently, each stage under its timeout.
+    """
+    logger.info("Performing concurrent geo lookup and RAG search...")
+    max_distance = float(user_prefs.get('max_distance'))
+    rag_system = get_pipeline_from_config(config, DB_PATH)
+    return asyncio.run(rag_system.aprocess_request(
+        {"USER_PREFS": user_prefs},
+        geo_helper=GeoHelper.from_config(config),
+        radius_miles=max(max_distance, config["distance"]["max_threshold"]),
+        limit=limit
+    ))
+
 def main():
     try:
         # preparation
         config = load_config()
+        configure_logging(config)
+        configure_tracing(config)
+        configure_metrics(config)
         # workflow
         user_prefs = get_user_preferences()
-        distance_data = filter_by_distance(
-            user_prefs, 
-            config=config,
-            limit=100,
-        )
-        results = rag_search(user_prefs, distance_data, config=config)
+        with trace_stage("poc_workflow.run"):
+            results = rag_search_async(user_prefs, config=config, limit=100)
         logger.info("Final Results: %s", results)
+        flush_metrics(config)
     except Exception as e:
         logger.error(f"Workflow error: {str(e)}")
         raise
@@ -0,0 +1,196 @@
+import math
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from src.db_helper.hours import DAYS, FULL_DAY, HOURS_TABLE
+from src.geo_helper.distance import EARTH_RADIUS_MILES
+
+# combined_data rows with coordinates, hours and a spatial index: the whole
+# search is one statement over these two tables.
+AGENCIES_TABLE = "agencies"
+AGENCIES_RTREE = "agencies_rtree"
+SOURCE_TABLE = "combined_data"
+# Read for agencies whose ArcGIS ref differs from their Agency ID.
+CROSSWALK_TABLE = "agency_crosswalk"
+
+HOURS_COLUMNS = tuple(f"hours_{day.lower()}" for day in DAYS)
+# Columns added to the combined_data ones; dropped from result rows.
+INTERNAL_COLUMNS = ("row_id", "lat", "lon", "ux", "uy", "uz", "has_hours") + HOURS_COLUMNS
+CHORD_COLUMN = "chord2"
+
+# Squared chord between the row's unit vector and the search point's: a
+# monotonic function of great-circle distance that needs no trigonometry.
+CHORD_EXPR = "((c.ux - :ux) * (c.ux - :ux) + (c.uy - :uy) * (c.uy - :uy) + (c.uz - :uz) * (c.uz - :uz))"
+
+
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def unit_vector(lat: float, lon: float) -> Tuple[float, float, float]:
+    """
+    (lat, lon) in degrees on the unit sphere.
+    """
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    return (
+        math.cos(lat_r) * math.cos(lon_r),
+        math.cos(lat_r) * math.sin(lon_r),
+        math.sin(lat_r),
+    )
+
+
+def chord_to_miles(chord2: float) -> float:
+    """
+    Great-circle miles for a squared chord between unit vectors.
+    """
+    return 2.0 * EARTH_RADIUS_MILES * math.asin(min(math.sqrt(max(chord2, 0.0)) / 2.0, 1.0))
+
+
+def bounding_box(lat: float, lon: float, radius_miles: float) -> Dict[str, float]:
+    """
+    Lat/lon box containing every point within ``radius_miles`` of (lat, lon).
+    Near the poles or across the antimeridian it spans all longitudes.
+    """
+    angle = radius_miles / EARTH_RADIUS_MILES
+    dlat = math.degrees(angle)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90.0 or max_lat >= 90.0 or angle >= math.pi / 2:
+        return {"min_lat": max(min_lat, -90.0), "max_lat": min(max_lat, 90.0),
+                "min_lon": -180.0, "max_lon": 180.0}
+    dlon = math.degrees(math.asin(min(math.sin(angle) / math.cos(math.radians(lat)), 1.0)))
+    if lon - dlon < -180.0 or lon + dlon > 180.0:
+        return {"min_lat": min_lat, "max_lat": max_lat, "min_lon": -180.0, "max_lon": 180.0}
+    return {"min_lat": min_lat, "max_lat": max_lat, "min_lon": lon - dlon, "max_lon": lon + dlon}
+
+
+def search_params(lat: float, lon: float, radius_miles: float) -> Dict[str, float]:
+    """
+    Bound parameters of the fused search for a point and radius.
+    """
+    ux, uy, uz = unit_vector(lat, lon)
+    chord = 2.0 * math.sin(min(radius_miles / EARTH_RADIUS_MILES, math.pi) / 2.0)
+    return {
+        **bounding_box(lat, lon, radius_miles),
+        "ux": ux, "uy": uy, "uz": uz,
+        "max_chord2": chord * chord,
+    }
+
+
+def hours_predicate(mask: Optional[int]) -> Tuple[str, Dict[str, int]]:
+    """
+    WHERE fragment keeping the agencies open in any hour of a pickup_mask
+    week bitmap, or without hours on record; ("", {}) without a mask.
+    """
+    if not mask:
+        return "", {}
+    conditions = ["c.has_hours = 0"]
+    params = {}
+    for d, column in enumerate(HOURS_COLUMNS):
+        day_mask = (mask >> (d * 24)) & FULL_DAY
+        if day_mask:
+            params[column] = day_mask
+            conditions.append(f"(c.{column} & :{column}) != 0")
+    return "(" + " OR ".join(conditions) + ")", params
+
+
+def result_rows(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Fused search rows as combined_data rows with a "Distance" in miles.
+    """
+    results = []
+    for row in rows:
+        row = {k: v for k, v in row.items() if k not in INTERNAL_COLUMNS}
+        row["Distance"] = chord_to_miles(row.pop(CHORD_COLUMN))
+        results.append(row)
+    return results
+
+
+def _hours_by_agency(connection) -> Dict[str, Dict[str, Any]]:
+    """
+    agency_hours rows by combined_data Agency ID: the row of the same ID,
+    else the row of an ArcGIS ref the crosswalk maps to it.
+    """
+    if not connection.dialect.has_table(connection, HOURS_TABLE):
+        return {}
+    hours = {
+        row["agency_id"]: row
+        for row in (dict(r._mapping) for r in connection.execute(text(f"SELECT * FROM {HOURS_TABLE}")))
+    }
+    by_agency = dict(hours)
+    if connection.dialect.has_table(connection, CROSSWALK_TABLE):
+        refs = connection.execute(text(
+            f"SELECT agency_ref, agency_id FROM {CROSSWALK_TABLE} ORDER BY score DESC, agency_ref"
+        ))
+        for agency_ref, agency_id in refs:
+            if agency_id not in by_agency and agency_ref in hours:
+                by_agency[agency_id] = hours[agency_ref]
+    return by_agency
+
+
+def write_agencies_table(connection) -> int:
+    """
+    Replace the agencies table and its R*Tree with the combined_data rows
+    that have coordinates ("x" longitude, "y" latitude), keyed by their
+    combined_data rowid so FTS rowids still match.
+
+    :return: number of agencies rows.
+    """
+    columns = [
+        row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({_quote(SOURCE_TABLE)})")
+    ]
+    if not {"x", "y", "Agency ID"} <= set(columns):
+        raise ValueError(f"{SOURCE_TABLE} has no Agency ID/x/y columns")
+    source_columns = ", ".join(_quote(c) for c in columns)
+
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {AGENCIES_RTREE}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {AGENCIES_TABLE}")
+    connection.exec_driver_sql(f"""
+        CREATE TABLE {AGENCIES_TABLE} (
+            row_id INTEGER PRIMARY KEY,
+            {source_columns},
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            ux REAL,
+            uy REAL,
+            uz REAL,
+            has_hours INTEGER NOT NULL DEFAULT 0,
+            {", ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in HOURS_COLUMNS)}
+        )
+    """)
+    connection.exec_driver_sql(f"""
+        INSERT INTO {AGENCIES_TABLE} (row_id, {source_columns}, lat, lon)
+        SELECT rowid, {source_columns}, CAST(y AS REAL), CAST(x AS REAL)
+        FROM {_quote(SOURCE_TABLE)}
+        WHERE x IS NOT NULL AND y IS NOT NULL
+    """)
+
+    hours = _hours_by_agency(connection)
+    updates = []
+    for row_id, agency_id, lat, lon in connection.exec_driver_sql(
+        f'SELECT row_id, "Agency ID", lat, lon FROM {AGENCIES_TABLE}'
+    ):
+        ux, uy, uz = unit_vector(lat, lon)
+        update = {"row_id": row_id, "ux": ux, "uy": uy, "uz": uz}
+        agency_hours = hours.get(str(agency_id))
+        update["has_hours"] = int(agency_hours is not None)
+        for day, column in zip(DAYS, HOURS_COLUMNS):
+            update[column] = agency_hours[day.lower()] if agency_hours is not None else 0
+        updates.append(update)
+    if updates:
+        assignments = ", ".join(f"{c} = :{c}" for c in updates[0] if c != "row_id")
+        connection.execute(
+            text(f"UPDATE {AGENCIES_TABLE} SET {assignments} WHERE row_id = :row_id"),
+            updates
+        )
+
+    # Points are degenerate boxes; the R*Tree answers the bounding-box
+    # prefilter and the exact distance is checked on the survivors.
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE {AGENCIES_RTREE} USING rtree(id, min_lat, max_lat, min_lon, max_lon)"
+    )
+    connection.exec_driver_sql(
+        f"INSERT INTO {AGENCIES_RTREE} (id, min_lat, max_lat, min_lon, max_lon) "
+        f"SELECT row_id, lat, lat, lon, lon FROM {AGENCIES_TABLE}"
+    )
+    return len(updates)
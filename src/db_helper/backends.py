@@ -0,0 +1,203 @@
+import abc
+import glob
+import os
+import re
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import create_engine, text
+
+from src.db_helper.hours import HOURS_TABLE, HoursIndex, get_hours_index
+
+BACKENDS = ("sqlite", "duckdb")
+
+# Ranked ArcGIS candidates of one request (see QueryBuilder.build_query).
+CANDIDATE_TABLE = "candidate_agencies"
+CANDIDATE_COLUMNS = ("rank", "agency_id", "agency_name", "distance")
+CREATE_CANDIDATES = f"""
+CREATE TEMP TABLE IF NOT EXISTS {CANDIDATE_TABLE} (
+    rank INTEGER PRIMARY KEY,
+    agency_id TEXT,
+    agency_name TEXT,
+    distance REAL
+)"""
+INSERT_CANDIDATE = f"""
+INSERT INTO temp.{CANDIDATE_TABLE} (rank, agency_id, agency_name, distance)
+VALUES (:rank, :agency_id, :agency_name, :distance)"""
+
+# ":name" placeholders outside "::" casts.
+_NAMED_PARAM = re.compile(r"(?<![:\w]):([A-Za-z_]\w*)")
+
+
+class StorageBackend(abc.ABC):
+    """
+    Where FoodAssistanceRAG's agency queries run. Queries come from
+    QueryBuilder in the backend's ``dialect`` and use ``:name`` parameters.
+    """
+
+    dialect = ""
+
+    @abc.abstractmethod
+    def has_table(self, table_name: str) -> bool:
+        pass
+
+    @abc.abstractmethod
+    def execute(
+        self,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        candidates: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Rows of ``sql``. With ``candidates``, they are the contents of
+        CANDIDATE_TABLE for this statement.
+        """
+
+    @abc.abstractmethod
+    def hours_index(self) -> Optional[HoursIndex]:
+        """
+        The agency_hours index, or None when the table has not been built.
+        """
+
+    def dispose(self) -> None:
+        pass
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Row-oriented tables in the SQLite database built by db_helper.sql_helper,
+    with its B-tree, FTS5 and R*Tree indexes.
+    """
+
+    dialect = "sqlite"
+
+    def __init__(self, db_path: str):
+        self.db_path = os.path.expanduser(db_path)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+
+    def has_table(self, table_name: str) -> bool:
+        with self.engine.connect() as connection:
+            return connection.dialect.has_table(connection, table_name)
+
+    def execute(
+        self,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        candidates: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        with self.engine.begin() as connection:
+            if candidates is not None:
+                # Temp tables are per connection; refill it for this request.
+                connection.execute(text(CREATE_CANDIDATES))
+                connection.execute(text(f"DELETE FROM temp.{CANDIDATE_TABLE}"))
+                if candidates:
+                    connection.execute(text(INSERT_CANDIDATE), candidates)
+            result = connection.execute(text(sql), params or {})
+            return [dict(row._mapping) for row in result]
+
+    def hours_index(self) -> Optional[HoursIndex]:
+        return get_hours_index(self.engine)
+
+    def dispose(self) -> None:
+        self.engine.dispose()
+
+
+class DuckDBBackend(StorageBackend):
+    """
+    Columnar scans over the Parquet files exported by
+    db_helper.sql_helper.export_parquet: each ``<table>.parquet`` in
+    ``parquet_dir`` is a view of the same name. The directory is checked on
+    every query, so exported, re-exported and removed files are picked up
+    without a restart.
+    """
+
+    dialect = "duckdb"
+
+    def __init__(self, parquet_dir: str):
+        import duckdb
+
+        self.parquet_dir = os.path.abspath(os.path.expanduser(parquet_dir))
+        self._connection = duckdb.connect()
+        self._lock = threading.Lock()
+        self._views_lock = threading.Lock()
+        self._tables: List[str] = []
+        self._hours: Tuple[Optional[Tuple[float, int]], Optional[HoursIndex]] = (None, None)
+
+    def _sync_views(self) -> List[str]:
+        """
+        Views for the Parquet files now in parquet_dir: creates the views of
+        new files and drops those of removed ones.
+        """
+        paths = {
+            os.path.splitext(os.path.basename(path))[0]: path
+            for path in glob.glob(os.path.join(self.parquet_dir, "*.parquet"))
+        }
+        with self._views_lock:
+            for table_name in set(self._tables) - set(paths):
+                self._connection.execute(f"DROP VIEW IF EXISTS \"{table_name}\"")
+            for table_name in set(paths) - set(self._tables):
+                quoted_path = paths[table_name].replace("'", "''")
+                self._connection.execute(
+                    f"CREATE OR REPLACE VIEW \"{table_name}\" AS SELECT * FROM read_parquet('{quoted_path}')"
+                )
+            self._tables = sorted(paths)
+            return self._tables
+
+    def has_table(self, table_name: str) -> bool:
+        return table_name in self._sync_views()
+
+    def execute(
+        self,
+        sql: str,
+        params: Optional[Dict[str, Any]] = None,
+        candidates: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        import pandas as pd
+
+        self._sync_views()
+        # A cursor is a connection of its own, so concurrent requests don't
+        # share registered candidates.
+        cursor = self._connection.cursor()
+        try:
+            if candidates is not None:
+                cursor.register(
+                    CANDIDATE_TABLE,
+                    pd.DataFrame(candidates, columns=list(CANDIDATE_COLUMNS))
+                )
+            names = set(_NAMED_PARAM.findall(sql))
+            cursor.execute(
+                _NAMED_PARAM.sub(r"$\1", sql),
+                {k: v for k, v in (params or {}).items() if k in names}
+            )
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def hours_index(self) -> Optional[HoursIndex]:
+        if not self.has_table(HOURS_TABLE):
+            return None
+        path = os.path.join(self.parquet_dir, f"{HOURS_TABLE}.parquet")
+        stat = os.stat(path)
+        signature = (stat.st_mtime, stat.st_size)
+        with self._lock:
+            if self._hours[0] != signature:
+                rows = self.execute(f"SELECT * FROM {HOURS_TABLE}")
+                self._hours = (signature, HoursIndex.from_rows(rows))
+            return self._hours[1]
+
+    def dispose(self) -> None:
+        self._connection.close()
+
+
+def get_backend(name: str, db_path: str, parquet_dir: Optional[str] = None) -> StorageBackend:
+    """
+    Backend by its ``db.backend`` name in config.yaml.
+    """
+    if name == "sqlite":
+        return SQLiteBackend(db_path)
+    if name == "duckdb":
+        if not parquet_dir:
+            raise ValueError("The duckdb backend needs db.parquet_dir")
+        return DuckDBBackend(parquet_dir)
+    raise ValueError(f"Unknown storage backend {name!r}; expected one of {BACKENDS}")
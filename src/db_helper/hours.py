@@ -0,0 +1,258 @@
+import math
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+
+# Day order of the bitmaps; matches date.weekday().
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+HOURS_TABLE = "agency_hours"
+SLOTS = (1, 2, 3)
+FULL_DAY = (1 << 24) - 1
+
+CREATE_HOURS_TABLE = f"""
+CREATE TABLE {HOURS_TABLE} (
+    agency_id TEXT PRIMARY KEY,
+    {", ".join(f"{day.lower()} INTEGER NOT NULL" for day in DAYS)},
+    appointment_days INTEGER NOT NULL,
+    residents_days INTEGER NOT NULL
+)"""
+
+
+def parse_clock(value: Optional[str]) -> Optional[int]:
+    """
+    Minutes since midnight for "9:00:00" / "17:30" style times.
+    """
+    if not value or not isinstance(value, str):
+        return None
+    try:
+        parts = [int(p) for p in value.strip().split(":")]
+    except ValueError:
+        return None
+    if len(parts) < 2 or not 0 <= parts[0] <= 24 or not 0 <= parts[1] < 60:
+        return None
+    return parts[0] * 60 + parts[1]
+
+
+def hour_mask(start: int, end: int) -> int:
+    """
+    24-bit mask of the hours [start, end) minutes touches; bit h is hour h.
+    """
+    if end <= start:
+        return 0
+    first, last = start // 60, min(math.ceil(end / 60), 24)
+    return ((1 << last) - 1) & ~((1 << first) - 1)
+
+
+def _flag(value: Any) -> bool:
+    # Multi-slot days join one flag per slot ("Yes\r\nNo"); any Yes counts.
+    return isinstance(value, str) and "yes" in value.lower()
+
+
+def parse_weekly_hours(record: Dict[str, Any]) -> Tuple[List[int], int, int]:
+    """
+    Weekly availability of one ArcGIS agency record from its
+    ``start1..3_<Day>`` / ``end1..3_<Day>`` fields: one 24-bit hour mask per
+    day, plus 7-bit day masks of the by-appointment and residents-only flags.
+    """
+    day_masks = []
+    appointment_days = residents_days = 0
+    for d, day in enumerate(DAYS):
+        mask = 0
+        for slot in SLOTS:
+            start = parse_clock(record.get(f"start{slot}_{day}"))
+            end = parse_clock(record.get(f"end{slot}_{day}"))
+            if start is None or end is None:
+                continue
+            # "23:59" closes the day.
+            mask |= hour_mask(start, 24 * 60 if end == 23 * 60 + 59 else end)
+        day_masks.append(mask)
+        if _flag(record.get(f"ByAppointmentOnly_{day}")):
+            appointment_days |= 1 << d
+        if _flag(record.get(f"ResidentsOnly_{day}")):
+            residents_days |= 1 << d
+    return day_masks, appointment_days, residents_days
+
+
+def hours_rows(records: Iterable[Dict[str, Any]], id_field: str = "agency_ref") -> List[Dict[str, Any]]:
+    """
+    agency_hours rows for ArcGIS snapshot records.
+    """
+    rows = []
+    for record in records:
+        agency_id = record.get(id_field)
+        if not agency_id:
+            continue
+        day_masks, appointment_days, residents_days = parse_weekly_hours(record)
+        row = {"agency_id": str(agency_id)}
+        row.update({day.lower(): mask for day, mask in zip(DAYS, day_masks)})
+        row["appointment_days"] = appointment_days
+        row["residents_days"] = residents_days
+        rows.append(row)
+    return rows
+
+
+def write_hours_table(connection, rows: List[Dict[str, Any]]) -> None:
+    """
+    Replace the agency_hours table with ``rows``.
+    """
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {HOURS_TABLE}")
+    connection.exec_driver_sql(CREATE_HOURS_TABLE)
+    columns = ["agency_id"] + [day.lower() for day in DAYS] + ["appointment_days", "residents_days"]
+    if rows:
+        connection.execute(
+            text(
+                f"INSERT OR REPLACE INTO {HOURS_TABLE} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(':' + c for c in columns)})"
+            ),
+            rows
+        )
+
+
+def period_minutes(period_ranges: Dict[str, Dict[str, str]]) -> Dict[str, Tuple[int, int]]:
+    """
+    ``time.period_ranges`` from config.yaml as [start, end) minutes; the
+    configured end ("11:59") is inclusive.
+    """
+    minutes = {}
+    for period, bounds in period_ranges.items():
+        start, end = parse_clock(bounds.get("start")), parse_clock(bounds.get("end"))
+        if start is not None and end is not None:
+            minutes[period] = (start, end + 1)
+    return minutes
+
+
+def _slot_date(date_str: str, date_format: str, today: date) -> Optional[date]:
+    try:
+        parsed = datetime.strptime(date_str, date_format).date()
+    except ValueError:
+        return None
+    if "%Y" in date_format or "%y" in date_format:
+        return parsed
+    # Slots are offered for the coming days only; "Jan 02" seen in late
+    # December is next year.
+    slot = parsed.replace(year=today.year)
+    if (today - slot).days > 180:
+        slot = slot.replace(year=today.year + 1)
+    return slot
+
+
+def pickup_mask(
+    user_prefs: Dict[str, Any],
+    time_cfg: Dict[str, Any],
+    today: Optional[date] = None
+) -> Optional[int]:
+    """
+    Week bitmap (bit ``day * 24 + hour``) of the pickup slots the user chose,
+    e.g. "Oct 17 morning" from the pickup_time question. None when no slot
+    could be read, i.e. no time preference.
+    """
+    slots = user_prefs.get("pickup_time")
+    if not slots:
+        return None
+    if isinstance(slots, str):
+        slots = [slots]
+    today = today or date.today()
+    periods = period_minutes(time_cfg.get("period_ranges", {}))
+    date_format = time_cfg.get("format", {}).get("date", "%b %d")
+    mask = 0
+    for slot in slots:
+        date_str, _, period = str(slot).rpartition(" ")
+        slot_date = _slot_date(date_str, date_format, today)
+        if slot_date is None or period not in periods:
+            continue
+        mask |= hour_mask(*periods[period]) << (slot_date.weekday() * 24)
+    return mask or None
+
+
+class HoursIndex:
+    """
+    In-memory weekly availability per agency: a 168-bit bitmap (bit
+    ``day * 24 + hour``, hour resolution), so an "open on <day> <period>"
+    check is one AND.
+    """
+
+    def __init__(
+        self,
+        bitmaps: Dict[str, int],
+        appointment_days: Optional[Dict[str, int]] = None,
+        residents_days: Optional[Dict[str, int]] = None
+    ):
+        self.bitmaps = bitmaps
+        self.appointment_days = appointment_days or {}
+        self.residents_days = residents_days or {}
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> 'HoursIndex':
+        bitmaps, appointment_days, residents_days = {}, {}, {}
+        for row in rows:
+            agency_id = row["agency_id"]
+            bitmaps[agency_id] = sum(
+                (row[day.lower()] or 0) << (d * 24) for d, day in enumerate(DAYS)
+            )
+            appointment_days[agency_id] = row["appointment_days"]
+            residents_days[agency_id] = row["residents_days"]
+        return cls(bitmaps, appointment_days, residents_days)
+
+    @classmethod
+    def from_sql(cls, engine) -> Optional['HoursIndex']:
+        """
+        Index of the agency_hours table, or None when it has not been built.
+        """
+        with engine.connect() as connection:
+            if not connection.dialect.has_table(connection, HOURS_TABLE):
+                return None
+            rows = connection.execute(text(f"SELECT * FROM {HOURS_TABLE}"))
+            return cls.from_rows(dict(row._mapping) for row in rows)
+
+    def __len__(self) -> int:
+        return len(self.bitmaps)
+
+    def is_open(self, agency_id: str, mask: int) -> Optional[bool]:
+        """
+        Whether the agency is open in any hour of ``mask``; None if unknown.
+        """
+        bitmap = self.bitmaps.get(agency_id)
+        if bitmap is None:
+            return None
+        return bool(bitmap & mask)
+
+    def filter_open(
+        self,
+        agencies: List[Dict[str, Any]],
+        mask: int,
+        id_field: str = "Agency ID"
+    ) -> List[Dict[str, Any]]:
+        """
+        The agencies open in ``mask``, in their original order. Agencies
+        without hours on record are kept.
+        """
+        return [
+            agency for agency in agencies
+            if self.is_open(str(agency.get(id_field, "")), mask) is not False
+        ]
+
+
+_INDEXES: Dict[str, Tuple[Tuple[float, int], Optional[HoursIndex]]] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_hours_index(engine) -> Optional[HoursIndex]:
+    """
+    Process-wide HoursIndex per SQLite database, reloaded when the database
+    file changes; None when the database has no agency_hours table.
+    """
+    db_path = engine.url.database
+    try:
+        stat = os.stat(db_path)
+        signature = (stat.st_mtime, stat.st_size)
+    except (OSError, TypeError):
+        return HoursIndex.from_sql(engine)
+    with _INDEXES_LOCK:
+        cached = _INDEXES.get(db_path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, HoursIndex.from_sql(engine))
+            _INDEXES[db_path] = cached
+        return cached[1]
@@ -1,8 +1,63 @@
+import hashlib
+import json
 import os
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from typing import Dict, List, Optional
 import datetime
 
+from src.db_helper.agencies import AGENCIES_RTREE, AGENCIES_TABLE, write_agencies_table
+from src.db_helper.hours import FULL_DAY, HOURS_TABLE, hours_rows, write_hours_table
+from src.rag_helper.services import SERVICE_MASK_COLUMN, ServiceVocabulary, parse_services
+from src.utilities.config_parser import load_config
+
+# Source file bookkeeping for incremental ingestion.
+MANIFEST_TABLE = '_ingest_manifest'
+
+# Secondary indexes built after ingestion: table -> list of column tuples.
+INDEX_SPECS = {
+    'combined_data': [
+        ('Agency ID',),
+        ('Agency Name',),
+        ('agency_type',),
+    ],
+}
+
+# Full-text tables for the free-text columns: table -> FTS table and its
+# columns (FTS column name -> source column).
+FTS_SPECS = {
+    'combined_data': {
+        'fts_table': 'combined_data_fts',
+        'columns': {
+            'cultures_served': 'Cultural Populations Served',
+            'wraparound_services': 'Wraparound Service',
+        },
+    },
+}
+
+def _add_service_mask(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Bitmask of each row's "Wraparound Service" list, in the bit order of
+    wraparound_service_bits in config.yaml.
+    """
+    if 'Wraparound Service' not in df.columns:
+        return df
+    config = load_config()
+    vocabulary = ServiceVocabulary(
+        config['wraparound_services'],
+        config['user_preferences']['valid_options']['services'],
+        service_bits=config.get('wraparound_service_bits')
+    )
+    df[SERVICE_MASK_COLUMN] = df['Wraparound Service'].map(
+        lambda value: vocabulary.encode(parse_services(value if isinstance(value, str) else None))
+    ).astype('int64')
+    return df
+
+# Columns computed at ingestion: table -> function adding them to the frame.
+DERIVED_COLUMNS = {
+    'combined_data': _add_service_mask,
+}
+
 def _convert_time_columns(df):
     """
     Convert datetime.time objects to ISO format strings
@@ -14,50 +69,391 @@ def _convert_time_columns(df):
             )
     return df
 
-def excel_to_sql(dir_in_root: str) -> str:
+def _quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+def _table_columns(connection, table_name: str) -> List[str]:
+    rows = connection.exec_driver_sql(f"PRAGMA table_info({_quote(table_name)})")
+    return [row[1] for row in rows]
+
+def build_indexes(engine) -> None:
+    """
+    Create the secondary indexes and FTS5 tables declared in INDEX_SPECS and
+    FTS_SPECS for the tables that exist, then refresh planner statistics.
+    """
+    with engine.begin() as connection:
+        for table_name, index_columns in INDEX_SPECS.items():
+            columns = _table_columns(connection, table_name)
+            for cols in index_columns:
+                if not all(col in columns for col in cols):
+                    print(f"Skipping index on {table_name}{list(cols)}: missing column")
+                    continue
+                index_name = "idx_{}_{}".format(
+                    table_name,
+                    "_".join(col.lower().replace(' ', '_') for col in cols)
+                )
+                connection.exec_driver_sql(
+                    f"CREATE INDEX IF NOT EXISTS {_quote(index_name)} "
+                    f"ON {_quote(table_name)} ({', '.join(_quote(c) for c in cols)})"
+                )
+                print(f"{table_name}{list(cols)} → {index_name}")
+
+        for table_name, spec in FTS_SPECS.items():
+            columns = _table_columns(connection, table_name)
+            if not all(col in columns for col in spec['columns'].values()):
+                print(f"Skipping FTS for {table_name}: missing column")
+                continue
+            fts_table = _quote(spec['fts_table'])
+            fts_columns = list(spec['columns'])
+            source_columns = [_quote(c) for c in spec['columns'].values()]
+            # The source table was just replaced, so rebuild the FTS copy too.
+            connection.exec_driver_sql(f"DROP TABLE IF EXISTS {fts_table}")
+            connection.exec_driver_sql(
+                f"CREATE VIRTUAL TABLE {fts_table} USING fts5({', '.join(fts_columns)})"
+            )
+            connection.exec_driver_sql(
+                f"INSERT INTO {fts_table} (rowid, {', '.join(fts_columns)}) "
+                f"SELECT rowid, {', '.join(source_columns)} FROM {_quote(table_name)}"
+            )
+            print(f"{table_name}{list(spec['columns'].values())} → {spec['fts_table']}")
+
+        connection.exec_driver_sql("ANALYZE")
+
+def report_query_plans(engine) -> Dict[str, List[str]]:
+    """
+    EXPLAIN QUERY PLAN for the pipeline's standard queries, to verify that the
+    lookups use the indexes above.
+
+    :return: query name -> plan detail lines.
+    """
+    from src.rag_helper.langchain import DietaryFilterGenerator, QueryBuilder
+    from src.rag_helper.dietary_rules import DietaryRuleEngine
+    from src.utilities.config_parser import load_config
+
+    rule_engine = DietaryRuleEngine(
+        DietaryFilterGenerator.DIETARY_RULES,
+        load_config()["user_preferences"]["valid_options"],
+        fts_table=FTS_SPECS['combined_data']['fts_table']
+    )
+    standard_queries = {
+        "candidates": {},
+        "candidates_health": {"health_dietary_restrictions": ["Diabetic Meal"]},
+        "candidates_halal": {"religious_dietary_restrictions": ["Halal Meal"]},
+    }
+    plans = {}
+    with engine.begin() as connection:
+        connection.execute(text(QueryBuilder.CREATE_CANDIDATES))
+        crosswalk = connection.dialect.has_table(connection, QueryBuilder.CROSSWALK_TABLE)
+        for name, user_prefs in standard_queries.items():
+            query = QueryBuilder.build_query([], rule_engine.compile(user_prefs), crosswalk=crosswalk)
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {query.sql}"), query.params)
+            plans[name] = [row[-1] for row in rows]
+        if connection.dialect.has_table(connection, AGENCIES_RTREE):
+            query = QueryBuilder.build_fused_query(
+                38.9, -77.0, 10.0, rule_engine.compile(standard_queries["candidates_halal"]),
+                hours_mask=FULL_DAY
+            )
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {query.sql}"), query.params)
+            plans["agencies_fused"] = [row[-1] for row in rows]
+    for name, lines in plans.items():
+        print(f"-- {name}")
+        for line in lines:
+            print(f"   {line}")
+    return plans
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_path(file_path: str, sha256: str) -> str:
+    """
+    Parquet cache of the parsed frame, next to the source and keyed by content.
+    """
+    stem, _ = os.path.splitext(file_path)
+    return f"{stem}.{sha256[:16]}.parquet"
+
+def _read_source(file_path: str) -> pd.DataFrame:
+    """
+    Read an Excel file and normalize time/date columns to strings.
+    """
+    df = pd.read_excel(file_path)
+    df = _convert_time_columns(df)
+    # Handle date columns explicitly.
+    date_cols = df.select_dtypes(include=['datetime64']).columns
+    for col in date_cols:
+        df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+def _load_frame(file_path: str, sha256: str) -> pd.DataFrame:
+    """
+    Parsed frame for a source file, from the Parquet cache when available.
+    """
+    cache_path = _cache_path(file_path, sha256)
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+    df = _read_source(file_path)
+    try:
+        df.to_parquet(cache_path, index=False)
+        # Drop caches of older versions of the same file.
+        prefix = os.path.splitext(file_path)[0] + '.'
+        for name in os.listdir(os.path.dirname(file_path)):
+            old = os.path.join(os.path.dirname(file_path), name)
+            if old.startswith(prefix) and old.endswith('.parquet') and old != cache_path:
+                os.remove(old)
+    except Exception as e:
+        print(f"Could not cache {os.path.basename(file_path)} as Parquet: {str(e)}")
+    return df
+
+def _read_manifest(connection) -> Dict[str, Dict]:
+    connection.exec_driver_sql(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            file_name TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            sha256 TEXT NOT NULL,
+            mtime REAL NOT NULL,
+            size INTEGER NOT NULL,
+            row_count INTEGER,
+            ingested_at TEXT
+        )
+    """)
+    rows = connection.exec_driver_sql(
+        f"SELECT file_name, table_name, sha256, mtime, size FROM {MANIFEST_TABLE}"
+    )
+    return {row[0]: dict(row._mapping) for row in rows}
+
+def excel_to_sql(dir_in_root: str, force: bool = False, db_path: Optional[str] = None) -> str:
     """
     Convert Excel files in the specified directory to SQLite database tables.
 
-    The directory should be located in the project root directory.
+    The directory should be located in the project root directory. Ingestion
+    is incremental: a manifest table records each source file's content hash,
+    mtime and size, unchanged files are skipped, parsed frames are cached as
+    Parquet next to the source, and all changed tables are written in a single
+    transaction. After a change, secondary indexes and FTS tables are rebuilt,
+    ANALYZE is run and the query plans of the pipeline's standard queries are
+    reported.
 
-    :param dir_in_root: directory (just name) containing Excel files.
+    :param dir_in_root: directory (just name) containing Excel files; an
+        absolute path is used as is.
+    :param force: re-ingest every file regardless of the manifest.
+    :param db_path: SQLite database; defaults to data/cafb.db.
     :return: path to the SQLite database.
     """
     # Configure paths.
     project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    data_dir = os.path.join(project_root, 'data')
-    db_path = os.path.join(project_root, 'data', 'cafb.db')
+    data_dir = os.path.join(project_root, dir_in_root)
+    if db_path is None:
+        db_path = os.path.join(project_root, 'data', 'cafb.db')
     # Create engine.
     engine = create_engine(f'sqlite:///{db_path}')
-    # Process files.
-    for filename in os.listdir(data_dir):
+    with engine.begin() as connection:
+        manifest = _read_manifest(connection)
+        existing_tables = {
+            row[0] for row in connection.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+    # Find changed files.
+    changed = []
+    for filename in sorted(os.listdir(data_dir)):
         if filename.endswith('.xlsx'):
             file_path = os.path.join(data_dir, filename)
             table_name = os.path.splitext(filename)[0] \
                 .replace(' ', '_') \
                 .replace('-', '_') \
                 .lower()
-            try:
-                # Read and preprocess data.
-                df = pd.read_excel(file_path)
-                df = _convert_time_columns(df)
-                # Handle date columns explicitly.
-                date_cols = df.select_dtypes(include=['datetime64']).columns
-                for col in date_cols:
-                    df[col] = df[col].dt.strftime('%Y-%m-%d %H:%M:%S')
-                # Store in database.
-                df.to_sql(
-                    name=table_name,
-                    con=engine,
-                    index=False,
-                    if_exists='replace',
-                    chunksize=500
-                )
-                print(f"{filename} → {table_name}")
-            except Exception as e:
-                print(f"Error with {filename}: {str(e)}")
-    return db_path  
+            stat = os.stat(file_path)
+            entry = manifest.get(filename)
+            up_to_date = (
+                not force
+                and entry is not None
+                and entry['table_name'] in existing_tables
+            )
+            # Same mtime and size: trust the manifest without hashing.
+            if up_to_date and entry['mtime'] == stat.st_mtime and entry['size'] == stat.st_size:
+                continue
+            sha256 = _file_sha256(file_path)
+            if up_to_date and entry['sha256'] == sha256:
+                with engine.begin() as connection:
+                    connection.exec_driver_sql(
+                        f"UPDATE {MANIFEST_TABLE} SET mtime = ?, size = ? WHERE file_name = ?",
+                        (stat.st_mtime, stat.st_size, filename)
+                    )
+                continue
+            changed.append((filename, file_path, table_name, sha256, stat))
+
+    if not changed:
+        print("All tables up to date.")
+        return db_path
+
+    # Read and preprocess data.
+    frames = []
+    for filename, file_path, table_name, sha256, stat in changed:
+        try:
+            frames.append((filename, table_name, sha256, stat, _load_frame(file_path, sha256)))
+        except Exception as e:
+            print(f"Error with {filename}: {str(e)}")
+    # Store in database, all changed tables at once.
+    with engine.begin() as connection:
+        for filename, table_name, sha256, stat, df in frames:
+            if table_name in DERIVED_COLUMNS:
+                df = DERIVED_COLUMNS[table_name](df)
+            df.to_sql(
+                name=table_name,
+                con=connection,
+                index=False,
+                if_exists='replace',
+                chunksize=500
+            )
+            connection.exec_driver_sql(
+                f"INSERT OR REPLACE INTO {MANIFEST_TABLE} "
+                "(file_name, table_name, sha256, mtime, size, row_count, ingested_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (filename, table_name, sha256, stat.st_mtime, stat.st_size,
+                 len(df), datetime.datetime.now().isoformat(timespec='seconds'))
+            )
+            print(f"{filename} → {table_name}")
+    # Build indexes and check the standard queries use them.
+    build_indexes(engine)
+    try:
+        report_query_plans(engine)
+    except ImportError as e:
+        print(f"Skipping query plan report ({str(e)}); run as `python -m src.db_helper.sql_helper`")
+    return db_path
+
+def arcgis_hours_to_sql(
+    snapshot_in_root: str,
+    force: bool = False,
+    db_path: Optional[str] = None
+) -> str:
+    """
+    Parse the per-day opening hours of an ArcGIS agency snapshot (same shape
+    as data/external/arcgis_data.json) into the agency_hours table: one
+    24-bit hour mask per weekday plus the by-appointment and residents-only
+    days, keyed by agency_ref. Skipped when the manifest shows the snapshot
+    unchanged.
+
+    :param snapshot_in_root: snapshot path relative to the project root; an
+        absolute path is used as is.
+    :param force: rebuild regardless of the manifest.
+    :param db_path: SQLite database; defaults to data/cafb.db.
+    :return: path to the SQLite database.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    snapshot_path = os.path.join(project_root, snapshot_in_root)
+    if db_path is None:
+        db_path = os.path.join(project_root, 'data', 'cafb.db')
+    engine = create_engine(f'sqlite:///{db_path}')
+    filename = os.path.basename(snapshot_path)
+    stat = os.stat(snapshot_path)
+    sha256 = _file_sha256(snapshot_path)
+    with engine.begin() as connection:
+        entry = _read_manifest(connection).get(filename)
+        if (
+            not force
+            and entry is not None
+            and entry['sha256'] == sha256
+            and connection.dialect.has_table(connection, HOURS_TABLE)
+        ):
+            print(f"{HOURS_TABLE} up to date.")
+            return db_path
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        rows = hours_rows(json.load(f))
+    with engine.begin() as connection:
+        write_hours_table(connection, rows)
+        connection.exec_driver_sql(
+            f"INSERT OR REPLACE INTO {MANIFEST_TABLE} "
+            "(file_name, table_name, sha256, mtime, size, row_count, ingested_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (filename, HOURS_TABLE, sha256, stat.st_mtime, stat.st_size,
+             len(rows), datetime.datetime.now().isoformat(timespec='seconds'))
+        )
+    print(f"{filename} → {HOURS_TABLE} ({len(rows)} agencies)")
+    return db_path
+
+def materialize_agencies(db_path: Optional[str] = None) -> str:
+    """
+    Rebuild the agencies table and its R*Tree from combined_data, agency_hours
+    and, when built, agency_crosswalk, for FoodAssistanceRAG's single-query
+    search. Run after the tables it reads have been refreshed.
+
+    :param db_path: SQLite database; defaults to data/cafb.db.
+    :return: path to the SQLite database.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if db_path is None:
+        db_path = os.path.join(project_root, 'data', 'cafb.db')
+    engine = create_engine(f'sqlite:///{db_path}')
+    with engine.begin() as connection:
+        row_count = write_agencies_table(connection)
+        connection.exec_driver_sql(f"ANALYZE {AGENCIES_TABLE}")
+    print(f"combined_data → {AGENCIES_TABLE} + {AGENCIES_RTREE} ({row_count} rows)")
+    return db_path
+
+# Tables exported for the DuckDB backend (src/db_helper/backends.py), each
+# with its SQLite rowid as row_id.
+PARQUET_TABLES = ['combined_data', HOURS_TABLE, 'agency_crosswalk', AGENCIES_TABLE]
+# Small row groups give DuckDB min/max statistics to skip on.
+PARQUET_ROW_GROUP_SIZE = 32768
+
+def _parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast object columns holding mixed types (SQLite is dynamically typed) to
+    strings, which Parquet's one-type-per-column needs.
+    """
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith('mixed'):
+            df[col] = df[col].map(lambda x: x if x is None else str(x))
+    return df
+
+def export_parquet(db_path: Optional[str] = None, parquet_dir: Optional[str] = None) -> str:
+    """
+    Export the PARQUET_TABLES of the SQLite database to one Parquet file per
+    table, for the columnar DuckDB backend. The agencies table is sorted by
+    latitude so its bounding-box filter skips row groups. Run after the
+    database has been rebuilt.
+
+    :param db_path: SQLite database; defaults to data/cafb.db.
+    :param parquet_dir: output directory; defaults to data/parquet.
+    :return: the Parquet directory.
+    """
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if db_path is None:
+        db_path = os.path.join(project_root, 'data', 'cafb.db')
+    if parquet_dir is None:
+        parquet_dir = os.path.join(project_root, 'data', 'parquet')
+    os.makedirs(parquet_dir, exist_ok=True)
+    engine = create_engine(f'sqlite:///{db_path}')
+    with engine.connect() as connection:
+        for table_name in PARQUET_TABLES:
+            if not connection.dialect.has_table(connection, table_name):
+                print(f"Skipping {table_name}: not built")
+                continue
+            if table_name == AGENCIES_TABLE:
+                query = f"SELECT * FROM {_quote(table_name)} ORDER BY lat"
+            else:
+                query = f"SELECT rowid AS row_id, * FROM {_quote(table_name)}"
+            df = _parquet_safe(pd.read_sql(query, connection))
+            path = os.path.join(parquet_dir, f"{table_name}.parquet")
+            # Readers never see a half-written file.
+            df.to_parquet(path + '.tmp', index=False, row_group_size=PARQUET_ROW_GROUP_SIZE)
+            os.replace(path + '.tmp', path)
+            print(f"{table_name} → {path} ({len(df)} rows)")
+    engine.dispose()
+    return parquet_dir
 
 
 if __name__ == "__main__":
-    print(excel_to_sql('data'))
\ No newline at end of file
+    import sys
+    print(excel_to_sql('data', force='--force' in sys.argv))
+    print(arcgis_hours_to_sql(os.path.join('data', 'external', 'arcgis_data.json'),
+                              force='--force' in sys.argv))
+    if '--crosswalk' in sys.argv:
+        from src.preprocess.crosswalk import main as build_crosswalk
+        build_crosswalk()
+    print(materialize_agencies())
+    if '--parquet' in sys.argv:
+        print(export_parquet())
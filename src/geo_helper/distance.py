@@ -0,0 +1,99 @@
+from typing import Optional, Tuple
+
+import numpy as np
+from geopy.distance import geodesic
+
+EARTH_RADIUS_MILES = 3958.7613
+
+# Haversine (sphere) vs. geodesic (WGS 84 ellipsoid) differ by at most ~0.5%.
+# Points whose haversine distance is within this relative band of the radius
+# are re-checked with the exact geodesic; everything else is decided in bulk.
+EDGE_TOLERANCE = 0.005
+
+
+def haversine_miles(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> np.ndarray:
+    """
+    Great-circle distance in miles from one point to arrays of points.
+    """
+    lat1 = np.radians(lat)
+    lat2 = np.radians(np.asarray(lats, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(lons, dtype=float)) - np.radians(lon)
+    a = np.sin(dlat / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def geodesic_miles(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> np.ndarray:
+    """
+    Exact WGS 84 geodesic distance in miles (one solve per point).
+    """
+    return np.array(
+        [geodesic((lat, lon), (y, x)).miles for y, x in zip(lats, lons)],
+        dtype=float
+    )
+
+
+def nearest_within(
+    lat: float,
+    lon: float,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    radius_miles: Optional[float] = None,
+    limit: Optional[int] = None,
+    edge_tolerance: float = EDGE_TOLERANCE,
+    exact_results: bool = False
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Indices and distances of the points within ``radius_miles``, nearest
+    first, truncated to ``limit``.
+
+    Haversine filters, ranks and measures all points in one vectorized pass.
+    Exact geodesics are computed only where haversine could decide wrongly:
+    for points within ``edge_tolerance`` of the radius and of the
+    ``limit``-th distance, whose distances are then geodesic. With
+    ``exact_results`` every returned distance is geodesic.
+
+    :return: (indices into lats/lons, distances in miles)
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    distances = haversine_miles(lat, lon, lats, lons)
+    exact = np.zeros(distances.size, dtype=bool)
+    candidates = np.arange(distances.size)
+
+    def settle(points: np.ndarray) -> None:
+        # Replace the haversine distances of ``points`` with geodesics, once.
+        points = points[~exact[points]]
+        if points.size:
+            distances[points] = geodesic_miles(lat, lon, lats[points], lons[points])
+            exact[points] = True
+
+    if radius_miles is not None:
+        upper = radius_miles * (1.0 + edge_tolerance)
+        lower = radius_miles * (1.0 - edge_tolerance)
+        candidates = candidates[distances[candidates] <= upper]
+        settle(candidates[distances[candidates] > lower])
+        candidates = candidates[distances[candidates] <= radius_miles]
+
+    # Partial selection: keep the ``limit`` nearest plus every point within
+    # the tolerance of the limit-th distance, whose exact order decides
+    # which of them make the cut.
+    if limit is not None and limit < candidates.size:
+        kth = np.partition(distances[candidates], limit - 1)[limit - 1]
+        candidates = candidates[distances[candidates] <= kth * (1.0 + edge_tolerance)]
+        settle(candidates[distances[candidates] >= kth * (1.0 - edge_tolerance)])
+
+    if exact_results:
+        settle(candidates)
+    order = np.argsort(distances[candidates], kind='stable')[:limit]
+    return candidates[order], distances[candidates[order]]
@@ -1,17 +1,127 @@
+import asyncio
 import pandas as pd
 import os
-from typing import Tuple, Dict, Any, List
+import time
+from typing import Tuple, Dict, Any, List, Optional
 from arcgis.gis import GIS
 from arcgis.geocoding import geocode
 from arcgis.geometry import Geometry
 from arcgis.features import FeatureLayer
-from geopy.distance import geodesic
 
 from src.utilities.logger import Logger
+from src.geo_helper.distance import nearest_within
+from src.geo_helper.geocode_cache import GeocodeCache, get_geocode_cache, normalize_address
+from src.geo_helper.spatial_index import get_spatial_index
+from src.utilities.cassette import Cassette, get_cassette
+from src.utilities.tracing import set_attributes, trace_stage
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
 
 class GeoHelper:
-    def __init__(self):
+    def __init__(
+        self,
+        snapshot_path: Optional[str] = None,
+        geocode_cache: Optional[GeocodeCache] = None,
+        cassette: Optional[Cassette] = None
+    ):
+        """
+        :param snapshot_path: optional agency snapshot (same shape as
+            data/external/arcgis_data.json). When given, searches are served
+            from an in-memory spatial index instead of the Excel export.
+        :param geocode_cache: optional cache consulted before the geocoder.
+        :param cassette: optional cassette the ArcGIS geocoder calls are
+            recorded to or replayed from.
+        """
         self.logger = Logger()
+        self.spatial_index = get_spatial_index(snapshot_path) if snapshot_path else None
+        self.geocode_cache = geocode_cache
+        self.cassette = cassette
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'GeoHelper':
+        """
+        Build a GeoHelper from the ``geo`` section of configs/config.yaml.
+        Relative paths are resolved against the project root.
+        """
+        geo_cfg = config.get("geo", {})
+        local_index = geo_cfg.get("local_index", {})
+        snapshot_path = None
+        if local_index.get("enabled"):
+            snapshot_path = os.path.join(PROJECT_DIR, local_index["snapshot_path"])
+
+        cache_cfg = geo_cfg.get("geocode_cache", {})
+        cache = None
+        if cache_cfg.get("enabled"):
+            cache = get_geocode_cache(
+                os.path.join(PROJECT_DIR, cache_cfg["db_path"]),
+                ttl_seconds=cache_cfg.get("ttl_days", 30) * 24 * 3600,
+                max_memory_entries=cache_cfg.get("max_memory_entries", 1024),
+                min_score=cache_cfg.get("min_score", 0.0)
+            )
+        return cls(
+            snapshot_path=snapshot_path,
+            geocode_cache=cache,
+            cassette=get_cassette(config, "arcgis")
+        )
+
+    def geocode_address(self, address: str) -> Tuple[float, float]:
+        """
+        Geocode an address to (lat, lon), using the geocode cache if configured.
+        """
+        replay = self.cassette is not None and self.cassette.mode == "replay"
+        with trace_stage("geo.geocode", **{"geo.replay": replay}) as stage_span:
+            if self.geocode_cache is not None:
+                cached = self.geocode_cache.get(address)
+                set_attributes(stage_span, **{"geo.cache_hit": cached is not None})
+                if cached is not None:
+                    lat, lon, score = cached
+                    set_attributes(stage_span, **{"geo.score": score})
+                    self.logger.info(
+                        f"Geocode cache hit for {address}: lat: {lat}, lon: {lon} with confidence: {score}"
+                    )
+                    return lat, lon
+
+            geocoded = self._geocode(address)
+            lat = geocoded['location']['y']
+            lon = geocoded['location']['x']
+            set_attributes(stage_span, **{"geo.score": geocoded['score']})
+            self.logger.info(
+                f"Geocoded {address} to lat: {lat}, lon: {lon} with confidence: {geocoded['score']}"
+            )
+            if self.geocode_cache is not None:
+                self.geocode_cache.put(address, lat, lon, geocoded['score'])
+            return lat, lon
+
+    def _geocode(self, address: str) -> Dict[str, Any]:
+        """
+        Best ArcGIS geocoder candidate for an address, through the cassette
+        when one is configured.
+        """
+        request = {"geocode": normalize_address(address)}
+        if self.cassette is not None and self.cassette.mode == "replay":
+            return self.cassette.replay(request)
+
+        start = time.perf_counter()
+        # Connect to CAFB's ArcGIS portal anonymously
+        gis = GIS()
+
+        geocoded = geocode(address)[0]
+        if self.cassette is not None:
+            self.cassette.record(
+                request,
+                {"location": dict(geocoded['location']), "score": geocoded['score']},
+                time.perf_counter() - start
+            )
+        return geocoded
+
+    async def ageocode_address(self, address: str) -> Tuple[float, float]:
+        """
+        Async variant of geocode_address. The ArcGIS SDK is blocking, so the
+        lookup runs in a worker thread and the event loop stays free.
+        """
+        return await asyncio.to_thread(self.geocode_address, address)
 
     def find_nearby_food_assistance(
         self,
@@ -21,37 +131,72 @@ class GeoHelper:
     ) -> pd.DataFrame:
         """
         Find nearby food assistance locations using CAFB's ArcGIS portal.
+
+        Without ``radius_miles`` and with a local index, returns the ``limit``
+        nearest agencies.
         """
-        project_dir = os.path.dirname(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        )
         self.logger.info(f"Finding nearby food assistance for address: {address}")
-        # Connect to CAFB's ArcGIS portal anonymously
-        gis = GIS()
+        with trace_stage(
+            "geo.find_nearby",
+            **{"geo.radius_miles": radius_miles, "geo.limit": limit}
+        ) as stage_span:
+            lat, lon = self.geocode_address(address)
+            backend = "spatial_index" if self.spatial_index is not None else "excel"
+            with trace_stage("geo.search", **{"geo.backend": backend}) as search_span:
+                results = self._search(lat, lon, radius_miles, limit)
+                set_attributes(search_span, **{"geo.results": len(results)})
+            set_attributes(stage_span, **{"geo.results": len(results)})
 
-        # Geocode the input address
-        geocoded = geocode(address)[0]
-        lat = geocoded['location']['y']
-        lon = geocoded['location']['x']
-        self.logger.info(
-            f"Geocoded {address} to lat: {lat}, lon: {lon} with confidence: {geocoded['score']}"
-        )
+        self.logger.info(f"Found {len(results)} nearby food assistance locations.")
+        return results
+
+    def _search(
+        self,
+        lat: float,
+        lon: float,
+        radius_miles: Optional[float],
+        limit: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Agencies near (lat, lon), nearest first, from the local index or the
+        Excel export.
+        """
+        if self.spatial_index is not None:
+            if radius_miles is None:
+                return self.spatial_index.query_nearest(
+                    lat, lon, k=limit if limit is not None else len(self.spatial_index)
+                )
+            return self.spatial_index.query_radius(
+                lat, lon, radius_miles=radius_miles, limit=limit
+            )
 
         # Access CAFB food data, sort and filter
         data = pd.read_excel(
-            os.path.join(project_dir, 'data', 'CAFB_Markets_Shopping_Partners.xlsx')
+            os.path.join(PROJECT_DIR, 'data', 'CAFB_Markets_Shopping_Partners.xlsx')
         )
         data = data[data['x'].notna() & data['y'].notna()]
-        data["Distance"] = data.apply(
-            lambda x: geodesic((lat, lon), (x["y"], x["x"])).miles, axis=1
+        # The export has one row per distribution slot; rank each agency once.
+        data = data.drop_duplicates(subset=["Agency ID", "Agency Name"]).reset_index(drop=True)
+        indices, distances = nearest_within(
+            lat, lon,
+            data["y"].to_numpy(),
+            data["x"].to_numpy(),
+            radius_miles=radius_miles,
+            limit=limit
+        )
+        data = data.loc[indices, ["Agency ID", "Agency Name"]]
+        data["Distance"] = distances
+        return data.to_dict(orient='records')
+
+    async def afind_nearby_food_assistance(
+        self,
+        address: str,
+        radius_miles: int = None,
+        limit: int = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Async variant of find_nearby_food_assistance, run in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.find_nearby_food_assistance, address, radius_miles, limit
         )
-        data = data.sort_values(by="Distance").reset_index(drop=True)
-        if radius_miles is not None:
-            data = data[data["Distance"] <= radius_miles].drop_duplicates()
-        data = data[["Agency ID", "Agency Name", "Distance"]].drop_duplicates()
-
-        self.logger.info(f"Found {data.shape[0]} nearby food assistance locations.")
-        if limit is None:
-            return data.to_dict(orient='records')
-        else: 
-            return data.head(limit).to_dict(orient='records')
\ No newline at end of file
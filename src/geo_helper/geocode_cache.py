@@ -0,0 +1,163 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from src.utilities.logger import Logger
+
+# (lat, lon, score)
+GeocodeResult = Tuple[float, float, float]
+
+
+def normalize_address(address: str) -> str:
+    """
+    Cache key for an address: lowercase, punctuation dropped, whitespace collapsed.
+
+    >>> normalize_address("  700 Southern Ave. SE,  Washington, DC ")
+    '700 southern ave se washington dc'
+    """
+    address = re.sub(r"[^\w\s#-]", " ", address.lower())
+    return re.sub(r"\s+", " ", address).strip()
+
+
+class GeocodeCache:
+    """
+    Two-tier geocode cache: an in-process LRU in front of a SQLite table.
+
+    The SQLite tier survives restarts; entries expire after ``ttl_seconds``
+    and carry the geocoder's confidence score and a hit counter.
+    """
+
+    HIT_FLUSH_THRESHOLD = 50
+
+    def __init__(
+        self,
+        db_path: str,
+        ttl_seconds: float = 30 * 24 * 3600,
+        max_memory_entries: int = 1024,
+        min_score: float = 0.0
+    ):
+        self.logger = Logger()
+        self.db_path = os.path.abspath(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.min_score = min_score
+        self._memory: "OrderedDict[str, Tuple[GeocodeResult, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending_hits: Dict[str, int] = {}
+        self.stats: Dict[str, int] = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS geocode_cache (
+                address_key TEXT PRIMARY KEY,
+                address TEXT,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                score REAL,
+                created_at REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                last_hit_at REAL
+            )
+        """)
+        self._conn.commit()
+
+    def _flush_hits(self, now: float) -> None:
+        if not self._pending_hits:
+            return
+        self._conn.executemany(
+            "UPDATE geocode_cache SET hits = hits + ?, last_hit_at = ? "
+            "WHERE address_key = ?",
+            [(count, now, key) for key, count in self._pending_hits.items()]
+        )
+        self._conn.commit()
+        self._pending_hits.clear()
+
+    def _remember(self, key: str, result: GeocodeResult, created_at: float) -> None:
+        self._memory[key] = (result, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, address: str) -> Optional[GeocodeResult]:
+        """
+        Cached (lat, lon, score) for an address, or None on a miss.
+        """
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and now - entry[1] <= self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                # Memory hits are counted in batches to keep disk off the hot path.
+                self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+                if sum(self._pending_hits.values()) >= self.HIT_FLUSH_THRESHOLD:
+                    self._flush_hits(now)
+                return entry[0]
+            self._memory.pop(key, None)
+
+            row = self._conn.execute(
+                "SELECT lat, lon, score, created_at FROM geocode_cache "
+                "WHERE address_key = ?",
+                (key,)
+            ).fetchone()
+            if row is None or now - row[3] > self.ttl_seconds:
+                self.stats["misses"] += 1
+                return None
+            result = (row[0], row[1], row[2])
+            self._pending_hits[key] = self._pending_hits.get(key, 0) + 1
+            self._flush_hits(now)
+            self._remember(key, result, row[3])
+            self.stats["disk_hits"] += 1
+            return result
+
+    def put(self, address: str, lat: float, lon: float, score: float) -> None:
+        """
+        Store a geocode result; results below ``min_score`` are not cached.
+        """
+        if score is not None and score < self.min_score:
+            return
+        key = normalize_address(address)
+        now = time.time()
+        with self._lock:
+            self._flush_hits(now)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO geocode_cache "
+                "(address_key, address, lat, lon, score, created_at, hits, last_hit_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, 0, NULL)",
+                (key, address, lat, lon, score, now)
+            )
+            self._conn.commit()
+            self._remember(key, (lat, lon, score), now)
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired rows from the SQLite tier. Returns the number removed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM geocode_cache WHERE created_at < ?",
+                (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+
+_CACHES: Dict[str, GeocodeCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_geocode_cache(db_path: str, **kwargs) -> GeocodeCache:
+    """
+    Process-wide cache per database file, created on first use.
+    """
+    key = os.path.abspath(db_path)
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = GeocodeCache(key, **kwargs)
+        return _CACHES[key]
@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from src.utilities.logger import Logger
+from src.geo_helper.distance import EDGE_TOLERANCE, nearest_within
+
+EARTH_RADIUS_MILES = 3958.7613
+
+
+def _to_unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """
+    Project lat/lon (degrees) onto the unit sphere.
+
+    Euclidean (chord) distance between two unit vectors is a monotonic
+    function of their great-circle distance, so a plain KD-tree over these
+    points answers haversine radius and k-nearest queries exactly.
+    """
+    lat_r = np.radians(lat)
+    lon_r = np.radians(lon)
+    cos_lat = np.cos(lat_r)
+    return np.column_stack((
+        cos_lat * np.cos(lon_r),
+        cos_lat * np.sin(lon_r),
+        np.sin(lat_r)
+    ))
+
+
+def _miles_to_chord(miles: float) -> float:
+    return 2.0 * np.sin(min(miles / EARTH_RADIUS_MILES, np.pi) / 2.0)
+
+
+class AgencySpatialIndex:
+    """
+    In-memory spatial index over an agency snapshot.
+
+    The snapshot is a JSON list of agency records with the same shape as
+    data/external/arcgis_data.json (``agency_ref``, ``name``, ``latitude``,
+    ``longitude``, ...). It is loaded once, queried in memory and reloaded
+    automatically when the file on disk changes.
+    """
+
+    def __init__(
+        self,
+        snapshot_path: str,
+        id_field: str = "agency_ref",
+        name_field: str = "name",
+        lat_field: str = "latitude",
+        lon_field: str = "longitude"
+    ):
+        self.logger = Logger()
+        self.snapshot_path = os.path.abspath(snapshot_path)
+        self.id_field = id_field
+        self.name_field = name_field
+        self.lat_field = lat_field
+        self.lon_field = lon_field
+        self._lock = threading.Lock()
+        self._signature: Optional[Tuple[float, int]] = None
+        self._records: List[Dict[str, Any]] = []
+        self._coords = np.empty((0, 2))
+        self._tree: Optional[cKDTree] = None
+        self.load()
+
+    def _file_signature(self) -> Tuple[float, int]:
+        stat = os.stat(self.snapshot_path)
+        return stat.st_mtime, stat.st_size
+
+    def load(self) -> None:
+        """
+        (Re)build the index from the snapshot file.
+        """
+        signature = self._file_signature()
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            features = json.load(f)
+
+        records = []
+        coords = []
+        for props in features:
+            lat = props.get(self.lat_field)
+            lon = props.get(self.lon_field)
+            if not props.get(self.id_field) or lat is None or lon is None:
+                continue
+            records.append(props)
+            coords.append((float(lat), float(lon)))
+        coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        tree = cKDTree(_to_unit_vectors(coords[:, 0], coords[:, 1])) if len(coords) else None
+
+        # Swap in the new state atomically so concurrent readers never see
+        # a half-built index.
+        with self._lock:
+            self._records = records
+            self._coords = coords
+            self._tree = tree
+            self._signature = signature
+        self.logger.info(
+            f"Loaded {len(records)} agencies into spatial index from {self.snapshot_path}"
+        )
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload the snapshot if its mtime or size changed since the last load.
+        """
+        try:
+            changed = self._file_signature() != self._signature
+        except OSError as e:
+            self.logger.warning(f"Snapshot not readable, keeping current index: {str(e)}")
+            return False
+        if changed:
+            self.load()
+        return changed
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _to_results(
+        self,
+        records: List[Dict[str, Any]],
+        indices: np.ndarray,
+        distances: np.ndarray
+    ) -> List[Dict[str, Any]]:
+        return [
+            {
+                'Agency ID': records[i][self.id_field],
+                'Agency Name': records[i].get(self.name_field),
+                'Distance': float(d),
+            }
+            for i, d in zip(indices, distances)
+        ]
+
+    def query_radius(
+        self,
+        lat: float,
+        lon: float,
+        radius_miles: float,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Agencies within ``radius_miles`` of (lat, lon), nearest first.
+        """
+        self.reload_if_changed()
+        with self._lock:
+            tree, records, all_coords = self._tree, self._records, self._coords
+        if tree is None:
+            return []
+        point = _to_unit_vectors(np.array([lat]), np.array([lon]))[0]
+        # Over-fetch by the sphere/ellipsoid tolerance; nearest_within settles
+        # the edge with exact geodesics.
+        indices = np.asarray(
+            tree.query_ball_point(
+                point, _miles_to_chord(radius_miles * (1.0 + EDGE_TOLERANCE))
+            ),
+            dtype=int
+        )
+        if indices.size == 0:
+            return []
+        coords = all_coords[indices]
+        order, distances = nearest_within(
+            lat, lon, coords[:, 0], coords[:, 1],
+            radius_miles=radius_miles,
+            limit=limit
+        )
+        return self._to_results(records, indices[order], distances)
+
+    def query_nearest(
+        self,
+        lat: float,
+        lon: float,
+        k: int
+    ) -> List[Dict[str, Any]]:
+        """
+        The ``k`` agencies nearest to (lat, lon), nearest first, with the
+        same distances as query_radius.
+        """
+        self.reload_if_changed()
+        with self._lock:
+            tree, records, all_coords = self._tree, self._records, self._coords
+        if tree is None or k <= 0:
+            return []
+        k = min(k, len(records))
+        point = _to_unit_vectors(np.array([lat]), np.array([lon]))[0]
+        _, indices = tree.query(point, k=k)
+        indices = np.atleast_1d(indices)
+        # The tree ranks by chord; nearest_within measures the k rows the
+        # way query_radius does.
+        coords = all_coords[indices]
+        order, distances = nearest_within(lat, lon, coords[:, 0], coords[:, 1])
+        return self._to_results(records, indices[order], distances)
+
+
+_INDEXES: Dict[str, AgencySpatialIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_spatial_index(snapshot_path: str) -> AgencySpatialIndex:
+    """
+    Process-wide index per snapshot file, built on first use.
+    """
+    key = os.path.abspath(snapshot_path)
+    with _INDEXES_LOCK:
+        if key not in _INDEXES:
+            _INDEXES[key] = AgencySpatialIndex(key)
+        return _INDEXES[key]
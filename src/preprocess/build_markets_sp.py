@@ -1,6 +1,14 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import numpy as np
 import copy
+from sqlalchemy import create_engine
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
 
 
 def _filter_markets_hoo(
@@ -40,40 +48,51 @@ def _filter_shopping_partners_hoo(
     return shopping_partners_hoo
 
 
-def _squeeze_wrap_around_services(
-        sp_wrap_serv
-    ):
-    # All wraparound services in a single cell for each agency
-    SP_services = sp_wrap_serv.groupby('Agency ID')[
-        'Wraparound Service'
-    ].apply(lambda x: ', '.join(x)).reset_index()
-    SP_wrap_services = sp_wrap_serv.copy()
-    SP_wrap_services.drop(columns=['Wraparound Service'], inplace=True)
-
-    # Merge wraparound services list with the original data
-    SP_wrap_services = pd.merge(
-        SP_wrap_services, SP_services, 
-        on='Agency ID', 
-        how='left'
-    )
-    SP_wrap_services.drop_duplicates(inplace=True)
+# Source workbooks, keyed by the name used in main().
+WORKBOOKS = {
+    'markets_hoo': 'CAFB_Markets_HOO.xlsx',
+    'markets_cultures': 'CAFB_Markets_Cultures_Served.xlsx',
+    'markets_wrap_serv': 'CAFB_Markets_Wraparound_Services.xlsx',
+    'sp_hoo': 'CAFB_Shopping_Partners_HOO.xlsx',
+    'sp_cultures': 'CAFB_Shopping_Partners_Cultures_Served.xlsx',
+    'sp_wrap_serv': 'CAFB_Shopping_Partners_Wraparound_Services.xlsx',
+}
 
-    return SP_wrap_services
+OUTPUT_TABLE = 'markets_shopping_partners'
 
 
-def main():
-    # Load the data from Excel files
-    markets_hoo = pd.read_excel('CAFB_Markets_HOO.xlsx')
-    markets_cultures = pd.read_excel('CAFB_Markets_Cultures_Served.xlsx')
-    markets_wrap_serv = pd.read_excel('CAFB_Markets_Wraparound_Services.xlsx')
+def _read_workbooks(
+        raw_dir,
+        max_workers=None
+    ):
+    # openpyxl parsing is CPU bound, so read the workbooks in parallel processes
+    paths = [os.path.join(raw_dir, filename) for filename in WORKBOOKS.values()]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(pd.read_excel, paths))
+    return dict(zip(WORKBOOKS, frames))
 
-    sp_hoo = pd.read_excel('CAFB_Shopping_Partners_HOO.xlsx')
-    sp_cultures = pd.read_excel('CAFB_Shopping_Partners_Cultures_Served.xlsx')
-    sp_wrap_serv = pd.read_excel('CAFB_Shopping_Partners_Wraparound_Services.xlsx')
 
+def _squeeze_wrap_around_services(
+        wrap_serv
+    ):
+    # All wraparound services in a single cell for each agency
+    services = (wrap_serv
+                .groupby('Agency ID', sort=False)['Wraparound Service']
+                .agg(', '.join)
+                .reset_index())
+    # One row per agency for the remaining columns
+    agencies = (wrap_serv
+                .drop(columns=['Wraparound Service'])
+                .drop_duplicates())
+    return agencies.merge(services, on='Agency ID', how='left')
+
+
+def build_markets_sp(
+        frames
+    ):
     # Filter and clean the data
-    markets_hoo = _filter_markets_hoo(markets_hoo)
-    sp_hoo = _filter_shopping_partners_hoo(sp_hoo)
+    markets_hoo = _filter_markets_hoo(frames['markets_hoo'])
+    sp_hoo = _filter_shopping_partners_hoo(frames['sp_hoo'])
 
     # Concatenate markets and shopping partners HOO
     """
@@ -93,68 +112,75 @@ def main():
     )
 
     # Concatenate markets and shopping partners cultures served 
-    sp_cultures.rename(
-        columns={'Company Name': 'Agency Name'}, 
-        inplace=True
-    )
     markets_sp_cultures = pd.concat(
-        [markets_cultures, sp_cultures], 
+        [
+            frames['markets_cultures'],
+            frames['sp_cultures'].rename(columns={'Company Name': 'Agency Name'}),
+        ],
         ignore_index=True
     )
 
-    # Squeeze wraparound services into single cells for each agency
-    markets_wrap_services = _squeeze_wrap_around_services(
-        markets_wrap_serv
-    )
-    sp_wrap_services = _squeeze_wrap_around_services(
-        sp_wrap_serv
-    )
-    # Concatenate markets and shopping partners wraparound services
+    # Squeeze wraparound services into single cells for each agency, in one
+    # pass over both sources (markets first, as before)
     markets_sp_wrap_services = _squeeze_wrap_around_services(
         pd.concat(
-            [markets_wrap_services, sp_wrap_services], 
+            [frames['markets_wrap_serv'], frames['sp_wrap_serv']],
             ignore_index=True
         )
     )
 
-    # Merge markets and shopping partners HOO and cultures served
-    maskets_sp_hoo_cultures = pd.merge(
-        markets_sp_hoo, markets_sp_cultures, 
-        on="Agency ID", 
-        how='outer'
-    )
-    # Set names and agency ids 
-    maskets_sp_hoo_cultures["Agency Name"] = maskets_sp_hoo_cultures["Agency Name_x"]
-    maskets_sp_hoo_cultures.loc[
-        maskets_sp_hoo_cultures["Agency Name"].isna(), "Agency Name"
-    ] = maskets_sp_hoo_cultures["Agency Name_y"]
-    maskets_sp_hoo_cultures.drop(
-        columns=["Agency Name_x", "Agency Name_y"], inplace=True
-    )
-
-    # Merge markets and shopping partners HOO_cultures and wraparound services
-    markets_sp = pd.merge(
-        maskets_sp_hoo_cultures, markets_sp_wrap_services, 
-        on="Agency ID", 
-        how='outer'
-    )
-    # Set names and agency ids
-    markets_sp["Agency Name"] = markets_sp["Agency Name_x"]
-    markets_sp.loc[
-        markets_sp["Agency Name"].isna(), "Agency Name"
-    ] = markets_sp["Agency Name_y"]
+    # Merge HOO, cultures served and wraparound services; names come from
+    # the first source that has one
+    markets_sp = (markets_sp_hoo
+                  .merge(markets_sp_cultures.rename(
+                             columns={'Agency Name': 'Agency Name (cultures)'}),
+                         on='Agency ID', how='outer')
+                  .merge(markets_sp_wrap_services.rename(
+                             columns={'Agency Name': 'Agency Name (services)'}),
+                         on='Agency ID', how='outer'))
+    markets_sp['Agency Name'] = (markets_sp['Agency Name']
+                                 .fillna(markets_sp['Agency Name (cultures)'])
+                                 .fillna(markets_sp['Agency Name (services)']))
     markets_sp.drop(
-        columns=["Agency Name_x", "Agency Name_y"], 
+        columns=['Agency Name (cultures)', 'Agency Name (services)'],
         inplace=True
     )
 
     # Tabular view
-    columns = list(markets_sp.columns)
-    columns.remove("Agency Name")
-    columns.remove("Agency ID")
-    markets_sp = markets_sp[["Agency ID", "Agency Name"] + columns]
-    markets_sp.to_excel("CAFB_Markets_Shopping_Partners.xlsx", index=False)
+    columns = [c for c in markets_sp.columns if c not in ('Agency ID', 'Agency Name')]
+    return markets_sp[["Agency ID", "Agency Name"] + columns]
+
+
+def main(
+        raw_dir=os.path.join(PROJECT_DIR, 'data', 'raw_data'),
+        db_path=os.path.join(PROJECT_DIR, 'data', 'cafb.db'),
+        parquet_path=os.path.join(PROJECT_DIR, 'data', f'{OUTPUT_TABLE}.parquet'),
+        excel_path='CAFB_Markets_Shopping_Partners.xlsx',
+        max_workers=None
+    ):
+    # Load the data from Excel files
+    frames = _read_workbooks(raw_dir, max_workers=max_workers)
+    markets_sp = build_markets_sp(frames)
+
+    # SQLite and Parquet for new readers. The Excel export is still the
+    # input of the geocoding step behind data/CAFB_Markets_Shopping_Partners.xlsx
+    # (GeoHelper, ingest); pass excel_path=None to skip it.
+    engine = create_engine(f'sqlite:///{db_path}')
+    with engine.begin() as connection:
+        markets_sp.to_sql(
+            name=OUTPUT_TABLE,
+            con=connection,
+            index=False,
+            if_exists='replace',
+            chunksize=500
+        )
+    if parquet_path:
+        markets_sp.to_parquet(parquet_path, index=False)
+    if excel_path:
+        markets_sp.to_excel(excel_path, index=False)
+    print(f"{len(markets_sp)} rows → {OUTPUT_TABLE}")
+    return markets_sp
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
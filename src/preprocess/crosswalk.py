@@ -0,0 +1,207 @@
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+from sqlalchemy import create_engine
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# Read by QueryBuilder.CROSSWALK_QUERY (src/rag_helper/langchain.py).
+CROSSWALK_TABLE = 'agency_crosswalk'
+
+# Name similarity (0-100) needed to accept a fuzzy match.
+MIN_SCORE = 85.0
+
+# "15567-MOMK-01 Academy of Hope" -> "Academy of Hope"
+_ID_IN_NAME = re.compile(r'^\d+-\w+-\d+\s*')
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+_ZIP = re.compile(r'(\d{5})(?:-\d{4})?\s*$')
+
+
+def _normalize_name(name):
+    if not isinstance(name, str):
+        return ''
+    name = _ID_IN_NAME.sub('', name).lower().replace('&', ' and ')
+    return _NON_ALNUM.sub(' ', name).strip()
+
+
+def _id_prefix(agency_id):
+    # CAFB IDs share the leading number across sources ("15567-MOMK-01").
+    match = re.match(r'\s*(\d+)', str(agency_id or ''))
+    return match.group(1) if match else None
+
+
+def _zip(address):
+    match = _ZIP.search(str(address or ''))
+    return match.group(1) if match else None
+
+
+def _arcgis_agencies(
+        snapshot_path
+    ):
+    with open(snapshot_path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    arcgis = pd.DataFrame.from_records(records, columns=['agency_ref', 'name', 'zip', 'state'])
+    arcgis = arcgis[arcgis['agency_ref'].notna()].drop_duplicates('agency_ref')
+    arcgis['agency_ref'] = arcgis['agency_ref'].astype(str)
+    arcgis['zip'] = arcgis['zip'].map(_zip)
+    arcgis['region'] = arcgis['state']
+    return arcgis
+
+
+def _combined_agencies(
+        engine
+    ):
+    # One row per agency; the table has one row per distribution slot.
+    combined = pd.read_sql(
+        'SELECT DISTINCT "Agency ID" AS agency_id, "Agency Name" AS agency_name, '
+        '"Shipping Address" AS address, "Agency Region" AS region FROM combined_data',
+        engine
+    )
+    combined = combined[combined['agency_id'].notna()].drop_duplicates('agency_id')
+    combined['agency_id'] = combined['agency_id'].astype(str)
+    combined['zip'] = combined['address'].map(_zip)
+    return combined
+
+
+def _blocks(
+        arcgis,
+        combined
+    ):
+    """
+    Candidate pairs grouped into blocks: agencies sharing an ID prefix or a
+    ZIP code, and, for agencies left without candidates, the same region.
+    Each block is (query refs, query names, choice IDs, choice names).
+    """
+    blocks = []
+    covered = set()
+    for left_key, right_key in (('id_prefix', 'id_prefix'), ('zip', 'zip')):
+        right_groups = combined.dropna(subset=[right_key]).groupby(right_key)
+        for key, left in arcgis.dropna(subset=[left_key]).groupby(left_key):
+            if key not in right_groups.groups:
+                continue
+            right = right_groups.get_group(key)
+            blocks.append((
+                left['agency_ref'].tolist(), left['norm_name'].tolist(),
+                right['agency_id'].tolist(), right['norm_name'].tolist(),
+            ))
+            covered.update(left['agency_ref'])
+    leftover = arcgis[~arcgis['agency_ref'].isin(covered)]
+    right_groups = combined.dropna(subset=['region']).groupby('region')
+    for key, left in leftover.dropna(subset=['region']).groupby('region'):
+        if key in right_groups.groups:
+            right = right_groups.get_group(key)
+            blocks.append((
+                left['agency_ref'].tolist(), left['norm_name'].tolist(),
+                right['agency_id'].tolist(), right['norm_name'].tolist(),
+            ))
+    return blocks
+
+
+def _score_block(
+        block
+    ):
+    # Best choice per query in one vectorized cdist call.
+    refs, names, choice_ids, choice_names = block
+    scores = process.cdist(names, choice_names, scorer=fuzz.token_sort_ratio, dtype=np.uint8)
+    best = scores.argmax(axis=1)
+    return [
+        (ref, choice_ids[j], float(scores[i, j]))
+        for i, (ref, j) in enumerate(zip(refs, best))
+    ]
+
+
+def build_crosswalk(
+        arcgis,
+        combined,
+        min_score=MIN_SCORE,
+        max_workers=None
+    ):
+    """
+    agency_ref -> Agency ID: exact ID matches first, then the best fuzzy
+    name match within the blocks, kept when it scores at least min_score.
+    """
+    arcgis = arcgis.assign(
+        norm_name=arcgis['name'].map(_normalize_name),
+        id_prefix=arcgis['agency_ref'].map(_id_prefix),
+    )
+    combined = combined.assign(
+        norm_name=combined['agency_name'].map(_normalize_name),
+        id_prefix=combined['agency_id'].map(_id_prefix),
+    )
+    names = dict(zip(combined['agency_id'], combined['agency_name']))
+
+    exact = arcgis[arcgis['agency_ref'].isin(names)]
+    rows = [(ref, ref, 100.0, 'id') for ref in exact['agency_ref']]
+
+    remaining = arcgis[~arcgis['agency_ref'].isin(names)]
+    blocks = _blocks(remaining, combined)
+    best = {}
+    # Blocks are independent; score them in parallel processes.
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for block_result in executor.map(_score_block, blocks, chunksize=8):
+            for ref, agency_id, score in block_result:
+                if score > best.get(ref, (None, -1.0))[1]:
+                    best[ref] = (agency_id, score)
+    rows += [
+        (ref, agency_id, score, 'fuzzy')
+        for ref, (agency_id, score) in best.items()
+        if score >= min_score
+    ]
+
+    crosswalk = pd.DataFrame(rows, columns=['agency_ref', 'agency_id', 'score', 'method'])
+    crosswalk['agency_name'] = crosswalk['agency_id'].map(names)
+    return crosswalk[['agency_ref', 'agency_id', 'agency_name', 'score', 'method']]
+
+
+def main(
+        snapshot_path=os.path.join(PROJECT_DIR, 'data', 'external', 'arcgis_data.json'),
+        db_path=os.path.join(PROJECT_DIR, 'data', 'cafb.db'),
+        min_score=MIN_SCORE,
+        max_workers=None
+    ):
+    engine = create_engine(f'sqlite:///{db_path}')
+    crosswalk = build_crosswalk(
+        _arcgis_agencies(snapshot_path),
+        _combined_agencies(engine),
+        min_score=min_score,
+        max_workers=max_workers
+    )
+
+    # Request-time lookups go through the primary key (agency_ref) and the
+    # agency_id index.
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {CROSSWALK_TABLE}')
+        connection.exec_driver_sql(f'''
+            CREATE TABLE {CROSSWALK_TABLE} (
+                agency_ref TEXT PRIMARY KEY,
+                agency_id TEXT NOT NULL,
+                agency_name TEXT,
+                score REAL NOT NULL,
+                method TEXT NOT NULL
+            )
+        ''')
+        connection.exec_driver_sql(
+            f'CREATE INDEX idx_{CROSSWALK_TABLE}_agency_id ON {CROSSWALK_TABLE} (agency_id)'
+        )
+        crosswalk.to_sql(
+            name=CROSSWALK_TABLE,
+            con=connection,
+            index=False,
+            if_exists='append',
+            chunksize=500
+        )
+    counts = crosswalk['method'].value_counts().to_dict()
+    print(f"{len(crosswalk)} agencies → {CROSSWALK_TABLE} "
+          f"({counts.get('id', 0)} by ID, {counts.get('fuzzy', 0)} by name)")
+    return crosswalk
+
+
+if __name__ == "__main__":
+    main()
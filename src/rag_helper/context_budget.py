@@ -0,0 +1,107 @@
+import json
+import logging
+from typing import Dict, Any, List, Tuple
+
+import tiktoken
+
+from src.rag_helper.renderer import get_field
+from src.rag_helper.services import MISSING_SERVICES_FIELD
+
+logger = logging.getLogger(__name__)
+
+# The combined_data columns ResponseGenerator.RESPONSE_STRUCTURE reads, in
+# card order. Everything else (verification dates, SO dates, coordinates, ...)
+# never reaches the prompt.
+RESPONSE_FIELDS = [
+    "Agency Name",
+    "Shipping Address",
+    "Distance",
+    "Day or Week",
+    "Starting Time",
+    "Ending Time",
+    "Frequency",
+    "Food Format",
+    "Choice Options",
+    "Distribution Models",
+    "Phone",
+    "URL",
+    "By Appointment Only",
+    "Additional Note on Hours of Operations",
+    "Wraparound Service",
+    # Requested services the agency lacks, precomputed (see coverage.py).
+    MISSING_SERVICES_FIELD,
+]
+
+DEFAULT_ENCODING = "cl100k_base"
+
+
+def project_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The RESPONSE_FIELDS of a result row, without nulls and blanks.
+    """
+    projected = {}
+    for field in RESPONSE_FIELDS:
+        value = get_field(row, field)
+        if value is not None:
+            projected[field] = round(value, 2) if field == "Distance" and isinstance(value, float) else value
+    return projected
+
+
+def serialize_rows(rows: List[Dict[str, Any]]) -> str:
+    """
+    Compact JSON for the prompt.
+    """
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class ContextBudget:
+    """
+    Fits the agency rows of a response prompt into a token budget.
+
+    Rows are projected to RESPONSE_FIELDS and kept in ranking order until the
+    budget is spent, so the nearest agencies are the ones that survive.
+    """
+
+    def __init__(self, model_name: str, max_input_tokens: int = 6000, max_rows: int = 50):
+        """
+        :param model_name: model the prompt is sent to; selects the tokenizer.
+        :param max_input_tokens: budget for the whole prompt input.
+        :param max_rows: hard cap on the number of rows.
+        """
+        try:
+            self.encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+        self.max_input_tokens = max_input_tokens
+        self.max_rows = max_rows
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def fit(self, query_results: List[Dict[str, Any]], fixed_text: str) -> Tuple[str, int, int]:
+        """
+        Serialized rows that fit the budget alongside ``fixed_text`` (the
+        system message, preferences and other prompt text).
+
+        :return: (serialized rows, rows kept, prompt input tokens).
+        """
+        fixed_tokens = self.count(fixed_text)
+        rows: List[Dict[str, Any]] = []
+        # "[" + rows joined by "," + "]": a row costs its own tokens plus a
+        # separator, which is close enough to the tokens of the joined text.
+        used = fixed_tokens + self.count("[]")
+        for row in query_results[:self.max_rows]:
+            projected = project_row(row)
+            cost = self.count(serialize_rows(projected)) + 1
+            if rows and used + cost > self.max_input_tokens:
+                break
+            rows.append(projected)
+            used += cost
+        serialized = serialize_rows(rows)
+        input_tokens = fixed_tokens + self.count(serialized)
+        if len(rows) < len(query_results):
+            logger.info(
+                f"Context budget kept {len(rows)}/{len(query_results)} rows "
+                f"({self.max_input_tokens} token budget)"
+            )
+        return serialized, len(rows), input_tokens
@@ -0,0 +1,50 @@
+import math
+from typing import Dict, Any, List
+
+import numpy as np
+
+from src.rag_helper.renderer import get_field
+from src.rag_helper.services import (
+    MISSING_SERVICES_FIELD,
+    SERVICE_MASK_COLUMN,
+    ServiceVocabulary,
+    parse_services,
+)
+
+
+def row_service_mask(row: Dict[str, Any], vocabulary: ServiceVocabulary) -> int:
+    """
+    The row's service bitmask: the ingested service_mask column, or parsed
+    from "Wraparound Service" for databases built before it existed.
+    """
+    mask = row.get(SERVICE_MASK_COLUMN)
+    if mask is not None and not (isinstance(mask, float) and math.isnan(mask)):
+        return int(mask)
+    return vocabulary.encode(parse_services(get_field(row, "Wraparound Service")))
+
+
+def annotate_service_coverage(
+    query_results: List[Dict[str, Any]],
+    requested: List[str],
+    vocabulary: ServiceVocabulary,
+    rank_by_coverage: bool = True
+) -> List[Dict[str, Any]]:
+    """
+    Copies of the rows with MISSING_SERVICES_FIELD set to the requested
+    services each agency lacks, computed with bitwise ops over all rows.
+    With ``rank_by_coverage``, agencies covering more of the request come
+    first; ties keep their distance order. Rows are returned unchanged when
+    no service was requested.
+    """
+    if not query_results or not requested:
+        return query_results
+    masks = [row_service_mask(row, vocabulary) for row in query_results]
+    covered, missing = vocabulary.coverage(requested, masks)
+    rows = [
+        {**row, MISSING_SERVICES_FIELD: row_missing}
+        for row, row_missing in zip(query_results, missing)
+    ]
+    if rank_by_coverage:
+        order = np.argsort(-covered, kind="stable")
+        rows = [rows[i] for i in order]
+    return rows
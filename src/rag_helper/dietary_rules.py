@@ -0,0 +1,170 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# Which user preference feeds which DIETARY_RULES entry.
+RULE_PREFERENCE_KEYS = {
+    'health_restrictions': 'health_dietary_restrictions',
+    'religious_restrictions': 'religious_dietary_restrictions',
+}
+
+# Rule value meaning "any culture", i.e. no cultures predicate.
+ALL_CULTURES = 'All Cultural Populations'
+
+
+class DietaryFilter:
+    """
+    A compiled dietary WHERE fragment with its bound parameters.
+
+    ``sql`` uses named parameters (``:name``) and contains no user text, so it
+    can be appended to a query verbatim.
+    """
+
+    def __init__(self, sql: str = "", params: Optional[Dict[str, Any]] = None):
+        self.sql = sql
+        self.params = params or {}
+
+    def __bool__(self) -> bool:
+        return bool(self.sql)
+
+    def __repr__(self) -> str:
+        return f"DietaryFilter(sql={self.sql!r}, params={self.params!r})"
+
+
+def _culture_match(culture: str) -> str:
+    """
+    FTS5 query matching the culture as a phrase in the cultures column.
+    """
+    return 'cultures_served : "' + ' '.join(re.findall(r'\w+', culture.lower())) + '"'
+
+
+def _culture_pattern(culture: str) -> str:
+    """
+    LIKE pattern tolerant to the spacing differences between the rules and the
+    data ("Middle Eastern/North African" vs "Middle Eastern/ North African").
+    """
+    return '%' + re.sub(r'\s*/\s*|\s+', lambda m: '/%' if '/' in m.group() else '%', culture.strip()) + '%'
+
+
+class DietaryRuleEngine:
+    """
+    Compiles DIETARY_RULES against the configured preference options.
+
+    Every checkbox option in config.yaml (in every language) is resolved to the
+    rules it triggers once, at construction. Evaluating a user's preferences is
+    then a dictionary lookup per selected option.
+
+    With ``fts_table`` (see db_helper.sql_helper.FTS_SPECS) culture predicates
+    use the full-text index instead of a ``LIKE '%...%'`` scan; they refer to
+    combined_data by its query alias ``c``.
+    """
+
+    def __init__(
+        self,
+        dietary_rules: Dict[str, Dict[str, Any]],
+        valid_options: Dict[str, Any],
+        default_language: str = 'en',
+        fts_table: Optional[str] = None
+    ):
+        self.dietary_rules = dietary_rules
+        self.fts_table = fts_table
+        # preference key -> option text (lowercased, any language) -> rule names
+        self.option_rules: Dict[str, Dict[str, Tuple[str, ...]]] = {}
+        # rule name -> (sql fragment, params)
+        self.rule_predicates: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+        for rule_name, rule in dietary_rules.items():
+            predicate = self._compile_rule(rule_name, rule)
+            if predicate is not None:
+                self.rule_predicates[rule_name] = predicate
+
+        for rule_name, pref_key in RULE_PREFERENCE_KEYS.items():
+            options = valid_options.get(pref_key) or {}
+            default_opts = options.get(default_language) or []
+            for lang, lang_opts in options.items():
+                # Options are listed in the same order in every language, so
+                # translated options inherit the default-language triggers.
+                for position, opt in enumerate(lang_opts or []):
+                    label = opt['option'] if isinstance(opt, dict) else opt
+                    reference = default_opts[position] if position < len(default_opts) else opt
+                    reference = reference['option'] if isinstance(reference, dict) else reference
+                    rules = self._triggered_rules(reference, only=rule_name)
+                    table = self.option_rules.setdefault(pref_key, {})
+                    table[label.lower()] = tuple(sorted(set(table.get(label.lower(), ())) | set(rules)))
+
+    def _compile_rule(
+        self,
+        rule_name: str,
+        rule: Dict[str, Any]
+    ) -> Optional[Tuple[str, Dict[str, Any]]]:
+        conditions = []
+        params: Dict[str, Any] = {}
+        agency_types = rule.get('agency_type') or []
+        if agency_types:
+            names = []
+            for i, agency_type in enumerate(agency_types):
+                name = f"{rule_name}_type_{i}"
+                params[name] = agency_type
+                names.append(f":{name}")
+            conditions.append(f"agency_type IN ({', '.join(names)})")
+        culture = rule.get('cultures_served') or ''
+        if culture and culture != ALL_CULTURES:
+            name = f"{rule_name}_culture"
+            if self.fts_table:
+                params[name] = _culture_match(culture)
+                conditions.append(
+                    f"c.rowid IN (SELECT rowid FROM {self.fts_table} "
+                    f"WHERE {self.fts_table} MATCH :{name})"
+                )
+            else:
+                params[name] = _culture_pattern(culture)
+                conditions.append(f"\"Cultural Populations Served\" LIKE :{name}")
+        if not conditions:
+            return None
+        return "(" + " AND ".join(conditions) + ")", params
+
+    def _triggered_rules(self, text: str, only: Optional[str] = None) -> List[str]:
+        text = text.lower()
+        return [
+            rule_name
+            for rule_name, rule in self.dietary_rules.items()
+            if (only is None or rule_name == only)
+            and any(trigger in text for trigger in rule.get('triggers', []))
+        ]
+
+    def compile(self, user_prefs: Dict[str, Any]) -> Optional[DietaryFilter]:
+        """
+        Deterministic filter for the given preferences.
+
+        Returns None when a free-text follow-up answer cannot be mapped to any
+        rule, in which case the caller should fall back to the LLM.
+        """
+        matched = set()
+        for pref_key, table in self.option_rules.items():
+            selected = user_prefs.get(pref_key) or []
+            if isinstance(selected, str):
+                selected = [selected]
+            for option in selected:
+                matched.update(table.get(str(option).lower(), ()))
+
+        follow_ups = user_prefs.get('follow_ups') or {}
+        if not isinstance(follow_ups, dict):
+            follow_ups = {}
+        for pref_key, answers in follow_ups.items():
+            if pref_key not in self.option_rules:
+                continue
+            for answer in (answers or {}).values():
+                if not answer or not answer.strip():
+                    continue
+                rules = self._triggered_rules(answer)
+                if not rules:
+                    return None
+                matched.update(rules)
+
+        fragments = []
+        params: Dict[str, Any] = {}
+        for rule_name in sorted(matched):
+            if rule_name in self.rule_predicates:
+                sql, rule_params = self.rule_predicates[rule_name]
+                fragments.append(sql)
+                params.update(rule_params)
+        return DietaryFilter(" AND ".join(fragments), params)
@@ -1,19 +1,48 @@
+import asyncio
 import json
 import os
 import sqlite3
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union, Iterator, AsyncIterator, Awaitable, Tuple
 import logging
+import httpx
 from datetime import datetime
 from langchain.agents import AgentExecutor, create_structured_chat_agent, create_tool_calling_agent
 from langchain.prompts import PromptTemplate, ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import SystemMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_community.callbacks import get_openai_callback
+from opentelemetry import trace
 from langchain.chains import LLMChain
 from langchain_openai import ChatOpenAI
-from sqlalchemy import create_engine, text
 from langchain.agents import Tool  
 
+from src.db_helper import agencies
+from src.db_helper.backends import (
+    CANDIDATE_TABLE,
+    CREATE_CANDIDATES,
+    INSERT_CANDIDATE,
+    SQLiteBackend,
+    StorageBackend,
+)
+from src.db_helper.hours import pickup_mask
+from src.rag_helper.context_budget import ContextBudget
+from src.rag_helper.coverage import annotate_service_coverage
+from src.rag_helper.dietary_rules import DietaryFilter, DietaryRuleEngine
+from src.rag_helper.renderer import AgencyCardRenderer, format_row, format_time
+from src.rag_helper.services import MISSING_SERVICES_FIELD, ServiceVocabulary, parse_services
+from src.utilities.config_parser import load_config
+from src.utilities.tracing import (
+    record_token_usage,
+    set_attributes,
+    start_stage_span,
+    trace_stage,
+    use_stage_span,
+)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -69,7 +98,11 @@ class DietaryFilterGenerator:
         self,
         openai_api_key: str,
         model_name: str = "gpt-4o-mini",
-        temperature: float = 0.0
+        temperature: float = 0.0,
+        valid_options: Optional[Dict] = None,
+        http_client: Optional[httpx.Client] = None,
+        fts_table: Optional[str] = None,
+        http_async_client: Optional[httpx.AsyncClient] = None
     ):
         self.sql_gen_prompt = PromptTemplate(
             input_variables=["dietary_rules", "user_prefs"],
@@ -78,69 +111,332 @@ class DietaryFilterGenerator:
         os.environ["OPENAI_API_KEY"] = openai_api_key
         self.llm = ChatOpenAI(
             model=model_name, 
-            temperature=temperature
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+        # Built once; only the preferences change per request.
+        self.sql_gen_chain = self.sql_gen_prompt | self.llm
+        self.dietary_rules_json = json.dumps(self.DIETARY_RULES, indent=2)
+        if valid_options is None:
+            valid_options = load_config()["user_preferences"]["valid_options"]
+        self.rule_engine = DietaryRuleEngine(
+            self.DIETARY_RULES,
+            valid_options,
+            fts_table=fts_table
         )
 
 
-    def generate_dietary_filters(self, user_prefs: Dict) -> str:
+    def generate_dietary_filters(self, user_prefs: Dict) -> Union[DietaryFilter, str]:
+        """
+        Dietary WHERE conditions for the given preferences.
+
+        Checkbox selections are compiled deterministically by the rule engine;
+        the LLM is only consulted for free-text follow-up answers the rules
+        cannot resolve, in which case its raw SQL text is returned.
+        """
+        with trace_stage("rag.dietary_filter") as stage_span:
+            dietary_filter = self.rule_engine.compile(user_prefs)
+            if dietary_filter is not None:
+                set_attributes(stage_span, **{
+                    "dietary.source": "rules",
+                    "dietary.filtered": bool(dietary_filter),
+                })
+                return dietary_filter
+            logger.info("Free-text dietary answer not covered by rules, falling back to LLM")
+            set_attributes(stage_span, **{"dietary.source": "llm", "llm.model": self.llm.model_name})
+            with get_openai_callback() as usage:
+                where = self.generate_dietary_filters_llm(user_prefs)
+            record_token_usage(stage_span, usage)
+            return where
+
+    async def agenerate_dietary_filters(self, user_prefs: Dict) -> Union[DietaryFilter, str]:
+        """
+        Async variant of generate_dietary_filters.
+        """
+        with trace_stage("rag.dietary_filter") as stage_span:
+            dietary_filter = self.rule_engine.compile(user_prefs)
+            if dietary_filter is not None:
+                set_attributes(stage_span, **{
+                    "dietary.source": "rules",
+                    "dietary.filtered": bool(dietary_filter),
+                })
+                return dietary_filter
+            logger.info("Free-text dietary answer not covered by rules, falling back to LLM")
+            set_attributes(stage_span, **{"dietary.source": "llm", "llm.model": self.llm.model_name})
+            with get_openai_callback() as usage:
+                where = await self.agenerate_dietary_filters_llm(user_prefs)
+            record_token_usage(stage_span, usage)
+            return where
+
+    def _llm_inputs(self, user_prefs: Dict) -> Dict[str, str]:
+        return {
+            "dietary_rules": self.dietary_rules_json,
+            "user_prefs": json.dumps(user_prefs, indent=2)
+        }
+
+    @staticmethod
+    def _extract_sql(content: str) -> str:
+        # Extract only SQL code from response
+        sql_match = re.search(r"```sql\n(.*?)\n```", content, re.DOTALL)
+        if sql_match:
+            return sql_match.group(1).strip()
+        return ""  # Fallback to empty filter
+
+    def generate_dietary_filters_llm(self, user_prefs: Dict) -> str:
         try:
-            chain = self.sql_gen_prompt | self.llm
-            result = chain.invoke({
-                "dietary_rules": json.dumps(self.DIETARY_RULES, indent=2),
-                "user_prefs": json.dumps(user_prefs, indent=2)
-            })
-            
-            # Extract only SQL code from response
-            sql_match = re.search(r"```sql\n(.*?)\n```", result.content, re.DOTALL)
-            if sql_match:
-                return sql_match.group(1).strip()
-            return ""  # Fallback to empty filter
-            
+            result = self.sql_gen_chain.invoke(self._llm_inputs(user_prefs))
+            return self._extract_sql(result.content)
         except Exception as e:
             logger.error(f"Error generating dietary filters: {str(e)}")
             return ""
 
+    async def agenerate_dietary_filters_llm(self, user_prefs: Dict) -> str:
+        try:
+            result = await self.sql_gen_chain.ainvoke(self._llm_inputs(user_prefs))
+            return self._extract_sql(result.content)
+        except Exception as e:
+            logger.error(f"Error generating dietary filters: {str(e)}")
+            return ""
+
+class AgencyQuery:
+    """
+    A candidate-agency query: fixed statement text, bound parameters and the
+    ranked candidate rows that execute_query loads into a temporary table
+    (None for the fused search, which needs no candidates).
+    """
+
+    def __init__(self, sql: str, params: Dict[str, Any], candidates: Optional[List[Dict[str, Any]]]):
+        self.sql = sql
+        self.params = params
+        self.candidates = candidates
+
+    def __str__(self) -> str:
+        return self.sql
+
+
 class QueryBuilder:
-    @staticmethod
-    def build_query(arcgis_agencies: List[Dict], dietary_where: str) -> str:
-        # Extract and sanitize agency IDs and agency names from the ArcGIS dataset.
-        # Remove any single quotes from the data to avoid conflicts.
-        agency_ids = [str(a.get("Agency ID", "")).replace("'", "") for a in arcgis_agencies]
-        agency_names = [a.get("Agency Name", "").replace("'", "") for a in arcgis_agencies]
-
-        # Build a comma-separated string of agency IDs, each enclosed in single quotes.
-        if agency_ids:
-            id_str = ','.join(f"'{agency_id}'" for agency_id in agency_ids)
-            # If your database column name is exactly "Agency ID" (with a space), wrap it in double quotes:
-            id_clause = f"\"Agency ID\" IN ({id_str})"
-        else:
-            id_clause = "1=0"
+    CANDIDATE_TABLE = CANDIDATE_TABLE
+    # Built by src/preprocess/crosswalk.py
+    CROSSWALK_TABLE = "agency_crosswalk"
 
-        # Similarly, build a clause for agency names.
-        if agency_names:
-            name_str = ','.join(f"'{name}'" for name in agency_names)
-            name_clause = f"\"Agency Name\" IN ({name_str})"
-        else:
-            name_clause = "1=0"
+    # Filled by the storage backend (src/db_helper/backends.py).
+    CREATE_CANDIDATES = CREATE_CANDIDATES
+    INSERT_CANDIDATE = INSERT_CANDIDATE
+
+    # Candidates are matched by ID or by name, each through its own indexed
+    # join, and results keep the ArcGIS distance ranking. The statement text
+    # only varies with the dietary rule combination, so SQLite's statement
+    # cache is reused across requests.
+    BASE_QUERY = f"""
+WITH matched AS (
+    SELECT c.rowid AS row_id, cand.rank AS rank, cand.distance AS distance
+    FROM temp.{CANDIDATE_TABLE} AS cand
+    JOIN combined_data AS c ON c."Agency ID" = cand.agency_id
+    UNION ALL
+    SELECT c.rowid AS row_id, cand.rank AS rank, cand.distance AS distance
+    FROM temp.{CANDIDATE_TABLE} AS cand
+    JOIN combined_data AS c ON c."Agency Name" = cand.agency_name
+)
+SELECT c.*, MIN(m.distance) AS Distance
+FROM matched AS m
+JOIN combined_data AS c ON c.rowid = m.row_id"""
+    # With the offline crosswalk, ArcGIS refs
+    # that differ from the combined_data IDs resolve through its primary key
+    # instead of name matching.
+    CROSSWALK_QUERY = f"""
+WITH matched AS (
+    SELECT c.rowid AS row_id, cand.rank AS rank, cand.distance AS distance
+    FROM temp.{CANDIDATE_TABLE} AS cand
+    JOIN combined_data AS c ON c."Agency ID" = cand.agency_id
+    UNION ALL
+    SELECT c.rowid AS row_id, cand.rank AS rank, cand.distance AS distance
+    FROM temp.{CANDIDATE_TABLE} AS cand
+    JOIN {CROSSWALK_TABLE} AS x ON x.agency_ref = cand.agency_id
+    JOIN combined_data AS c ON c."Agency ID" = x.agency_id
+)
+SELECT c.*, MIN(m.distance) AS Distance
+FROM matched AS m
+JOIN combined_data AS c ON c.rowid = m.row_id"""
+    QUERY_TAIL = """
+GROUP BY c.rowid
+ORDER BY MIN(m.rank), c.rowid
+LIMIT :limit"""
+    # Radius search, filters and ranking in one statement over the
+    # materialized agencies table (src/db_helper/agencies.py): the R*Tree
+    # prefilters by bounding box, the exact distance is checked on what is
+    # left, and only the top rows are sorted out.
+    FUSED_QUERY = f"""
+SELECT c.*, {agencies.CHORD_EXPR} AS {agencies.CHORD_COLUMN}
+FROM {agencies.AGENCIES_RTREE} AS r
+JOIN {agencies.AGENCIES_TABLE} AS c ON c.rowid = r.id
+WHERE r.min_lat <= :max_lat AND r.max_lat >= :min_lat
+    AND r.min_lon <= :max_lon AND r.max_lon >= :min_lon
+    AND {agencies.CHORD_EXPR} <= :max_chord2"""
+    FUSED_TAIL = f"""
+ORDER BY {agencies.CHORD_COLUMN}, c.rowid
+LIMIT :limit"""
+
+    # DuckDB over Parquet (backends.DuckDBBackend) has no rowid, temp schema
+    # or bare columns in grouped selects: matches are reduced to one (rank,
+    # distance) per row_id, the SQLite rowid exported with each table.
+    DUCKDB_MATCH = f"""
+WITH matched AS (
+    SELECT c.row_id AS row_id, cand.rank AS rank, cand.distance AS distance
+    FROM {CANDIDATE_TABLE} AS cand
+    JOIN combined_data AS c ON c."Agency ID" = cand.agency_id
+    UNION ALL
+    SELECT c.row_id AS row_id, cand.rank AS rank, cand.distance AS distance
+    FROM {CANDIDATE_TABLE} AS cand
+    {{second_join}}
+),
+best AS (
+    SELECT row_id, MIN(rank) AS rank, MIN(distance) AS distance
+    FROM matched
+    GROUP BY row_id
+)
+SELECT c.* EXCLUDE (row_id), b.distance AS Distance
+FROM best AS b
+JOIN combined_data AS c ON c.row_id = b.row_id"""
+    DUCKDB_QUERY = DUCKDB_MATCH.format(
+        second_join='JOIN combined_data AS c ON c."Agency Name" = cand.agency_name'
+    )
+    DUCKDB_CROSSWALK_QUERY = DUCKDB_MATCH.format(
+        second_join=f"JOIN {CROSSWALK_TABLE} AS x ON x.agency_ref = cand.agency_id\n"
+                    '    JOIN combined_data AS c ON c."Agency ID" = x.agency_id'
+    )
+    DUCKDB_QUERY_TAIL = """
+ORDER BY b.rank, c.row_id
+LIMIT :limit"""
+    # No R*Tree: the bounding box is a range filter on lat/lon, which the
+    # Parquet row-group statistics skip on (the export sorts by lat).
+    DUCKDB_FUSED_QUERY = f"""
+SELECT c.*, {agencies.CHORD_EXPR} AS {agencies.CHORD_COLUMN}
+FROM {agencies.AGENCIES_TABLE} AS c
+WHERE c.lat BETWEEN :min_lat AND :max_lat
+    AND c.lon BETWEEN :min_lon AND :max_lon
+    AND {agencies.CHORD_EXPR} <= :max_chord2"""
+    DUCKDB_FUSED_TAIL = f"""
+ORDER BY {agencies.CHORD_COLUMN}, c.row_id
+LIMIT :limit"""
 
-        # Sanitize dietary_where clause, removing dangerous characters.
-        sanitized_where = re.sub(
+    @staticmethod
+    def _where_sql(dietary_where: Union[DietaryFilter, str], params: Dict[str, Any]) -> str:
+        """
+        The dietary WHERE fragment; compiled filter parameters go to params.
+        """
+        if isinstance(dietary_where, DietaryFilter):
+            # Compiled filters carry no user text; their values are bound.
+            params.update(dietary_where.params)
+            return dietary_where.sql
+        # LLM fallback text: sanitize, removing dangerous characters.
+        return re.sub(
             r"[;'\"]|(--)|(/\*[\w\W]*?\*/)",
             "",
             dietary_where,
             flags=re.IGNORECASE
         ) if dietary_where else ""
 
-        base_query = f"""
-SELECT * 
-FROM combined_data
-WHERE (
-    {id_clause} 
-    OR {name_clause}
-)"""
-        if sanitized_where:
-            base_query += f" AND ({sanitized_where})"
-        return base_query + " LIMIT 50"
+    @staticmethod
+    def build_query(
+        arcgis_agencies: List[Dict],
+        dietary_where: Union[DietaryFilter, str],
+        limit: int = 50,
+        crosswalk: bool = False,
+        dialect: str = "sqlite"
+    ) -> AgencyQuery:
+        """
+        :param crosswalk: match candidates through the agency_crosswalk
+            table instead of by name.
+        :param dialect: the storage backend's dialect ("sqlite", "duckdb").
+        """
+        candidates = [
+            {
+                "rank": rank,
+                "agency_id": str(a.get("Agency ID", "")),
+                "agency_name": a.get("Agency Name", ""),
+                "distance": a.get("Distance"),
+            }
+            for rank, a in enumerate(arcgis_agencies)
+        ]
+        params: Dict[str, Any] = {"limit": limit}
+        where_sql = QueryBuilder._where_sql(dietary_where, params)
+
+        if dialect == "duckdb":
+            sql = QueryBuilder.DUCKDB_CROSSWALK_QUERY if crosswalk else QueryBuilder.DUCKDB_QUERY
+            tail = QueryBuilder.DUCKDB_QUERY_TAIL
+        else:
+            sql = QueryBuilder.CROSSWALK_QUERY if crosswalk else QueryBuilder.BASE_QUERY
+            tail = QueryBuilder.QUERY_TAIL
+        if where_sql:
+            sql += f"\nWHERE ({where_sql})"
+        return AgencyQuery(sql + tail, params, candidates)
+
+    @staticmethod
+    def build_fused_query(
+        lat: float,
+        lon: float,
+        radius_miles: float,
+        dietary_where: Union[DietaryFilter, str],
+        hours_mask: Optional[int] = None,
+        limit: int = 50,
+        dialect: str = "sqlite"
+    ) -> AgencyQuery:
+        """
+        Rows within ``radius_miles`` of (lat, lon) matching the dietary
+        filter and, with ``hours_mask`` (see hours.pickup_mask), open at the
+        chosen pickup times, nearest first. Rows carry a squared chord
+        instead of a distance; see agencies.result_rows.
+
+        :param dialect: the storage backend's dialect ("sqlite", "duckdb").
+        """
+        params: Dict[str, Any] = {"limit": limit, **agencies.search_params(lat, lon, radius_miles)}
+        if dialect == "duckdb":
+            sql, tail = QueryBuilder.DUCKDB_FUSED_QUERY, QueryBuilder.DUCKDB_FUSED_TAIL
+        else:
+            sql, tail = QueryBuilder.FUSED_QUERY, QueryBuilder.FUSED_TAIL
+        where_sql = QueryBuilder._where_sql(dietary_where, params)
+        if where_sql:
+            sql += f"\n    AND ({where_sql})"
+        hours_sql, hours_params = agencies.hours_predicate(hours_mask)
+        if hours_sql:
+            sql += f"\n    AND {hours_sql}"
+            params.update(hours_params)
+        return AgencyQuery(sql + tail, params, None)
+
+
+def execute_agency_query(
+    backend: StorageBackend,
+    query: Union[AgencyQuery, str],
+    params: Optional[Dict[str, Any]] = None
+) -> List[Dict]:
+    """
+    Run an AgencyQuery (or raw SQL text) against combined_data on a storage
+    backend (see src/db_helper/backends.py).
+    """
+    candidates = (
+        len(query.candidates)
+        if isinstance(query, AgencyQuery) and query.candidates is not None
+        else None
+    )
+    with trace_stage(
+        "rag.sql", **{"db.system": backend.dialect, "db.candidates": candidates}
+    ) as stage_span:
+        try:
+            if not backend.has_table("combined_data"):
+                raise ValueError("combined_data table does not exist")
+            if isinstance(query, AgencyQuery):
+                rows = backend.execute(query.sql, query.params, candidates=query.candidates)
+            else:
+                # Remove any remaining markdown
+                clean_query = re.sub(r"```sql|```", "", query)
+                rows = backend.execute(clean_query, params or {})
+            set_attributes(stage_span, **{"db.rows": len(rows)})
+            return rows
+        except Exception as e:
+            stage_span.record_exception(e)
+            logger.error(f"Query execution failed: {str(e)}")
+            return []
 
 
 class ResponseGenerator:
@@ -149,7 +445,8 @@ class ResponseGenerator:
     Generate responses in {language} using this structure:
     {response_structure}"""
 
-    RESPONSE_STRUCTURE = """For each agency in {query_results}:
+    # Filled in by _response_inputs and passed as {response_structure}.
+    RESPONSE_STRUCTURE = """For each agency in the agency data:
     **Option [number]:**
     - Agency Name: [exact value]
     - Address: [Shipping Address]
@@ -164,7 +461,7 @@ class ResponseGenerator:
     - Appointment Only: [By Appointment Only]
     - Additional Notes: [Additional Note on Hours of Operations or 'None']
     - Wraparound Services: [Wraparound Service]
-    - Note: Compare {user_services} with agency services. List missing as "Missing requested services: [services]"
+    - Note: only if any services were requested (requested: {user_services}): "Missing requested services: [Missing Services]", or "All requested services available" when Missing Services is empty
     
     Requirements:
     1. Maintain original agency ordering
@@ -173,16 +470,69 @@ class ResponseGenerator:
     4. Convert times to HH:MM format
     5. List EXACTLY these fields in order"""
 
+    SUMMARY_TEMPLATE = """You are a food assistance coordinator. In {language}, write at most
+    three short sentences summarizing these options for the user: mention the
+    closest option and any requested services that no option offers. Do not
+    list the options; they are shown below your summary.
+
+    User preferences:
+    {user_prefs}
+
+    Options:
+    {options}"""
+
     def __init__(
         self,
         openai_api_key: str,
         model_name: str = "gpt-4",
-        temperature: float = 0.1
+        temperature: float = 0.1,
+        http_client: Optional[httpx.Client] = None,
+        response_mode: str = "llm",
+        response_summary: bool = False,
+        config: Optional[Dict] = None,
+        http_async_client: Optional[httpx.AsyncClient] = None
     ):
+        """
+        :param response_mode: "llm" to have the agent write the cards,
+            "template" to render them deterministically from the rows.
+        :param response_summary: in template mode, prepend a short LLM summary.
+        :param config: parsed config.yaml (labels and service vocabulary);
+            loaded from configs/config.yaml when omitted.
+        """
         os.environ["OPENAI_API_KEY"] = openai_api_key
         self.llm = ChatOpenAI(
             model=model_name,
-            temperature=temperature
+            temperature=temperature,
+            http_client=http_client,
+            http_async_client=http_async_client
+        )
+        self.response_mode = response_mode
+        self.response_summary = response_summary
+        if config is None:
+            config = load_config()
+        self.vocabulary = ServiceVocabulary(
+            config["wraparound_services"],
+            config["user_preferences"]["valid_options"]["services"],
+            service_bits=config.get("wraparound_service_bits")
+        )
+        self.renderer = AgencyCardRenderer(config["response_labels"], self.vocabulary)
+        llm_cfg = config["llm_config"]["LangChainRAGHelper"]
+        # LLM mode: generate the cards in batches of this many agencies, at
+        # most response_max_concurrency at a time (0 = one call for all).
+        self.batch_size = llm_cfg.get("response_batch_size") or 0
+        self.max_concurrency = llm_cfg.get("response_max_concurrency", 4)
+        self.agent_verbose = llm_cfg.get("agent_verbose", False)
+        self.rank_by_service_coverage = llm_cfg.get("rank_by_service_coverage", True)
+        # Built on first use: loading the tokenizer may download it, which
+        # template mode (and offline replay) never needs.
+        self._model_name = model_name
+        self._budget_cfg = llm_cfg.get("context_budget", {})
+        self._context_budget: Optional[ContextBudget] = None
+        self._budget_lock = threading.Lock()
+        self.summary_chain = (
+            PromptTemplate.from_template(self.SUMMARY_TEMPLATE)
+            | self.llm
+            | StrOutputParser()
         )
         self.tools = []
 
@@ -194,12 +544,48 @@ class ResponseGenerator:
         #     )
         # ]
 
+        # The prompt and executor are stateless across requests; build them once.
+        self.response_agent = self.create_response_agent()
+        # With no tools the agent is a single completion, so streaming can go
+        # straight to the model with the same messages.
+        self.response_stream_chain = (
+            ChatPromptTemplate.from_messages(self.response_messages())
+            | self.llm
+            | StrOutputParser()
+        )
+        self.response_batch_chain = (
+            ChatPromptTemplate.from_messages(self.response_messages(self.BATCH_HUMAN_TEMPLATE))
+            | self.llm
+            | StrOutputParser()
+        )
+
+    @property
+    def context_budget(self) -> ContextBudget:
+        with self._budget_lock:
+            if self._context_budget is None:
+                self._context_budget = ContextBudget(
+                    self._model_name,
+                    max_input_tokens=self._budget_cfg.get("max_input_tokens", 6000),
+                    max_rows=self._budget_cfg.get("max_rows", 50)
+                )
+            return self._context_budget
+
+    HUMAN_TEMPLATE = "User preferences:\n{user_prefs}\n\nAgency data:\n{query_results}"
+    BATCH_HUMAN_TEMPLATE = HUMAN_TEMPLATE + (
+        "\n\nThese agencies are options {first_option} to {last_option} of a longer"
+        " list: number them from {first_option} and write no introduction."
+    )
+
+    def response_messages(self, human_template: Optional[str] = None) -> List:
+        return [
+            ("system", self.RESPONSE_TEMPLATE),
+            ("human", human_template or self.HUMAN_TEMPLATE),
+        ]
+
     def create_response_agent(self) -> AgentExecutor:
-        prompt = ChatPromptTemplate.from_messages([
-            SystemMessage(content=self.RESPONSE_TEMPLATE),
-            ("human", "User preferences:\n{user_prefs}\n\nAgency data:\n{query_results}"),
-            MessagesPlaceholder("agent_scratchpad"),
-        ])
+        prompt = ChatPromptTemplate.from_messages(
+            self.response_messages() + [MessagesPlaceholder("agent_scratchpad")]
+        )
 
         return AgentExecutor(
             agent=create_tool_calling_agent(
@@ -208,63 +594,470 @@ class ResponseGenerator:
                 prompt=prompt
             ),
             tools=self.tools,
-            verbose=True
+            verbose=self.agent_verbose
         )
 
 
+    def annotate_services(self, query_results: List[Dict], user_prefs: Dict) -> List[Dict]:
+        """
+        Rows with the requested services each agency lacks, ranked by how
+        many it covers when rank_by_service_coverage is set, so neither the
+        cards nor the LLM compare service lists.
+        """
+        return annotate_service_coverage(
+            query_results,
+            self.renderer.requested_services(user_prefs),
+            self.vocabulary,
+            rank_by_coverage=self.rank_by_service_coverage
+        )
+
+    def _fit_rows(
+        self,
+        query_results: List[Dict],
+        prefs_json: str,
+        human_template: Optional[str] = None
+    ) -> Tuple[str, int, int]:
+        # Only the card fields go into the prompt, and only as many rows as
+        # fit the context budget.
+        return self.context_budget.fit(
+            query_results,
+            self.RESPONSE_TEMPLATE + self.RESPONSE_STRUCTURE
+            + (human_template or self.HUMAN_TEMPLATE) + prefs_json
+        )
+
+    def _response_inputs(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        human_template: Optional[str] = None
+    ) -> Dict[str, Any]:
+        prefs_json = json.dumps(user_prefs, indent=2)
+        rows_json, kept, input_tokens = self._fit_rows(query_results, prefs_json, human_template)
+        logger.info(f"Response prompt: {input_tokens} input tokens, {kept} agencies")
+        return self._prompt_inputs(rows_json, user_prefs, prefs_json)
+
+    def _prompt_inputs(self, rows_json: str, user_prefs: Dict, prefs_json: str) -> Dict[str, Any]:
+        requested = self.renderer.requested_services(user_prefs)
+        return {
+            "tool_names": ", ".join(tool.name for tool in self.tools),
+            "tools": "\n".join(f"{tool.name}: {tool.description}" for tool in self.tools) or "none",
+            "response_structure": self.RESPONSE_STRUCTURE.format(
+                user_services=", ".join(requested) or "none"
+            ),
+            "language": user_prefs.get("language", "English"),
+            "query_results": rows_json,
+            "user_prefs": prefs_json
+        }
+
+    def _summary_inputs(self, query_results: List[Dict], user_prefs: Dict) -> Dict[str, Any]:
+        # Name, distance and missing services only; the summary needs no more.
+        requested = self.renderer.requested_services(user_prefs)
+        options = []
+        for number, row in enumerate(query_results, start=1):
+            card = format_row(row)
+            distance = f"{card['distance']:.2f} miles" if card["distance"] is not None else "unknown distance"
+            missing = row.get(MISSING_SERVICES_FIELD)
+            if missing is None:
+                missing = self.vocabulary.missing(requested, card["wraparound_services"])
+            options.append(
+                f"{number}. {card['agency_name']} ({distance}); "
+                f"missing services: {', '.join(missing) or 'none'}"
+            )
+        return {
+            "language": user_prefs.get("language", "English"),
+            "user_prefs": json.dumps(user_prefs, indent=2),
+            "options": "\n".join(options),
+        }
+
+    def _batches(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict
+    ) -> List[Tuple[int, List[Dict], Dict[str, Any]]]:
+        """
+        (offset, rows, prompt inputs) batches in ranking order, or [] when the
+        results fit a single call. A batch holds at most batch_size rows and
+        only as many as fit the context budget; the rest start the next
+        batch, so every row gets a card and options are numbered without
+        gaps. Planned once per request: the inputs carry the fitted rows.
+        """
+        rows = query_results[:self.context_budget.max_rows]
+        if not self.batch_size or len(rows) <= self.batch_size:
+            return []
+        prefs_json = json.dumps(user_prefs, indent=2)
+        batches = []
+        offset = 0
+        while offset < len(rows):
+            # fit keeps at least one row, so this always advances.
+            rows_json, kept, input_tokens = self._fit_rows(
+                rows[offset:offset + self.batch_size], prefs_json, self.BATCH_HUMAN_TEMPLATE
+            )
+            logger.info(
+                f"Response batch {offset + 1}-{offset + kept}: {input_tokens} input tokens"
+            )
+            inputs = self._prompt_inputs(rows_json, user_prefs, prefs_json)
+            inputs.update(first_option=offset + 1, last_option=offset + kept)
+            batches.append((offset, rows[offset:offset + kept], inputs))
+            offset += kept
+        return batches
+
+    def _batch_output(self, offset: int, rows: List[Dict], user_prefs: Dict, output: Any) -> str:
+        """
+        A batch's cards; a failed batch falls back to the template cards so
+        the other batches are not lost.
+        """
+        if not isinstance(output, Exception):
+            return output.strip()
+        logger.error(
+            f"Response batch {offset + 1}-{offset + len(rows)} failed: {str(output)}"
+        )
+        requested = self.renderer.requested_services(user_prefs)
+        return "\n\n".join(
+            self.renderer.render_card(offset + number, row, requested, user_prefs.get("language"))
+            for number, row in enumerate(rows, start=1)
+        )
+
+    def generate_batched_response(
+        self,
+        batches: List[Tuple[int, List[Dict], Dict[str, Any]]],
+        user_prefs: Dict
+    ) -> str:
+        """
+        Cards for each batch from concurrent completions, merged in ranking order.
+        """
+        outputs = self.response_batch_chain.batch(
+            [inputs for _, _, inputs in batches],
+            config={"max_concurrency": self.max_concurrency},
+            return_exceptions=True
+        )
+        return "\n\n".join(
+            self._batch_output(offset, rows, user_prefs, output)
+            for (offset, rows, _), output in zip(batches, outputs)
+        )
+
+    async def agenerate_batched_response(
+        self,
+        batches: List[Tuple[int, List[Dict], Dict[str, Any]]],
+        user_prefs: Dict
+    ) -> str:
+        """
+        Async variant of generate_batched_response.
+        """
+        outputs = await self.response_batch_chain.abatch(
+            [inputs for _, _, inputs in batches],
+            config={"max_concurrency": self.max_concurrency},
+            return_exceptions=True
+        )
+        return "\n\n".join(
+            self._batch_output(offset, rows, user_prefs, output)
+            for (offset, rows, _), output in zip(batches, outputs)
+        )
+
+    def render_template_response(self, query_results: List[Dict], user_prefs: Dict) -> str:
+        """
+        Deterministic cards, with the optional short LLM summary on top.
+        """
+        cards = self.renderer.render(query_results, user_prefs)
+        if self.response_summary and query_results:
+            try:
+                cards = [self.summary_chain.invoke(self._summary_inputs(query_results, user_prefs))] + cards
+            except Exception as e:
+                logger.error(f"Summary generation failed: {str(e)}")
+        return "\n\n".join(cards)
+
+    def _span_attributes(self, query_results: List[Dict], streaming: bool = False) -> Dict[str, Any]:
+        llm_used = self.response_mode != "template" or self.response_summary
+        return {
+            "response.mode": self.response_mode,
+            "response.rows": len(query_results),
+            "response.streaming": streaming,
+            "llm.model": self.llm.model_name if llm_used else None,
+        }
+
+    def _plan_batches(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        stage_span: trace.Span
+    ) -> List[Tuple[int, List[Dict], Dict[str, Any]]]:
+        """
+        The request's batches (see _batches), recorded on its response span.
+        """
+        batches = self._batches(query_results, user_prefs)
+        set_attributes(stage_span, **{"response.batches": len(batches)})
+        return batches
+
     def generate_final_response(self, query_results: List[Dict], user_prefs: Dict) -> str:
-        response_structure = self.RESPONSE_STRUCTURE
+        with trace_stage("rag.response", **self._span_attributes(query_results)) as stage_span:
+            with get_openai_callback() as usage:
+                response = self._generate_final_response(query_results, user_prefs, stage_span)
+            record_token_usage(stage_span, usage)
+            return response
+
+    def _generate_final_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        stage_span: trace.Span
+    ) -> str:
+        if self.response_mode == "template":
+            return self.render_template_response(query_results, user_prefs)
+        batches = self._plan_batches(query_results, user_prefs, stage_span)
+        if batches:
+            return self.generate_batched_response(batches, user_prefs)
         try:
-            response_agent = self.create_response_agent()
-            return response_agent.invoke({
-                # "tool_names": "Result Formatter",
-                # "tools": self.tools,
-                "response_structure": response_structure,
-                "language": user_prefs.get("language", "English"),
-                "query_results": query_results,
-                "user_services": user_prefs.get("services", []),
-                "user_prefs": json.dumps(user_prefs, indent=2)
-            })["output"]
+            return self.response_agent.invoke(
+                self._response_inputs(query_results, user_prefs)
+            )["output"]
         except Exception as e:
             logger.error(f"Response generation failed: {str(e)}")
             return "Could not generate response due to an internal error."
 
+    async def arender_template_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        summary_timeout: Optional[float] = None
+    ) -> str:
+        """
+        Async variant of render_template_response. A summary that takes longer
+        than ``summary_timeout`` seconds is dropped; the cards are still returned.
+        """
+        cards = self.renderer.render(query_results, user_prefs)
+        if self.response_summary and query_results:
+            try:
+                summary = await asyncio.wait_for(
+                    self.summary_chain.ainvoke(self._summary_inputs(query_results, user_prefs)),
+                    timeout=summary_timeout
+                )
+                cards = [summary] + cards
+            except asyncio.TimeoutError:
+                logger.warning(f"Summary generation timed out after {summary_timeout}s")
+            except Exception as e:
+                logger.error(f"Summary generation failed: {str(e)}")
+        return "\n\n".join(cards)
+
+    async def agenerate_final_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        summary_timeout: Optional[float] = None
+    ) -> str:
+        """
+        Async variant of generate_final_response.
+        """
+        with trace_stage("rag.response", **self._span_attributes(query_results)) as stage_span:
+            with get_openai_callback() as usage:
+                response = await self._agenerate_final_response(
+                    query_results, user_prefs, stage_span, summary_timeout
+                )
+            record_token_usage(stage_span, usage)
+            return response
+
+    async def _agenerate_final_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        stage_span: trace.Span,
+        summary_timeout: Optional[float] = None
+    ) -> str:
+        if self.response_mode == "template":
+            return await self.arender_template_response(query_results, user_prefs, summary_timeout)
+        batches = self._plan_batches(query_results, user_prefs, stage_span)
+        if batches:
+            return await self.agenerate_batched_response(batches, user_prefs)
+        try:
+            result = await self.response_agent.ainvoke(
+                self._response_inputs(query_results, user_prefs)
+            )
+            return result["output"]
+        except Exception as e:
+            logger.error(f"Response generation failed: {str(e)}")
+            return "Could not generate response due to an internal error."
+
+    def stream_final_response(self, query_results: List[Dict], user_prefs: Dict) -> Iterator[str]:
+        """
+        Streaming variant of generate_final_response: yields text chunks as
+        the model produces them.
+        """
+        # Not made current: the caller runs between yields.
+        stage_span = start_stage_span(
+            "rag.response", **self._span_attributes(query_results, streaming=True)
+        )
+        try:
+            yield from self._stream_final_response(query_results, user_prefs, stage_span)
+        finally:
+            stage_span.end()
+
+    def _stream_final_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        stage_span: trace.Span
+    ) -> Iterator[str]:
+        if self.response_mode == "template":
+            cards = self.renderer.render(query_results, user_prefs)
+            if self.response_summary and query_results:
+                try:
+                    yield from self.summary_chain.stream(self._summary_inputs(query_results, user_prefs))
+                    yield "\n\n"
+                except Exception as e:
+                    logger.error(f"Summary generation failed: {str(e)}")
+            for card in cards:
+                yield card + "\n\n"
+            return
+        batches = self._plan_batches(query_results, user_prefs, stage_span)
+        if batches:
+            # Batches complete out of order; each is yielded once it and all
+            # batches ranked before it are done.
+            executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+            try:
+                futures = [
+                    executor.submit(self.response_batch_chain.invoke, inputs)
+                    for _, _, inputs in batches
+                ]
+                for (offset, rows, _), future in zip(batches, futures):
+                    try:
+                        output = future.result()
+                    except Exception as e:
+                        output = e
+                    yield self._batch_output(offset, rows, user_prefs, output) + "\n\n"
+            finally:
+                # A consumer that stops early (e.g. a Streamlit rerun) must not
+                # wait for the batches it will never read.
+                executor.shutdown(wait=False, cancel_futures=True)
+            return
+        try:
+            yield from self.response_stream_chain.stream(
+                self._response_inputs(query_results, user_prefs)
+            )
+        except Exception as e:
+            logger.error(f"Response streaming failed: {str(e)}")
+            yield "Could not generate response due to an internal error."
+
+    async def astream_final_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict
+    ) -> AsyncIterator[str]:
+        """
+        Async iterator variant of stream_final_response.
+        """
+        stage_span = start_stage_span(
+            "rag.response", **self._span_attributes(query_results, streaming=True)
+        )
+        try:
+            async for chunk in self._astream_final_response(query_results, user_prefs, stage_span):
+                yield chunk
+        finally:
+            stage_span.end()
+
+    async def _astream_final_response(
+        self,
+        query_results: List[Dict],
+        user_prefs: Dict,
+        stage_span: trace.Span
+    ) -> AsyncIterator[str]:
+        if self.response_mode == "template":
+            cards = self.renderer.render(query_results, user_prefs)
+            if self.response_summary and query_results:
+                try:
+                    async for chunk in self.summary_chain.astream(
+                        self._summary_inputs(query_results, user_prefs)
+                    ):
+                        yield chunk
+                    yield "\n\n"
+                except Exception as e:
+                    logger.error(f"Summary generation failed: {str(e)}")
+            for card in cards:
+                yield card + "\n\n"
+            return
+        batches = self._plan_batches(query_results, user_prefs, stage_span)
+        if batches:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def generate(inputs: Dict[str, Any]) -> str:
+                async with semaphore:
+                    return await self.response_batch_chain.ainvoke(inputs)
+
+            tasks = [asyncio.ensure_future(generate(inputs)) for _, _, inputs in batches]
+            try:
+                for (offset, rows, _), task in zip(batches, tasks):
+                    try:
+                        output = await task
+                    except Exception as e:
+                        output = e
+                    yield self._batch_output(offset, rows, user_prefs, output) + "\n\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+            return
+        try:
+            async for chunk in self.response_stream_chain.astream(
+                self._response_inputs(query_results, user_prefs)
+            ):
+                yield chunk
+        except Exception as e:
+            logger.error(f"Response streaming failed: {str(e)}")
+            yield "Could not generate response due to an internal error."
+
     @staticmethod
     def format_sql_results_tool(query_results: List[Dict]) -> List[Dict]:
         """Converts raw SQL results to structured JSON with consistent fields"""
         formatted = []
         for row in query_results:
+            card = format_row(row)
             formatted.append({
-                "Agency Name": row.get("Agency_Name", ""),
-                "Shipping Address": row.get("Shipping_Address", ""),
-                "Distance": f"{row['Distance']} miles" if isinstance(row.get("Distance"), (int, float)) else "Unknown",
-                "Day or Week": row.get("Day_or_Week", ""),
-                "Starting Time": ResponseGenerator.format_time(row.get("Starting_Time")),
-                "Ending Time": ResponseGenerator.format_time(row.get("Ending_Time")),
-                "Frequency": row.get("Frequency", "Not specified"),
-                "Food Format": row.get("Food_Format", "Not specified"),
-                "Choice Options": row.get("Choice_Options", "Not specified"),
-                "Distribution Models": row.get("Distribution_Models", "Not specified"),
-                "Phone": row.get("Phone", "Not available"),
-                "URL": row.get("URL", "Not available"),
-                "By Appointment Only": "Yes" if row.get("By_Appointment_Only") else "No",
-                "Additional Note on Hours of Operations": row.get("Additional_Note_on_Hours_of_Operations", "None"),
-                "Wraparound Service": ResponseGenerator.parse_services(row.get("Wraparound_Service"))
+                "Agency Name": card["agency_name"] or "",
+                "Shipping Address": card["address"] or "",
+                "Distance": f"{card['distance']} miles" if card["distance"] is not None else "Unknown",
+                "Day or Week": card["day"] or "",
+                "Starting Time": card["start"] or "Unknown",
+                "Ending Time": card["end"] or "Unknown",
+                "Frequency": card["frequency"] or "Not specified",
+                "Food Format": card["food_format"] or "Not specified",
+                "Choice Options": card["choice_options"] or "Not specified",
+                "Distribution Models": card["distribution_models"] or "Not specified",
+                "Phone": card["phone"] or "Not available",
+                "URL": card["url"] or "Not available",
+                "By Appointment Only": card["appointment_only"] or "Not available",
+                "Additional Note on Hours of Operations": card["additional_notes"] or "None",
+                "Wraparound Service": card["wraparound_services"]
             })
         return formatted
 
     @staticmethod
     def parse_services(service_str: Optional[str]) -> List[str]:
-        return [s.strip() for s in service_str.split(";")] if service_str else []
+        return parse_services(service_str)
 
     @staticmethod
     def format_time(time_str: Optional[str]) -> str:
-        try:
-            return datetime.strptime(time_str, "%H:%M:%S").strftime("%H:%M")
-        except (ValueError, TypeError):
-            return time_str or "Unknown"
+        return format_time(time_str) or "Unknown"
+
+class StageTimeoutError(Exception):
+    """
+    A pipeline stage did not finish within its configured timeout.
+    """
+
+    def __init__(self, stage: str, timeout: float):
+        super().__init__(f"Stage '{stage}' timed out after {timeout}s")
+        self.stage = stage
+        self.timeout = timeout
 
 class FoodAssistanceRAG:
+    # Built by db_helper.sql_helper.build_indexes
+    FTS_TABLE = "combined_data_fts"
+
+    # Seconds per stage of the async pipeline; None waits indefinitely.
+    DEFAULT_STAGE_TIMEOUTS = {
+        "geo": 15.0,
+        "dietary": 10.0,
+        "sql": 10.0,
+        "response": 60.0,
+        # Optional template-mode summary; dropped (not failed) on timeout.
+        "summary": 10.0,
+    }
+
     def __init__(
         self,
         openai_api_key: str,
@@ -272,58 +1065,307 @@ class FoodAssistanceRAG:
         dietary_model: str = "gpt-4o-mini",
         response_model: str = "gpt-4o-mini",
         dietary_temperature: float = 0.0,
-        response_temperature: float = 0.1
+        response_temperature: float = 0.1,
+        http_client: Optional[httpx.Client] = None,
+        response_mode: str = "llm",
+        response_summary: bool = False,
+        stage_timeouts: Optional[Dict[str, Optional[float]]] = None,
+        http_async_client: Optional[httpx.AsyncClient] = None,
+        config: Optional[Dict] = None,
+        backend: Optional[StorageBackend] = None
     ):
-        db_path = os.path.expanduser(db_path)
-        self.engine = create_engine(f"sqlite:///{db_path}")
+        """
+        :param stage_timeouts: per-stage timeouts in seconds for the async
+            pipeline (keys: geo, dietary, sql, response, summary), overriding
+            DEFAULT_STAGE_TIMEOUTS.
+        :param config: parsed config.yaml (pickup periods, labels, service
+            vocabulary); loaded from configs/config.yaml when omitted.
+        :param backend: where the agency queries run; the SQLite database
+            at ``db_path`` when omitted.
+        """
+        if config is None:
+            config = load_config()
+        self.time_config = config.get("time", {})
+        self.stage_timeouts = {**self.DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
+        self.backend = backend if backend is not None else SQLiteBackend(db_path)
         self.filter_gen = DietaryFilterGenerator(
             openai_api_key=openai_api_key,
             model_name=dietary_model,
-            temperature=dietary_temperature
+            temperature=dietary_temperature,
+            http_client=http_client,
+            fts_table=self._find_fts_table(),
+            http_async_client=http_async_client
         )
         self.response_gen = ResponseGenerator(
             openai_api_key=openai_api_key,
             model_name=response_model,
-            temperature=response_temperature
+            temperature=response_temperature,
+            http_client=http_client,
+            response_mode=response_mode,
+            response_summary=response_summary,
+            config=config,
+            http_async_client=http_async_client
         )
         self.query_builder = QueryBuilder()
+        # Match candidates through the crosswalk when it has been built.
+        self.use_crosswalk = self._has_table(QueryBuilder.CROSSWALK_TABLE)
+        # Answer located requests with one fused query when the agencies
+        # table has been materialized (db_helper.sql_helper.materialize_agencies);
+        # only SQLite needs its R*Tree.
+        self.use_agencies_table = self._has_table(agencies.AGENCIES_TABLE) and (
+            self.backend.dialect != "sqlite" or self._has_table(agencies.AGENCIES_RTREE)
+        )
 
-    def process_request(self, input_info: Dict) -> str:
+    def _has_table(self, table_name: str) -> bool:
         try:
-            # Generate dietary filters
-            dietary_where = self.filter_gen.generate_dietary_filters(
+            return self.backend.has_table(table_name)
+        except Exception as e:
+            logger.warning(f"Could not inspect database for {table_name}: {str(e)}")
+        return False
+
+    def _find_fts_table(self) -> Optional[str]:
+        """
+        The cultures/services FTS table, if the database was built with one.
+        """
+        return self.FTS_TABLE if self._has_table(self.FTS_TABLE) else None
+
+    def filter_by_hours(self, agencies: List[Dict], user_prefs: Dict) -> List[Dict]:
+        """
+        Drop the candidates that are closed in every pickup slot the user
+        chose, using the agency_hours index, so neither the SQL lookup nor
+        the prompt sees them. Without a chosen slot or an hours table, all
+        candidates are kept; if none is open, the unfiltered list is kept so
+        the user still gets options.
+        """
+        if not self.time_config.get("filter_by_hours", True):
+            return agencies
+        mask = pickup_mask(user_prefs, self.time_config)
+        if mask is None:
+            return agencies
+        with trace_stage("rag.hours", **{"hours.candidates": len(agencies)}) as stage_span:
+            hours_index = self.backend.hours_index()
+            if hours_index is None:
+                return agencies
+            open_agencies = hours_index.filter_open(agencies, mask)
+            set_attributes(stage_span, **{"hours.open": len(open_agencies)})
+        logger.info(f"{len(open_agencies)} of {len(agencies)} candidates open at the chosen pickup times")
+        return open_agencies or agencies
+
+    def search_agencies(
+        self,
+        location: Dict[str, float],
+        user_prefs: Dict,
+        dietary_where: Union[DietaryFilter, str]
+    ) -> List[Dict]:
+        """
+        Radius search, dietary and hours filtering and distance ranking in one
+        query over the agencies table. ``location`` has the user's "lat",
+        "lon" and the "radius_miles" to search. As with filter_by_hours, if
+        no agency is open at the chosen times the hours filter is dropped.
+        """
+        mask = None
+        if self.time_config.get("filter_by_hours", True):
+            mask = pickup_mask(user_prefs, self.time_config)
+        query = self.query_builder.build_fused_query(
+            location["lat"], location["lon"], location["radius_miles"], dietary_where,
+            hours_mask=mask, dialect=self.backend.dialect
+        )
+        logger.info(f"Executing fused agency search: {query.sql}")
+        rows = self.execute_query(query)
+        if not rows and mask is not None:
+            logger.info("No agency open at the chosen pickup times; searching without hours")
+            rows = self.execute_query(self.query_builder.build_fused_query(
+                location["lat"], location["lon"], location["radius_miles"], dietary_where,
+                dialect=self.backend.dialect
+            ))
+        return agencies.result_rows(rows)
+
+    def retrieve(self, input_info: Dict) -> List[Dict]:
+        """
+        Dietary filtering and SQL lookup for a request: the agency rows the
+        response is generated from. With a "Location" (see search_agencies)
+        and the agencies table, no "Arcgis" results are needed.
+        """
+        # Generate dietary filters
+        dietary_where = self.filter_gen.generate_dietary_filters(
+            input_info["USER_PREFS"]
+        )
+
+        if self.use_agencies_table and input_info.get("Location"):
+            return self.response_gen.annotate_services(
+                self.search_agencies(input_info["Location"], input_info["USER_PREFS"], dietary_where),
                 input_info["USER_PREFS"]
             )
-            
-            # Build complete query
-            full_query = self.query_builder.build_query(
-                input_info["Arcgis"],
-                dietary_where
-            )
-            logger.info(f"Executing query: {full_query}")
-            
-            # Execute query
-            query_results = self.execute_query(full_query)
-            
-            # Generate final response
-            return self.response_gen.generate_final_response(
+
+        # Build complete query
+        full_query = self.query_builder.build_query(
+            self.filter_by_hours(input_info["Arcgis"], input_info["USER_PREFS"]),
+            dietary_where,
+            crosswalk=self.use_crosswalk,
+            dialect=self.backend.dialect
+        )
+        logger.info(
+            f"Executing query over {len(full_query.candidates)} candidates: {full_query.sql}"
+        )
+        
+        # Execute query
+        return self.response_gen.annotate_services(
+            self.execute_query(full_query), input_info["USER_PREFS"]
+        )
+
+    def process_request(self, input_info: Dict) -> str:
+        with trace_stage("rag.process_request") as stage_span:
+            try:
+                query_results = self.retrieve(input_info)
+                set_attributes(stage_span, **{"rag.rows": len(query_results)})
+
+                # Generate final response
+                return self.response_gen.generate_final_response(
+                    query_results=query_results,
+                    user_prefs=input_info["USER_PREFS"]
+                )
+            except Exception as e:
+                stage_span.record_exception(e)
+                logger.error(f"Processing failed: {str(e)}")
+                return "An error occurred while processing your request."
+
+    def stream_request(self, input_info: Dict) -> Iterator[str]:
+        """
+        Streaming variant of process_request: yields response text chunks.
+        """
+        stage_span = start_stage_span("rag.stream_request")
+        try:
+            try:
+                # No yields in here, so the retrieval spans can nest under it.
+                with use_stage_span(stage_span):
+                    query_results = self.retrieve(input_info)
+                set_attributes(stage_span, **{"rag.rows": len(query_results)})
+            except Exception as e:
+                stage_span.record_exception(e)
+                logger.error(f"Processing failed: {str(e)}")
+                yield "An error occurred while processing your request."
+                return
+            yield from self.response_gen.stream_final_response(
                 query_results=query_results,
                 user_prefs=input_info["USER_PREFS"]
             )
-        except Exception as e:
-            logger.error(f"Processing failed: {str(e)}")
-            return "An error occurred while processing your request."
+        finally:
+            stage_span.end()
 
-    def execute_query(self, query: str) -> List[Dict]:
+    async def _run_stage(self, stage: str, awaitable: Awaitable) -> Any:
+        """
+        Await one pipeline stage under its timeout, logging how long it took.
+        """
+        timeout = self.stage_timeouts.get(stage)
+        start = time.perf_counter()
         try:
-            # Remove any remaining markdown
-            clean_query = re.sub(r"```sql|```", "", query)
-            
-            with self.engine.connect() as connection:
-                if not connection.dialect.has_table(connection, "combined_data"):
-                    raise ValueError("combined_data table does not exist")
-                result = connection.execute(text(clean_query))
-                return [dict(row._mapping) for row in result]
-        except Exception as e:
-            logger.error(f"Query execution failed: {str(e)}")
-            return []
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            trace.get_current_span().add_event("stage_timeout", {"stage": stage, "timeout": timeout})
+            raise StageTimeoutError(stage, timeout) from None
+        finally:
+            logger.info(f"Stage {stage} finished in {time.perf_counter() - start:.3f}s")
+
+    async def aretrieve(
+        self,
+        input_info: Dict,
+        geo_helper=None,
+        radius_miles: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict]:
+        """
+        Async variant of retrieve.
+
+        Dietary filtering only needs the preferences, so it runs concurrently
+        with the geo lookup: when ``input_info`` has no "Arcgis" results, the
+        agencies near ``USER_PREFS["address"]`` are fetched with ``geo_helper``
+        (a GeoHelper) while the filter is generated. The SQL lookup waits for
+        both. With the agencies table and a radius, only the address is
+        geocoded and the search itself runs in the SQL stage (``limit`` then
+        does not apply).
+        """
+        user_prefs = input_info["USER_PREFS"]
+        location = input_info.get("Location")
+        arcgis_agencies = input_info.get("Arcgis")
+        fused = self.use_agencies_table and arcgis_agencies is None and (
+            location is not None or radius_miles is not None
+        )
+        dietary_task = asyncio.ensure_future(
+            self._run_stage("dietary", self.filter_gen.agenerate_dietary_filters(user_prefs))
+        )
+        try:
+            if fused and location is None:
+                if geo_helper is None:
+                    raise ValueError("input_info has no Location and no geo_helper was given")
+                lat, lon = await self._run_stage(
+                    "geo", geo_helper.ageocode_address(user_prefs["address"])
+                )
+                location = {"lat": lat, "lon": lon, "radius_miles": radius_miles}
+            elif arcgis_agencies is None and not fused:
+                if geo_helper is None:
+                    raise ValueError("input_info has no Arcgis results and no geo_helper was given")
+                arcgis_agencies = await self._run_stage(
+                    "geo",
+                    geo_helper.afind_nearby_food_assistance(
+                        user_prefs["address"], radius_miles=radius_miles, limit=limit
+                    )
+                )
+            dietary_where = await dietary_task
+        finally:
+            # The geo stage failed; don't leave the filter running.
+            dietary_task.cancel()
+
+        if fused:
+            rows = await self._run_stage(
+                "sql", asyncio.to_thread(self.search_agencies, location, user_prefs, dietary_where)
+            )
+            return self.response_gen.annotate_services(rows, user_prefs)
+
+        # The first call loads the hours index from the database; keep it
+        # off the event loop.
+        open_agencies = await asyncio.to_thread(self.filter_by_hours, arcgis_agencies, user_prefs)
+        full_query = self.query_builder.build_query(
+            open_agencies, dietary_where,
+            crosswalk=self.use_crosswalk, dialect=self.backend.dialect
+        )
+        logger.info(
+            f"Executing query over {len(full_query.candidates)} candidates: {full_query.sql}"
+        )
+        rows = await self._run_stage("sql", asyncio.to_thread(self.execute_query, full_query))
+        return self.response_gen.annotate_services(rows, user_prefs)
+
+    async def aprocess_request(
+        self,
+        input_info: Dict,
+        geo_helper=None,
+        radius_miles: Optional[float] = None,
+        limit: Optional[int] = None
+    ) -> str:
+        """
+        Async variant of process_request; see aretrieve for the geo arguments.
+        End-to-end latency is the longer of the geo and dietary stages plus
+        the SQL and response stages, each bounded by its stage timeout.
+        """
+        with trace_stage("rag.process_request", **{"rag.async": True}) as stage_span:
+            try:
+                query_results = await self.aretrieve(input_info, geo_helper, radius_miles, limit)
+                set_attributes(stage_span, **{"rag.rows": len(query_results)})
+                return await self._run_stage(
+                    "response",
+                    self.response_gen.agenerate_final_response(
+                        query_results=query_results,
+                        user_prefs=input_info["USER_PREFS"],
+                        summary_timeout=self.stage_timeouts.get("summary")
+                    )
+                )
+            except Exception as e:
+                stage_span.record_exception(e)
+                logger.error(f"Processing failed: {str(e)}")
+                return "An error occurred while processing your request."
+
+    def execute_query(
+        self,
+        query: Union[AgencyQuery, str],
+        params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict]:
+        return execute_agency_query(self.backend, query, params)
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+import httpx
+
+from src.db_helper.backends import get_backend
+from src.rag_helper.langchain import FoodAssistanceRAG
+from src.utilities.cassette import AsyncCassetteTransport, Cassette, CassetteTransport, get_cassette
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# One connection pool for every OpenAI client in the process. Keep-alive
+# connections stay open between submits so requests skip TCP/TLS setup.
+HTTP_LIMITS = httpx.Limits(
+    max_connections=20,
+    max_keepalive_connections=10,
+    keepalive_expiry=300.0
+)
+HTTP_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+
+# Keyed by cassette path (None: plain network client).
+_http_clients: Dict[Optional[str], httpx.Client] = {}
+_pipelines: Dict[Tuple, FoodAssistanceRAG] = {}
+_lock = threading.Lock()
+
+
+def get_http_client(cassette: Optional[Cassette] = None) -> httpx.Client:
+    """
+    Process-wide HTTP client shared by the LLM clients. With a cassette,
+    requests are recorded to or replayed from it.
+    """
+    key = cassette.path if cassette is not None else None
+    with _lock:
+        client = _http_clients.get(key)
+        if client is None:
+            if cassette is None:
+                client = httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+            else:
+                client = httpx.Client(
+                    transport=CassetteTransport(cassette, httpx.HTTPTransport(limits=HTTP_LIMITS)),
+                    timeout=HTTP_TIMEOUT
+                )
+            _http_clients[key] = client
+        return client
+
+
+def get_async_http_client(cassette: Optional[Cassette] = None) -> Optional[httpx.AsyncClient]:
+    """
+    Async client for the LLM clients' ainvoke/astream calls when a cassette is
+    in use; None leaves the OpenAI client's own default.
+    """
+    if cassette is None:
+        return None
+    return httpx.AsyncClient(
+        transport=AsyncCassetteTransport(cassette, httpx.AsyncHTTPTransport(limits=HTTP_LIMITS)),
+        timeout=HTTP_TIMEOUT
+    )
+
+
+def get_pipeline(
+    openai_api_key: str,
+    db_path: str,
+    dietary_model: str = "gpt-4o-mini",
+    response_model: str = "gpt-4o-mini",
+    dietary_temperature: float = 0.0,
+    response_temperature: float = 0.1,
+    response_mode: str = "llm",
+    response_summary: bool = False,
+    stage_timeouts: Optional[Dict[str, Optional[float]]] = None,
+    cassette: Optional[Cassette] = None,
+    storage_backend: str = "sqlite",
+    parquet_dir: Optional[str] = None
+) -> FoodAssistanceRAG:
+    """
+    Long-lived FoodAssistanceRAG for the given models and database.
+
+    The pipeline (storage backend, LLM clients, prompts and agent executor)
+    is built on first use and reused by every later request in the process.
+    With a cassette, LLM traffic is recorded to or replayed from it.
+
+    :param storage_backend: "sqlite" (``db_path``) or "duckdb" (the Parquet
+        files in ``parquet_dir``).
+    """
+    db_path = os.path.abspath(os.path.expanduser(db_path))
+    if parquet_dir is not None:
+        parquet_dir = os.path.abspath(os.path.expanduser(parquet_dir))
+    key = (
+        # Never keep the raw key around as part of a dict key.
+        hashlib.sha256(openai_api_key.encode("utf-8")).hexdigest(),
+        db_path,
+        dietary_model,
+        response_model,
+        dietary_temperature,
+        response_temperature,
+        response_mode,
+        response_summary,
+        tuple(sorted((stage_timeouts or {}).items())),
+        (cassette.path, cassette.mode) if cassette is not None else None,
+        storage_backend,
+        parquet_dir,
+    )
+    http_client = get_http_client(cassette)
+    with _lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            logger.info(
+                f"Building pipeline for {db_path} on {storage_backend} "
+                f"(dietary: {dietary_model}, response: {response_model})"
+            )
+            pipeline = FoodAssistanceRAG(
+                openai_api_key=openai_api_key,
+                db_path=db_path,
+                dietary_model=dietary_model,
+                response_model=response_model,
+                dietary_temperature=dietary_temperature,
+                response_temperature=response_temperature,
+                http_client=http_client,
+                http_async_client=get_async_http_client(cassette),
+                response_mode=response_mode,
+                response_summary=response_summary,
+                stage_timeouts=stage_timeouts,
+                backend=get_backend(storage_backend, db_path, parquet_dir)
+            )
+            _pipelines[key] = pipeline
+        return pipeline
+
+
+def get_pipeline_from_config(config: Dict[str, Any], db_path: str) -> FoodAssistanceRAG:
+    """
+    Pipeline for the ``llm_config.LangChainRAGHelper`` and ``db`` sections
+    of config.yaml. An empty ``openai_api_key`` falls back to the
+    OPENAI_API_KEY environment variable.
+    """
+    llm_cfg = config["llm_config"]["LangChainRAGHelper"]
+    db_cfg = config.get("db", {})
+    parquet_dir = db_cfg.get("parquet_dir")
+    return get_pipeline(
+        openai_api_key=llm_cfg.get("openai_api_key") or os.environ.get("OPENAI_API_KEY", ""),
+        db_path=db_path,
+        dietary_model=llm_cfg["model_name"],
+        response_model=llm_cfg["model_name"],
+        response_mode=llm_cfg.get("response_mode", "llm"),
+        response_summary=llm_cfg.get("response_summary", False),
+        stage_timeouts=llm_cfg.get("stage_timeouts"),
+        cassette=get_cassette(config, "openai"),
+        storage_backend=db_cfg.get("backend", "sqlite"),
+        parquet_dir=os.path.join(PROJECT_DIR, parquet_dir) if parquet_dir else None
+    )
+
+
+def clear_pipelines() -> None:
+    """
+    Drop all cached pipelines, e.g. after the database has been rebuilt.
+    """
+    with _lock:
+        for pipeline in _pipelines.values():
+            pipeline.backend.dispose()
+        _pipelines.clear()
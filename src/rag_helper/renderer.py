@@ -0,0 +1,158 @@
+import math
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from src.rag_helper.services import MISSING_SERVICES_FIELD, ServiceVocabulary, parse_services
+
+
+def _blank(value: Any) -> bool:
+    return (
+        value is None
+        or (isinstance(value, float) and math.isnan(value))
+        or (isinstance(value, str) and not value.strip())
+    )
+
+
+def get_field(row: Dict[str, Any], name: str) -> Any:
+    """
+    Value of a combined_data column, tolerating the trailing-space headers of
+    the source sheets ("Food Format ") and underscore-style keys.
+    """
+    for key in (name, name + " ", name.replace(" ", "_")):
+        value = row.get(key)
+        if not _blank(value):
+            return value.strip() if isinstance(value, str) else value
+    return None
+
+
+def format_time(time_str: Optional[str]) -> Optional[str]:
+    """
+    "HH:MM:SS" -> "HH:MM"; other values are returned unchanged.
+    """
+    try:
+        return datetime.strptime(time_str, "%H:%M:%S").strftime("%H:%M")
+    except (ValueError, TypeError):
+        return time_str
+
+
+def format_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The fields of one agency card, in card order. Missing values are None so
+    the renderer can fill in localized placeholders.
+    """
+    distance = get_field(row, "Distance")
+    return {
+        "agency_name": get_field(row, "Agency Name"),
+        "address": get_field(row, "Shipping Address"),
+        "distance": float(distance) if isinstance(distance, (int, float)) else None,
+        "day": get_field(row, "Day or Week"),
+        "start": format_time(get_field(row, "Starting Time")),
+        "end": format_time(get_field(row, "Ending Time")),
+        "frequency": get_field(row, "Frequency"),
+        "food_format": get_field(row, "Food Format"),
+        "choice_options": get_field(row, "Choice Options"),
+        "distribution_models": get_field(row, "Distribution Models"),
+        "phone": get_field(row, "Phone"),
+        "url": get_field(row, "URL"),
+        "appointment_only": get_field(row, "By Appointment Only"),
+        "additional_notes": get_field(row, "Additional Note on Hours of Operations"),
+        "wraparound_services": parse_services(get_field(row, "Wraparound Service")),
+    }
+
+
+class AgencyCardRenderer:
+    """
+    Renders SQL result rows as the "Option N" markdown cards described by
+    ResponseGenerator.RESPONSE_STRUCTURE, without an LLM.
+    """
+
+    def __init__(
+        self,
+        labels: Dict[str, Dict[str, str]],
+        vocabulary: ServiceVocabulary,
+        default_language: str = 'en'
+    ):
+        self.labels = labels
+        self.vocabulary = vocabulary
+        self.default_language = default_language
+
+    def _labels(self, language: Optional[str]) -> Dict[str, str]:
+        default = self.labels.get(self.default_language, {})
+        return {**default, **self.labels.get(language or self.default_language, {})}
+
+    def requested_services(self, user_prefs: Dict[str, Any]) -> List[str]:
+        """
+        Selected service options, without the ones that are not services
+        ("None", "Ninguno", ...) in any language.
+        """
+        services = user_prefs.get("services") or []
+        if isinstance(services, str):
+            services = [services]
+        elif isinstance(services, dict):
+            services = [k for k, v in services.items() if v]
+        return [option for option in services if self.vocabulary.canonical(option) is not None]
+
+    def render_card(
+        self,
+        number: int,
+        row: Dict[str, Any],
+        requested: List[str],
+        language: Optional[str] = None
+    ) -> str:
+        t = self._labels(language)
+        card = format_row(row)
+
+        def value(key: str, placeholder: str) -> str:
+            return str(card[key]) if card[key] is not None else t[placeholder]
+
+        distance = (
+            f"{card['distance']:.2f} {t['miles']}" if card["distance"] is not None else t["unknown"]
+        )
+        if card["start"] and card["end"]:
+            hours = f"{card['start']}-{card['end']}"
+            hours = f"{card['day']} {hours}" if card["day"] else hours
+        else:
+            hours = card["day"] or t["not_available"]
+        appointment = card["appointment_only"]
+        if isinstance(appointment, str) and appointment.lower() in ("yes", "no"):
+            appointment = t[appointment.lower()]
+
+        lines = [
+            f"**{t['option']} {number}:**",
+            f"- {t['agency_name']}: {value('agency_name', 'not_available')}",
+            f"- {t['address']}: {value('address', 'not_available')}",
+            f"- {t['distance']}: {distance}",
+            f"- {t['operating_hours']}: {hours}",
+            f"- {t['frequency']}: {value('frequency', 'not_available')}",
+            f"- {t['food_format']}: {value('food_format', 'not_specified')}",
+            f"- {t['choice_options']}: {value('choice_options', 'not_specified')}",
+            f"- {t['distribution_models']}: {value('distribution_models', 'not_specified')}",
+            f"- {t['phone']}: {value('phone', 'not_available')}",
+            f"- {t['url']}: {value('url', 'not_available')}",
+            f"- {t['appointment_only']}: {appointment if appointment is not None else t['not_available']}",
+            f"- {t['additional_notes']}: {value('additional_notes', 'none')}",
+            f"- {t['wraparound_services']}: {', '.join(card['wraparound_services']) or t['none']}",
+        ]
+        if requested:
+            missing = row.get(MISSING_SERVICES_FIELD)
+            if missing is None:
+                missing = self.vocabulary.missing(requested, card["wraparound_services"])
+            note = (
+                f"{t['missing_services']}: {', '.join(missing)}" if missing
+                else t["all_services_available"]
+            )
+            lines.append(f"- {t['note']}: {note}")
+        return "\n".join(lines)
+
+    def render(self, query_results: List[Dict[str, Any]], user_prefs: Dict[str, Any]) -> List[str]:
+        """
+        One markdown card per row, in the original (distance) order.
+        """
+        language = user_prefs.get("language")
+        if not query_results:
+            return [self._labels(language)["no_results"]]
+        requested = self.requested_services(user_prefs)
+        return [
+            self.render_card(number, row, requested, language)
+            for number, row in enumerate(query_results, start=1)
+        ]
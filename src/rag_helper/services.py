@@ -0,0 +1,113 @@
+import re
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# combined_data column written at ingestion: bitmask of the agency's services.
+SERVICE_MASK_COLUMN = "service_mask"
+# Result-row field with the requested services the agency lacks.
+MISSING_SERVICES_FIELD = "Missing Services"
+
+
+def parse_services(service_str: Optional[str]) -> List[str]:
+    """
+    Split a "Wraparound Service" cell into service names.
+
+    The ETL joins services with ", "; older exports used "; ".
+    """
+    if not service_str:
+        return []
+    return [s.strip() for s in re.split(r"[;,]", service_str) if s.strip()]
+
+
+class ServiceVocabulary:
+    """
+    Maps the user-facing service options (any configured language) to the
+    service names used in the agency data.
+    """
+
+    def __init__(
+        self,
+        wraparound_services: Dict[str, List[str]],
+        service_options: Dict[str, List[Any]],
+        default_language: str = 'en',
+        service_bits: Optional[List[str]] = None
+    ):
+        """
+        :param service_bits: every data service name, in bit order (bit i is
+            the i-th name); defaults to the names in wraparound_services.
+        """
+        # canonical (default-language) option -> data service names
+        self.data_names: Dict[str, List[str]] = {
+            option: list(names) for option, names in wraparound_services.items()
+        }
+        # data service name (lowercased) -> bit position
+        if service_bits is None:
+            service_bits = sorted({name for names in self.data_names.values() for name in names})
+        self.bits: Dict[str, int] = {name.lower(): bit for bit, name in enumerate(service_bits)}
+        for names in self.data_names.values():
+            for name in names:
+                self.bits.setdefault(name.lower(), len(self.bits))
+        # canonical option -> mask of the data services that satisfy it
+        self.option_masks: Dict[str, int] = {
+            option: self.encode(names) for option, names in self.data_names.items()
+        }
+        # option text in any language (lowercased) -> canonical option
+        self.canonical_options: Dict[str, str] = {}
+        default_opts = service_options.get(default_language) or []
+        for lang_opts in service_options.values():
+            # Options are listed in the same order in every language.
+            for position, option in enumerate(lang_opts or []):
+                if position < len(default_opts) and default_opts[position] in self.data_names:
+                    self.canonical_options[str(option).lower()] = default_opts[position]
+
+    def canonical(self, option: str) -> Optional[str]:
+        """
+        Default-language option for an option in any language, or None for
+        options that are not services (e.g. "None").
+        """
+        return self.canonical_options.get(str(option).lower())
+
+    def encode(self, agency_services: List[str]) -> int:
+        """
+        Bitmask of data service names; names outside the vocabulary are ignored.
+        """
+        mask = 0
+        for name in agency_services:
+            bit = self.bits.get(name.lower())
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def coverage(
+        self,
+        requested: List[str],
+        agency_masks: Sequence[int]
+    ) -> Tuple[np.ndarray, List[List[str]]]:
+        """
+        How many requested options each agency covers, and which ones (as
+        given) it lacks, for all agencies at once.
+
+        :return: (covered count per agency, missing options per agency).
+        """
+        options = [
+            (option, self.option_masks[canonical])
+            for option in requested
+            if (canonical := self.canonical(option)) is not None
+        ]
+        masks = np.asarray(agency_masks, dtype=np.int64).reshape(-1)
+        if not options:
+            return np.zeros(len(masks), dtype=np.int64), [[] for _ in range(len(masks))]
+        # agencies x options: does the agency offer any service of the option?
+        covered = (masks[:, None] & np.array([m for _, m in options], dtype=np.int64)) != 0
+        missing = [
+            [options[j][0] for j in np.flatnonzero(~row)]
+            for row in covered
+        ]
+        return covered.sum(axis=1), missing
+
+    def missing(self, requested: List[str], agency_services: List[str]) -> List[str]:
+        """
+        Requested options (as given) that the agency's services do not cover.
+        """
+        return self.coverage(requested, [self.encode(agency_services)])[1][0]
@@ -0,0 +1,30 @@
+import re
+from typing import Iterable, Iterator
+
+# Start of an agency card in the response markdown ("**Option 3:**", or the
+# localized label, e.g. "**Opción 3:**").
+OPTION_HEADER = re.compile(r"^[ \t]*\*\*[^\W\d_]+\s+\d+", re.MULTILINE)
+
+
+def iter_option_cards(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Regroup a streamed response into complete "Option N" cards.
+
+    A card is yielded as soon as the next card's header arrives; any text
+    before the first card (e.g. an intro line) is yielded on its own.
+    """
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        boundaries = [m.start() for m in OPTION_HEADER.finditer(buffer) if m.start() > 0]
+        if not boundaries:
+            continue
+        start = 0
+        for boundary in boundaries:
+            piece = buffer[start:boundary].strip()
+            if piece:
+                yield piece
+            start = boundary
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip()
@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Any, Optional
+
+import httpx
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+MODES = ("off", "record", "replay")
+
+# Response headers worth replaying. The body is stored decoded, so encoding
+# and length headers from the original response would be wrong.
+REPLAY_HEADERS = ("content-type",)
+
+
+class CassetteMiss(Exception):
+    """
+    Replay mode found no recorded response for a request.
+    """
+
+
+class Cassette:
+    """
+    Recorded request/response pairs for one external service, stored as JSON
+    lines. In record mode every exchange is appended (the latest recording of
+    a request wins); in replay mode responses are served from the file after
+    an injected delay, so nothing goes over the network.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        latency_ms: Optional[float] = None,
+        latency_scale: float = 1.0
+    ):
+        """
+        :param path: cassette file (JSON lines).
+        :param mode: "record" or "replay".
+        :param latency_ms: fixed replay delay; None replays the recorded
+            latency of each exchange.
+        :param latency_scale: multiplier applied to the replay delay.
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassette not found: {path}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key(request: Dict[str, Any]) -> str:
+        return hashlib.sha256(
+            json.dumps(request, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+
+    def record(self, request: Dict[str, Any], response: Dict[str, Any], elapsed: float) -> None:
+        entry = {
+            "key": self.key(request),
+            "request": request,
+            "response": response,
+            "elapsed": elapsed,
+        }
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def _lookup(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        entry = self._entries.get(self.key(request))
+        if entry is None:
+            raise CassetteMiss(
+                f"No recorded response in {os.path.basename(self.path)} for {json.dumps(request)[:200]}"
+            )
+        return entry
+
+    def _delay(self, entry: Dict[str, Any]) -> float:
+        delay = entry["elapsed"] if self.latency_ms is None else self.latency_ms / 1000.0
+        return delay * self.latency_scale
+
+    def replay(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Recorded response for a request, after the injected delay.
+        """
+        entry = self._lookup(request)
+        time.sleep(self._delay(entry))
+        return entry["response"]
+
+    async def areplay(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Async variant of replay.
+        """
+        entry = self._lookup(request)
+        await asyncio.sleep(self._delay(entry))
+        return entry["response"]
+
+
+def _request_summary(request: httpx.Request, content: bytes) -> Dict[str, Any]:
+    """
+    The parts of an HTTP request that identify it; headers (credentials,
+    user agent, retry counters) are left out.
+    """
+    try:
+        body = json.loads(content) if content else None
+    except ValueError:
+        body = content.decode("utf-8", errors="replace")
+    return {"method": request.method, "url": str(request.url), "body": body}
+
+
+def _response_summary(response: httpx.Response, content: bytes) -> Dict[str, Any]:
+    return {
+        "status_code": response.status_code,
+        "headers": {k: v for k, v in response.headers.items() if k.lower() in REPLAY_HEADERS},
+        "content": content.decode("utf-8", errors="surrogateescape"),
+    }
+
+
+def _build_response(summary: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+    return httpx.Response(
+        summary["status_code"],
+        headers=summary["headers"],
+        content=summary["content"].encode("utf-8", errors="surrogateescape"),
+        request=request
+    )
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """
+    httpx transport that records exchanges through ``transport`` into a
+    cassette, or replays them from it.
+
+    Streamed responses are read in full before being recorded, and replayed
+    as a single chunk.
+    """
+
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.BaseTransport] = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        summary = _request_summary(request, request.read())
+        if self.cassette.mode == "replay":
+            return _build_response(self.cassette.replay(summary), request)
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        response_summary = _response_summary(response, content)
+        self.cassette.record(summary, response_summary, time.perf_counter() - start)
+        return _build_response(response_summary, request)
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """
+    Async variant of CassetteTransport.
+    """
+
+    def __init__(self, cassette: Cassette, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        summary = _request_summary(request, await request.aread())
+        if self.cassette.mode == "replay":
+            return _build_response(await self.cassette.areplay(summary), request)
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        response_summary = _response_summary(response, content)
+        self.cassette.record(summary, response_summary, time.perf_counter() - start)
+        return _build_response(response_summary, request)
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(config: Dict[str, Any], name: str) -> Optional[Cassette]:
+    """
+    Process-wide cassette ``name`` (e.g. "openai", "arcgis") for the
+    ``replay`` section of config.yaml, or None when record/replay is off.
+    """
+    replay_cfg = config.get("replay") or {}
+    mode = replay_cfg.get("mode") or "off"
+    if mode not in MODES:
+        raise ValueError(f"Invalid replay mode: {mode}")
+    if mode == "off":
+        return None
+    path = os.path.join(
+        PROJECT_DIR, replay_cfg.get("cassette_dir", "data/cassettes"), f"{name}.jsonl"
+    )
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None or cassette.mode != mode:
+            cassette = Cassette(
+                path,
+                mode=mode,
+                latency_ms=(replay_cfg.get("latency_ms") or {}).get(name),
+                latency_scale=replay_cfg.get("latency_scale", 1.0)
+            )
+            _cassettes[path] = cassette
+        return cassette
@@ -1,65 +1,171 @@
+import atexit
+import copy
 import logging
 import os
-from typing import Optional
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Any, Optional
+
+from src.utilities.config_parser import load_config
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in every 1/rate records per message template, so a message
+    logged on every request is still seen without flooding the log.
+    WARNING and above are always kept.
+    """
+
+    def __init__(self, default_rate: float = 1.0, rates: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.default_rate = default_rate
+        self.rates = rates or {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        template = str(record.msg)
+        rate = self.rates.get(template, self.default_rate)
+        if rate >= 1:
+            return True
+        if rate <= 0:
+            return False
+        with self._lock:
+            count = self._counts.get(template, 0)
+            self._counts[template] = count + 1
+        return count % round(1 / rate) == 0
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Hands records to the listener thread without blocking: messages are
+    formatted and capped at ``max_message_chars`` in the calling thread, and
+    records are dropped (and counted) when the queue is full.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_message_chars: int = 2000):
+        super().__init__(log_queue)
+        self.max_message_chars = max_message_chars
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        message = record.getMessage()
+        if self.max_message_chars and len(message) > self.max_message_chars:
+            message = (
+                f"{message[:self.max_message_chars]}"
+                f"... [{len(message) - self.max_message_chars} chars truncated]"
+            )
+        record = copy.copy(record)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.message = message
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(config: Dict[str, Any]) -> QueueListener:
+    """
+    Route every logger through a queue for the ``logging`` section of
+    config.yaml: request threads only enqueue, and a listener thread writes
+    to the console and a size-rotated file. Replaces the root handlers
+    installed by logging.basicConfig. Only the first call has an effect.
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return _listener
+        log_cfg = config.get("logging") or {}
+        level = config.get("log_level", "INFO")
+        formatter = logging.Formatter(LOG_FORMAT)
+
+        file_path = os.path.join(PROJECT_DIR, log_cfg.get("file_path", "logs/app.log"))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        file_handler = RotatingFileHandler(
+            file_path,
+            maxBytes=log_cfg.get("max_bytes", 10 * 1024 * 1024),
+            backupCount=log_cfg.get("backup_count", 5),
+            encoding="utf-8"
+        )
+        console_handler = logging.StreamHandler()
+        for handler in (file_handler, console_handler):
+            handler.setFormatter(formatter)
+
+        log_queue = queue.Queue(maxsize=log_cfg.get("queue_size", 10000))
+        queue_handler = BoundedQueueHandler(log_queue, log_cfg.get("max_message_chars", 2000))
+        queue_handler.addFilter(
+            SamplingFilter(log_cfg.get("sample_rate", 1.0), log_cfg.get("sample_rates"))
+        )
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(log_queue, file_handler, console_handler)
+        _listener.start()
+        # Flush what is still queued when the process exits.
+        atexit.register(_listener.stop)
+        return _listener
+
 
 class Logger:
     _instance: Optional['Logger'] = None
-    
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Logger, cls).__new__(cls)
             cls._instance._initialize_logger()
         return cls._instance
-        
+
     def _initialize_logger(self):
         """
-        Initialize logger
+        Initialize logger; records propagate to the queue-based root handler.
         """
+        configure_logging(load_config())
         self.logger = logging.getLogger('AI_la_Carte')
         self.logger.setLevel('INFO')
-        
-        # Create logs directory if it doesn't exist
-        log_dir = 'logs'
-        if not os.path.exists(log_dir):
-            os.makedirs(log_dir)
-            
-        # File handler
-        file_handler = logging.FileHandler(os.path.join(log_dir, 'app.log'))
-        file_handler.setLevel('INFO')
-        
-        # Console handler
-        console_handler = logging.StreamHandler()
-        console_handler.setLevel('INFO')
-        
-        # Formatter
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        console_handler.setFormatter(formatter)
-        
-        # Add handlers
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
-        
+
     def info(self, message: str):
         """
         Log info message
         """
         self.logger.info(message)
-        
+
     def error(self, message: str):
         """
         Log error message
         """
         self.logger.error(message)
-        
+
     def warning(self, message: str):
         """
         Log warning message
         """
         self.logger.warning(message)
-        
+
     def debug(self, message: str):
         """
         Log debug message
         """
-        self.logger.debug(message) 
\ No newline at end of file
+        self.logger.debug(message)
@@ -0,0 +1,361 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Deque, List, Optional, Sequence, Tuple
+
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor
+
+from src.utilities.tracing import add_span_processor
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+PREFIX = "ai_la_carte"
+QUANTILES = (0.5, 0.95, 0.99)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    # Nearest-rank quantile.
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [{"labels": dict(labels), "value": value} for labels, value in sorted(self.values().items())]
+
+
+class _Series:
+    def __init__(self, buckets: Sequence[float], window: int):
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts (for Prometheus) plus a window of the most recent
+    observations per label set, from which p50/p95/p99 are computed.
+    """
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], window: int = 1024):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._series: Dict[Labels, _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.buckets, self.window)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series.bucket_counts[i] += 1
+            series.count += 1
+            series.sum += value
+            series.recent.append(value)
+
+    def _copy(self) -> Dict[Labels, Tuple[List[int], int, float, List[float]]]:
+        with self._lock:
+            return {
+                key: (list(s.bucket_counts), s.count, s.sum, sorted(s.recent))
+                for key, s in self._series.items()
+            }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        quantile_lines = [
+            f"# HELP {self.name}_recent {self.help_text} (last {self.window} observations)",
+            f"# TYPE {self.name}_recent summary",
+        ]
+        for labels, (bucket_counts, count, total, recent) in sorted(self._copy().items()):
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                lines.append(f"{self.name}_bucket{_format_labels(labels, {'le': f'{bound:g}'})} {bucket_count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+            for q in QUANTILES:
+                quantile_lines.append(
+                    f"{self.name}_recent{_format_labels(labels, {'quantile': f'{q:g}'})} "
+                    f"{_quantile(recent, q):g}"
+                )
+            quantile_lines.append(f"{self.name}_recent_sum{_format_labels(labels)} {sum(recent):g}")
+            quantile_lines.append(f"{self.name}_recent_count{_format_labels(labels)} {len(recent)}")
+        return lines + quantile_lines
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        series = []
+        for labels, (_, count, total, recent) in sorted(self._copy().items()):
+            entry = {"labels": dict(labels), "count": count, "sum": total}
+            entry.update({f"p{round(q * 100)}": _quantile(recent, q) for q in QUANTILES})
+            series.append(entry)
+        return series
+
+
+class MetricsRegistry:
+    """
+    The pipeline's metrics: stage latencies, LLM tokens per request, cache
+    hit ratios and result counts.
+    """
+
+    def __init__(self, window: int = 1024):
+        self.stage_duration = Histogram(
+            f"{PREFIX}_stage_duration_seconds", "Pipeline stage latency", LATENCY_BUCKETS, window
+        )
+        self.llm_tokens = Histogram(
+            f"{PREFIX}_llm_tokens", "LLM tokens per request", TOKEN_BUCKETS, window
+        )
+        self.cache_requests = Counter(
+            f"{PREFIX}_cache_requests_total", "Cache lookups by result"
+        )
+        self.geo_results = Histogram(
+            f"{PREFIX}_geo_results", "Agencies returned by the geo search", COUNT_BUCKETS, window
+        )
+        self.sql_rows = Histogram(
+            f"{PREFIX}_sql_rows", "Rows returned by the agency query", COUNT_BUCKETS, window
+        )
+
+    def cache_hit_ratios(self) -> Dict[str, float]:
+        totals: Dict[str, List[float]] = {}
+        for labels, value in self.cache_requests.values().items():
+            label_map = dict(labels)
+            hits_total = totals.setdefault(label_map["cache"], [0.0, 0.0])
+            hits_total[1] += value
+            if label_map["result"] == "hit":
+                hits_total[0] += value
+        return {cache: hits / total for cache, (hits, total) in totals.items() if total}
+
+    def render_prometheus(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines: List[str] = []
+        lines += self.stage_duration.render()
+        lines += self.llm_tokens.render()
+        lines += self.cache_requests.render()
+        lines += [
+            f"# HELP {PREFIX}_cache_hit_ratio Cache hits over lookups",
+            f"# TYPE {PREFIX}_cache_hit_ratio gauge",
+        ]
+        for cache, ratio in sorted(self.cache_hit_ratios().items()):
+            lines.append(f"{PREFIX}_cache_hit_ratio{_format_labels(_labels({'cache': cache}))} {ratio:g}")
+        lines += self.geo_results.render()
+        lines += self.sql_rows.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        All metrics as a JSON-serializable dict, with p50/p95/p99 per series.
+        """
+        return {
+            "timestamp": time.time(),
+            "stage_duration_seconds": self.stage_duration.snapshot(),
+            "llm_tokens": self.llm_tokens.snapshot(),
+            "cache_requests": self.cache_requests.snapshot(),
+            "cache_hit_ratio": self.cache_hit_ratios(),
+            "geo_results": self.geo_results.snapshot(),
+            "sql_rows": self.sql_rows.snapshot(),
+        }
+
+
+class MetricsSpanProcessor(SpanProcessor):
+    """
+    Feeds the registry from the pipeline's tracing spans: every stage span
+    (see src.utilities.tracing.trace_stage) is timed, and its attributes
+    carry the token counts, cache hits and result counts.
+    """
+
+    def __init__(self, registry: MetricsRegistry):
+        self.registry = registry
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.start_time is None or span.end_time is None:
+            return
+        registry = self.registry
+        attributes = span.attributes or {}
+        registry.stage_duration.observe((span.end_time - span.start_time) / 1e9, stage=span.name)
+        for kind in ("prompt", "completion"):
+            tokens = attributes.get(f"llm.{kind}_tokens")
+            # Requests served without the LLM report zero tokens; skip them.
+            if tokens and attributes.get("llm.requests"):
+                registry.llm_tokens.observe(tokens, stage=span.name, kind=kind)
+        if "geo.cache_hit" in attributes:
+            registry.cache_requests.inc(
+                cache="geocode", result="hit" if attributes["geo.cache_hit"] else "miss"
+            )
+        if span.name == "geo.search" and "geo.results" in attributes:
+            registry.geo_results.observe(attributes["geo.results"], backend=attributes.get("geo.backend", ""))
+        if "db.rows" in attributes:
+            registry.sql_rows.observe(attributes["db.rows"])
+
+    def shutdown(self) -> None:
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry
+
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body = self.registry.render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body = json.dumps(self.registry.snapshot()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes would flood the app log.
+        pass
+
+
+def serve_metrics(registry: MetricsRegistry, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve /metrics (Prometheus text) and /metrics.json from a daemon thread.
+    """
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def dump_metrics(registry: MetricsRegistry, path: str) -> None:
+    """
+    Write a JSON snapshot, replacing the previous one atomically.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(registry.snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def start_json_dump(registry: MetricsRegistry, path: str, interval_seconds: float) -> threading.Thread:
+    """
+    Dump a JSON snapshot every ``interval_seconds`` from a daemon thread.
+    """
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            try:
+                dump_metrics(registry, path)
+            except OSError:
+                pass
+
+    thread = threading.Thread(target=run, name="metrics-dump", daemon=True)
+    thread.start()
+    return thread
+
+
+_registry: Optional[MetricsRegistry] = None
+_lock = threading.Lock()
+
+
+def _dump_path(metrics_cfg: Dict[str, Any]) -> Optional[str]:
+    dump_cfg = metrics_cfg.get("json_dump") or {}
+    return os.path.join(PROJECT_DIR, dump_cfg["path"]) if dump_cfg.get("path") else None
+
+
+def get_registry() -> Optional[MetricsRegistry]:
+    """
+    The process-wide registry, or None until configure_metrics enables it.
+    """
+    return _registry
+
+
+def configure_metrics(config: Dict[str, Any]) -> Optional[MetricsRegistry]:
+    """
+    Set up the registry for the ``metrics`` section of config.yaml: hook it
+    into the pipeline's spans, and start the Prometheus endpoint and the
+    periodic JSON dump when configured. Only the first call has an effect.
+    """
+    global _registry
+    metrics_cfg = config.get("metrics") or {}
+    if not metrics_cfg.get("enabled"):
+        return None
+    with _lock:
+        if _registry is not None:
+            return _registry
+        registry = MetricsRegistry(window=metrics_cfg.get("window", 1024))
+        add_span_processor(MetricsSpanProcessor(registry))
+        port = metrics_cfg.get("prometheus_port")
+        if port:
+            serve_metrics(registry, int(port), metrics_cfg.get("prometheus_host", "127.0.0.1"))
+        dump_path = _dump_path(metrics_cfg)
+        if dump_path:
+            start_json_dump(
+                registry, dump_path, metrics_cfg["json_dump"].get("interval_seconds", 60)
+            )
+        _registry = registry
+        return registry
+
+
+def flush_metrics(config: Dict[str, Any]) -> None:
+    """
+    Write the configured JSON snapshot now, e.g. before a script exits.
+    """
+    dump_path = _dump_path(config.get("metrics") or {})
+    if _registry is not None and dump_path:
+        dump_metrics(_registry, dump_path)
@@ -0,0 +1,46 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Modules the first submit needs: GeoHelper (arcgis, pandas) and the RAG
+# pipeline (langchain, langchain_openai, SQLAlchemy, httpx).
+SUBMIT_MODULES = (
+    "src.geo_helper.geo_helper",
+    "src.rag_helper.pipeline_registry",
+)
+
+_thread: Optional[threading.Thread] = None
+_lock = threading.Lock()
+
+
+def _import_all(modules: Sequence[str]) -> None:
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            # The submit path imports the module again and surfaces the error.
+            logger.warning("Prewarm import of %s failed: %s", name, e)
+            continue
+        logger.info("Prewarmed %s in %.2fs", name, time.perf_counter() - start)
+
+
+def start_prewarm(modules: Sequence[str] = SUBMIT_MODULES) -> threading.Thread:
+    """
+    Import ``modules`` in a background thread, once per process, so the
+    page renders without waiting for them and the first submit finds them
+    loaded. Importing a module the thread is still loading just waits for
+    it (the import system locks per module).
+    """
+    global _thread
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(
+                target=_import_all, args=(tuple(modules),), name="prewarm", daemon=True
+            )
+            _thread.start()
+        return _thread
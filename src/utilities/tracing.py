@@ -0,0 +1,127 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+
+PROJECT_DIR = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+# Instrumentation scope for every span of the pipeline.
+TRACER_NAME = "ai_la_carte"
+
+_provider: Optional[TracerProvider] = None
+_exporting = False
+_lock = threading.Lock()
+
+
+def _get_provider(service_name: str) -> TracerProvider:
+    # Called with _lock held.
+    global _provider
+    if _provider is None:
+        _provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        trace.set_tracer_provider(_provider)
+    return _provider
+
+
+def add_span_processor(processor: SpanProcessor, service_name: str = "ai-la-carte") -> None:
+    """
+    Feed finished spans to ``processor`` (e.g. the metrics registry),
+    installing the tracer provider if needed.
+    """
+    with _lock:
+        _get_provider(service_name).add_span_processor(processor)
+
+
+def configure_tracing(config: Dict[str, Any]) -> bool:
+    """
+    Export spans for the ``tracing`` section of config.yaml.
+
+    Spans go to a JSON-lines file (one span per line) or to the console.
+    Safe to call more than once, e.g. on every Streamlit rerun; only the
+    first call has an effect. Until spans have a consumer (this exporter
+    or the metrics registry), they are no-ops.
+
+    :return: whether tracing is enabled.
+    """
+    global _exporting
+    tracing_cfg = config.get("tracing") or {}
+    if not tracing_cfg.get("enabled"):
+        return False
+    with _lock:
+        if _exporting:
+            return True
+        if tracing_cfg.get("exporter", "file") == "console":
+            exporter = ConsoleSpanExporter()
+        else:
+            file_path = os.path.join(PROJECT_DIR, tracing_cfg.get("file_path", "logs/traces.jsonl"))
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            exporter = ConsoleSpanExporter(
+                out=open(file_path, "a", encoding="utf-8"),
+                formatter=lambda span: span.to_json(indent=None) + "\n"
+            )
+        provider = _get_provider(tracing_cfg.get("service_name", "ai-la-carte"))
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        _exporting = True
+        return True
+
+
+def get_tracer() -> trace.Tracer:
+    return trace.get_tracer(TRACER_NAME)
+
+
+def set_attributes(span: trace.Span, **attributes: Any) -> None:
+    """
+    Set the attributes that have a value; OpenTelemetry rejects None.
+    """
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+
+
+def record_token_usage(span: trace.Span, usage: Any) -> None:
+    """
+    Token counts from a langchain OpenAI callback handler.
+    """
+    set_attributes(
+        span,
+        **{
+            "llm.prompt_tokens": usage.prompt_tokens,
+            "llm.completion_tokens": usage.completion_tokens,
+            "llm.total_tokens": usage.total_tokens,
+            "llm.requests": usage.successful_requests,
+        }
+    )
+
+
+@contextmanager
+def trace_stage(name: str, **attributes: Any) -> Iterator[trace.Span]:
+    """
+    Current span ``name`` with the given attributes; exceptions are recorded
+    on it and re-raised.
+    """
+    with get_tracer().start_as_current_span(name) as stage_span:
+        set_attributes(stage_span, **attributes)
+        yield stage_span
+
+
+def start_stage_span(name: str, **attributes: Any) -> trace.Span:
+    """
+    A span that is not made current, for work that spans generator yields;
+    the caller must end() it.
+    """
+    stage_span = get_tracer().start_span(name)
+    set_attributes(stage_span, **attributes)
+    return stage_span
+
+
+def use_stage_span(stage_span: trace.Span):
+    """
+    Make a span from start_stage_span current for a block, without ending it.
+    """
+    return trace.use_span(stage_span, end_on_exit=False)
@@ -5,8 +5,13 @@ from datetime import datetime, timedelta
 import logging
 
 
-from src.geo_helper.geo_helper import GeoHelper
-import src.rag_helper.langchain as lc
+# GeoHelper (arcgis, pandas) and the RAG pipeline (langchain, SQLAlchemy)
+# are imported on submit; start_prewarm loads them in the background.
+from src.rag_helper.streaming import iter_option_cards
+from src.utilities.logger import configure_logging
+from src.utilities.metrics import configure_metrics
+from src.utilities.prewarm import start_prewarm
+from src.utilities.tracing import configure_tracing, set_attributes, trace_stage
 
 
 # Configure logging
@@ -23,9 +28,11 @@ def filter_by_distance(
         config,
         limit=100
     ):
+    from src.geo_helper.geo_helper import GeoHelper
+
     max_distance = float(user_prefs.get('max_distance'))
     logger.info("Filtering by distance using max_distance: %s", max_distance)
-    geo_helper = GeoHelper()
+    geo_helper = GeoHelper.from_config(config)
     distance_data = geo_helper.find_nearby_food_assistance(
         user_prefs["address"], 
         radius_miles=max(max_distance, config["distance"]["max_threshold"]),
@@ -38,21 +45,52 @@ def filter_by_distance(
     return distance_data
 
 
+def locate_user(user_prefs, config):
+    """
+    Geocoded address and search radius for the single-query agency search;
+    the nearby-agency lookup itself then runs in SQL.
+    """
+    from src.geo_helper.geo_helper import GeoHelper
+
+    max_distance = float(user_prefs.get('max_distance'))
+    lat, lon = GeoHelper.from_config(config).geocode_address(user_prefs["address"])
+    return {
+        "lat": lat,
+        "lon": lon,
+        "radius_miles": max(max_distance, config["distance"]["max_threshold"]),
+    }
+
+
+def uses_agencies_table(config):
+    from src.rag_helper.pipeline_registry import get_pipeline_from_config
+
+    return get_pipeline_from_config(config, os.path.abspath("data/cafb.db")).use_agencies_table
+
+
 def rag_search(user_prefs, distance_data, config):
+    from src.rag_helper.pipeline_registry import get_pipeline_from_config
+
     logger.info("Performing RAG search/comparison with user preferences...")
     logger.info("Running inference...")
     INPUT_INFO = {"USER_PREFS": user_prefs, "Arcgis": distance_data}
     db_path = os.path.abspath("data/cafb.db")
-    rag_system = lc.FoodAssistanceRAG(
-        openai_api_key=config["llm_config"]["LangChainRAGHelper"]["openai_api_key"], 
-        db_path=db_path,
-        dietary_model=config["llm_config"]["LangChainRAGHelper"]["model_name"],
-        response_model=config["llm_config"]["LangChainRAGHelper"]["model_name"]
-    )
+    # Built once per process and reused across submits
+    rag_system = get_pipeline_from_config(config, db_path)
     response = rag_system.process_request(INPUT_INFO)
     return response
 
 
+def rag_search_stream(user_prefs, distance_data, config, location=None):
+    from src.rag_helper.pipeline_registry import get_pipeline_from_config
+
+    logger.info("Performing streaming RAG search with user preferences...")
+    INPUT_INFO = {"USER_PREFS": user_prefs, "Arcgis": distance_data, "Location": location}
+    db_path = os.path.abspath("data/cafb.db")
+    rag_system = get_pipeline_from_config(config, db_path)
+    # Yield whole "Option N" cards as soon as each one is complete
+    return iter_option_cards(rag_system.stream_request(INPUT_INFO))
+
+
 # ########################################################################
 # Helpers for localized text and options
 # ########################################################################
@@ -109,22 +147,35 @@ def get_time_slots_for_day(day_key):
 # ########################################################################
 
 
+@st.cache_data
+def _parse_config(config_path, mtime):
+    with open(config_path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
 def load_config():
     config_path = os.path.abspath(
         os.path.join(os.path.dirname(__file__), 'configs', 'config.yaml')
     )
-    with open(config_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    # Parsed once per file version instead of on every rerun
+    return _parse_config(config_path, os.path.getmtime(config_path))
 
 
 def get_user_preferences(responses):
     for key in responses:
+        # Keep free-text follow-up answers keyed by option
+        if key == 'follow_ups':
+            continue
         if isinstance(responses[key], dict):
             responses[key] = [k for k, v in responses[key].items() if v and k != "None"]
     return responses
 
 # Load configuration
 config = load_config()
+configure_logging(config)
+configure_tracing(config)
+configure_metrics(config)
+start_prewarm()
 user_pref_cfg = config['user_preferences']
 langs = config['languages']['supported']
 def_lang = config['languages']['default']
@@ -236,23 +287,32 @@ if st.button("Submit", key='submit_button'):
         st.stop()
     # st.write("## Collected Preferences")
     # st.json(responses)
-    with st.spinner("Processing..."):
+    with st.spinner("Processing..."), trace_stage("streamlit.submit") as submit_span:
         try:
             # workflow
             user_prefs = get_user_preferences(responses)
             # st.write("## User Preferences")
             # st.json(user_prefs)
-            distance_data = filter_by_distance(
-                user_prefs, 
-                config=config,
-                limit=100,
-            )
-            results = rag_search(user_prefs, distance_data, config=config)
+            set_attributes(submit_span, **{"user.language": user_prefs.get("language")})
+            location, distance_data = None, None
+            if uses_agencies_table(config):
+                location = locate_user(user_prefs, config=config)
+            else:
+                distance_data = filter_by_distance(
+                    user_prefs, 
+                    config=config,
+                    limit=100,
+                )
+            cards = []
+            for card in rag_search_stream(user_prefs, distance_data, config=config, location=location):
+                st.markdown(card)
+                cards.append(card)
+            set_attributes(submit_span, **{"response.cards": len(cards)})
+            results = "\n\n".join(cards)
             logger.info("Final Results: %s", results)
         except Exception as e:
             logger.error(f"Workflow error: {str(e)}")
             raise
-        st.write(results)
     # Here you could call your main workflow, e.g.:  
     # from mains.poc_workflow import run_workflow  
     # results = run_workflow(responses)  
@@ -0,0 +1,111 @@
+import pytest
+
+from src.rag_helper.dietary_rules import DietaryFilter, DietaryRuleEngine
+from src.utilities.config_parser import load_config
+
+# Same shape as DietaryFilterGenerator.DIETARY_RULES.
+RULES = {
+    'health_restrictions': {
+        'triggers': ['diabetic', 'hypertension', 'low sodium', 'low sugar', 'fresh produce'],
+        'agency_type': ['Markets'],
+        'cultures_served': 'All Cultural Populations'
+    },
+    'religious_restrictions': {
+        'triggers': ['halal'],
+        'agency_type': ['Markets', 'Shopping Partners'],
+        'cultures_served': 'Middle Eastern/North African'
+    },
+    'no_dietary_needs': {
+        'triggers': [],
+        'agency_type': [],
+        'cultures_served': ''
+    }
+}
+
+
+@pytest.fixture(scope="module")
+def valid_options():
+    return load_config()["user_preferences"]["valid_options"]
+
+
+@pytest.fixture(scope="module")
+def engine(valid_options):
+    return DietaryRuleEngine(RULES, valid_options)
+
+
+def test_no_restrictions_compile_to_empty_filter(engine):
+    dietary_filter = engine.compile({
+        "health_dietary_restrictions": ["None"],
+        "religious_dietary_restrictions": ["None"],
+    })
+    assert isinstance(dietary_filter, DietaryFilter)
+    assert not dietary_filter
+    assert dietary_filter.params == {}
+
+
+def test_health_option_compiles_agency_type_predicate(engine):
+    dietary_filter = engine.compile({"health_dietary_restrictions": ["Diabetic Meal"]})
+    assert dietary_filter.sql == "(agency_type IN (:health_restrictions_type_0))"
+    assert dietary_filter.params == {"health_restrictions_type_0": "Markets"}
+
+
+def test_translated_option_triggers_the_default_language_rule(engine):
+    english = engine.compile({"health_dietary_restrictions": ["Low Sodium / Hypertension Meal"]})
+    spanish = engine.compile({"health_dietary_restrictions": ["Baja en sodio / Hipertensión"]})
+    assert spanish.sql == english.sql
+    assert spanish.params == english.params
+
+
+def test_option_only_triggers_rules_of_its_preference(engine):
+    # "Diabetic Meal" under religious restrictions triggers nothing.
+    assert not engine.compile({"religious_dietary_restrictions": ["Diabetic Meal"]})
+
+
+def test_religious_option_compiles_culture_pattern(engine):
+    dietary_filter = engine.compile({"religious_dietary_restrictions": ["Halal Meal"]})
+    assert '"Cultural Populations Served" LIKE :religious_restrictions_culture' in dietary_filter.sql
+    assert dietary_filter.params["religious_restrictions_culture"] == "%Middle%Eastern/%North%African%"
+    assert dietary_filter.params["religious_restrictions_type_1"] == "Shopping Partners"
+
+
+def test_rules_are_joined_in_name_order(engine):
+    dietary_filter = engine.compile({
+        "religious_dietary_restrictions": ["Halal Meal"],
+        "health_dietary_restrictions": ["Diabetic Meal"],
+    })
+    health, religious = dietary_filter.sql.split(" AND (", 1)
+    assert ":health_restrictions_type_0" in health
+    assert ":religious_restrictions_culture" in religious
+
+
+def test_sql_never_contains_user_text(engine):
+    dietary_filter = engine.compile({
+        "health_dietary_restrictions": ["Other"],
+        "follow_ups": {"health_dietary_restrictions": {"Other": "diabetic'; DROP TABLE x; --"}},
+    })
+    assert "DROP" not in dietary_filter.sql
+    assert "health_restrictions_type_0" in dietary_filter.params
+
+
+def test_unmapped_follow_up_answer_falls_back(engine):
+    assert engine.compile({
+        "health_dietary_restrictions": ["Allergic to"],
+        "follow_ups": {"health_dietary_restrictions": {"Allergic to": "peanuts"}},
+    }) is None
+
+
+def test_blank_follow_up_answer_is_ignored(engine):
+    assert not engine.compile({
+        "health_dietary_restrictions": ["Other"],
+        "follow_ups": {"health_dietary_restrictions": {"Other": "  "}},
+    })
+
+
+def test_fts_table_uses_match_predicate(valid_options):
+    engine = DietaryRuleEngine(RULES, valid_options, fts_table="combined_data_fts")
+    dietary_filter = engine.compile({"religious_dietary_restrictions": ["Halal Meal"]})
+    assert (
+        "c.rowid IN (SELECT rowid FROM combined_data_fts "
+        "WHERE combined_data_fts MATCH :religious_restrictions_culture)"
+    ) in dietary_filter.sql
+    assert dietary_filter.params["religious_restrictions_culture"] == 'cultures_served : "middle eastern north african"'
@@ -0,0 +1,60 @@
+import numpy as np
+
+from src.geo_helper.distance import geodesic_miles, haversine_miles, nearest_within
+
+# Capitol Hill, DC.
+LAT, LON = 38.8899, -77.0091
+# Roughly 1, 3, 5, 8 and 20 miles north of it, deliberately out of order.
+LATS = np.array([LAT + 5 / 69.0, LAT + 1 / 69.0, LAT + 20 / 69.0, LAT + 3 / 69.0, LAT + 8 / 69.0])
+LONS = np.full(LATS.shape, LON)
+
+
+def test_nearest_within_measures_with_haversine():
+    indices, distances = nearest_within(LAT, LON, LATS, LONS)
+    assert indices.tolist() == [1, 3, 0, 4, 2]
+    np.testing.assert_allclose(distances, haversine_miles(LAT, LON, LATS[indices], LONS[indices]))
+
+
+def test_nearest_within_exact_results():
+    indices, distances = nearest_within(LAT, LON, LATS, LONS, exact_results=True)
+    assert indices.tolist() == [1, 3, 0, 4, 2]
+    np.testing.assert_allclose(distances, geodesic_miles(LAT, LON, LATS[indices], LONS[indices]))
+
+
+def test_nearest_within_radius_and_limit():
+    indices, distances = nearest_within(LAT, LON, LATS, LONS, radius_miles=6.0)
+    assert indices.tolist() == [1, 3, 0]
+    assert (distances <= 6.0).all()
+
+    indices, _ = nearest_within(LAT, LON, LATS, LONS, radius_miles=6.0, limit=2)
+    assert indices.tolist() == [1, 3]
+
+
+def test_nearest_within_settles_the_radius_edge_exactly():
+    # Haversine and geodesic disagree by a fraction of a percent; a radius
+    # between the two is decided by the geodesic.
+    exact = geodesic_miles(LAT, LON, LATS[:1], LONS[:1])[0]
+    approx = haversine_miles(LAT, LON, LATS[:1], LONS[:1])[0]
+    assert exact != approx
+    radius = (exact + approx) / 2
+    indices, _ = nearest_within(LAT, LON, LATS, LONS, radius_miles=radius)
+    assert (0 in indices) == (exact <= radius)
+
+
+def test_nearest_within_settles_the_limit_boundary_exactly():
+    # About 10 miles north and east: haversine ranks east first, the
+    # geodesic north.
+    lats = np.array([LAT + 10 / 69.0, LAT])
+    lons = np.array([LON, LON + 0.1855])
+    assert np.argmin(haversine_miles(LAT, LON, lats, lons)) == 1
+    assert np.argmin(geodesic_miles(LAT, LON, lats, lons)) == 0
+
+    indices, distances = nearest_within(LAT, LON, lats, lons, limit=1)
+    assert indices.tolist() == [0]
+    np.testing.assert_allclose(distances, geodesic_miles(LAT, LON, lats[:1], lons[:1]))
+
+
+def test_nearest_within_no_points():
+    indices, distances = nearest_within(LAT, LON, np.array([]), np.array([]), radius_miles=5.0)
+    assert indices.size == 0
+    assert distances.size == 0
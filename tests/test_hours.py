@@ -0,0 +1,82 @@
+from datetime import date
+
+import pytest
+
+from src.db_helper.hours import FULL_DAY, HoursIndex, hour_mask, hours_rows, pickup_mask
+from src.utilities.config_parser import load_config
+
+# A Friday; "Oct 17" slots are Fridays, "Oct 18" Saturdays.
+TODAY = date(2025, 10, 17)
+FRIDAY = 4
+SATURDAY = 5
+
+
+@pytest.fixture(scope="module")
+def time_cfg():
+    return load_config()["time"]
+
+
+def day_bits(day: int, mask: int) -> int:
+    return mask << (day * 24)
+
+
+def test_hour_mask_covers_touched_hours():
+    assert hour_mask(9 * 60, 12 * 60) == 0b111 << 9
+    assert hour_mask(9 * 60 + 30, 10 * 60 + 1) == 0b11 << 9
+    assert hour_mask(0, 24 * 60) == FULL_DAY
+    assert hour_mask(10 * 60, 10 * 60) == 0
+
+
+def test_pickup_mask_maps_slot_to_day_and_period(time_cfg):
+    mask = pickup_mask({"pickup_time": ["Oct 17 morning"]}, time_cfg, today=TODAY)
+    # morning is 06:00-11:59
+    assert mask == day_bits(FRIDAY, hour_mask(6 * 60, 12 * 60))
+
+
+def test_pickup_mask_combines_slots(time_cfg):
+    mask = pickup_mask(
+        {"pickup_time": ["Oct 17 evening", "Oct 18 afternoon"]}, time_cfg, today=TODAY
+    )
+    assert mask == (
+        day_bits(FRIDAY, hour_mask(17 * 60, 21 * 60))
+        | day_bits(SATURDAY, hour_mask(12 * 60, 17 * 60))
+    )
+
+
+def test_pickup_mask_rolls_dates_into_next_year(time_cfg):
+    # Jan 02 2026 is a Friday.
+    mask = pickup_mask({"pickup_time": "Jan 02 night"}, time_cfg, today=date(2025, 12, 30))
+    assert mask == day_bits(FRIDAY, hour_mask(21 * 60, 24 * 60))
+
+
+@pytest.mark.parametrize("slots", [None, [], ["whenever"], ["Oct 17 brunch"]])
+def test_pickup_mask_without_readable_slot_is_none(time_cfg, slots):
+    assert pickup_mask({"pickup_time": slots}, time_cfg, today=TODAY) is None
+
+
+def test_hours_index_filters_closed_agencies_in_order():
+    rows = hours_rows([
+        {"agency_ref": "open", "start1_Friday": "09:00:00", "end1_Friday": "12:00:00"},
+        {"agency_ref": "closed", "start1_Friday": "13:00:00", "end1_Friday": "17:00:00"},
+        {"agency_ref": "late", "start2_Friday": "18:00", "end2_Friday": "23:59"},
+    ])
+    index = HoursIndex.from_rows(rows)
+    morning = day_bits(FRIDAY, hour_mask(6 * 60, 12 * 60))
+    agencies = [{"Agency ID": agency_id} for agency_id in ("late", "unknown", "closed", "open")]
+
+    assert index.is_open("open", morning) is True
+    assert index.is_open("closed", morning) is False
+    assert index.is_open("unknown", morning) is None
+    # Agencies without hours on record are kept.
+    assert [a["Agency ID"] for a in index.filter_open(agencies, morning)] == ["unknown", "open"]
+    assert index.bitmaps["late"] == day_bits(FRIDAY, hour_mask(18 * 60, 24 * 60))
+
+
+def test_hours_rows_read_appointment_and_residents_flags():
+    rows = hours_rows([{
+        "agency_ref": "A1",
+        "ByAppointmentOnly_Monday": "No\r\nYes",
+        "ResidentsOnly_Sunday": "Yes",
+    }])
+    assert rows[0]["appointment_days"] == 1 << 0
+    assert rows[0]["residents_days"] == 1 << 6
@@ -0,0 +1,57 @@
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+
+from src.utilities import tracing
+from src.utilities.metrics import MetricsRegistry, MetricsSpanProcessor
+from src.utilities.tracing import TRACER_NAME
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = MetricsRegistry()
+    provider = TracerProvider()
+    provider.add_span_processor(MetricsSpanProcessor(registry))
+    # Spans of trace_stage go to this provider only.
+    monkeypatch.setattr(tracing, "get_tracer", lambda: provider.get_tracer(TRACER_NAME))
+    return registry
+
+
+def cache_counts(registry):
+    return {dict(labels)["result"]: value for labels, value in registry.cache_requests.values().items()}
+
+
+def test_stage_spans_are_timed(registry):
+    with tracing.trace_stage("rag.sql", **{"db.rows": 7}):
+        pass
+    assert [s["labels"]["stage"] for s in registry.stage_duration.snapshot()] == ["rag.sql"]
+    assert registry.sql_rows.snapshot()[0]["count"] == 1
+
+
+def test_geocode_cache_hits_feed_the_hit_ratio(registry, tmp_path):
+    pytest.importorskip("arcgis")
+    from src.geo_helper.geo_helper import GeoHelper
+    from src.geo_helper.geocode_cache import GeocodeCache
+
+    geo_helper = GeoHelper(geocode_cache=GeocodeCache(str(tmp_path / "geocode_cache.db")))
+    geocoded = {"location": {"x": -77.0091, "y": 38.8899}, "score": 100}
+    geo_helper._geocode = lambda address: geocoded
+
+    geo_helper.geocode_address("1 First St NE, Washington, DC")
+    assert cache_counts(registry) == {"miss": 1.0}
+    assert registry.cache_hit_ratios() == {"geocode": 0.0}
+
+    geo_helper.geocode_address("1 First St NE, Washington, DC")
+    assert cache_counts(registry) == {"miss": 1.0, "hit": 1.0}
+    assert registry.cache_hit_ratios() == {"geocode": 0.5}
+    assert 'ai_la_carte_cache_hit_ratio{cache="geocode"} 0.5' in registry.render_prometheus()
+
+
+def test_geocode_without_cache_records_no_lookup(registry):
+    pytest.importorskip("arcgis")
+    from src.geo_helper.geo_helper import GeoHelper
+
+    geo_helper = GeoHelper()
+    geo_helper._geocode = lambda address: {"location": {"x": 0.0, "y": 0.0}, "score": 100}
+    geo_helper.geocode_address("anywhere")
+    assert registry.cache_requests.values() == {}
+    assert [s["labels"]["stage"] for s in registry.stage_duration.snapshot()] == ["geo.geocode"]
@@ -0,0 +1,73 @@
+import pytest
+
+from src.rag_helper.renderer import AgencyCardRenderer
+from src.rag_helper.services import ServiceVocabulary
+from src.utilities.config_parser import load_config
+
+ROW = {
+    "Agency Name": "Academy of Hope",
+    "Shipping Address": "2315 18th Pl NE Washington DC 20018",
+    "Distance": 1.23456,
+    "Day or Week": "Wednesday",
+    "Starting Time": "12:00:00",
+    "Ending Time": "14:00:00",
+    "Frequency": "4th of the Month",
+    "Food Format ": "Loose groceries",
+    "Phone": None,
+    "By Appointment Only": "No",
+    "Wraparound Service": "Housing, ESL",
+}
+
+
+@pytest.fixture(scope="module")
+def renderer():
+    config = load_config()
+    vocabulary = ServiceVocabulary(
+        config["wraparound_services"],
+        config["user_preferences"]["valid_options"]["services"],
+        service_bits=config.get("wraparound_service_bits")
+    )
+    return AgencyCardRenderer(config["response_labels"], vocabulary)
+
+
+def test_render_card_fields(renderer):
+    card = renderer.render_card(3, ROW, []).splitlines()
+    assert card[0] == "**Option 3:**"
+    assert "- Distance: 1.23 miles" in card
+    assert "- Operating Hours: Wednesday 12:00-14:00" in card
+    # Trailing-space headers are read.
+    assert "- Food Format: Loose groceries" in card
+    assert "- Phone: Not available" in card
+    assert "- Wraparound Services: Housing, ESL" in card
+    # No services requested, no note.
+    assert not any(line.startswith("- Note:") for line in card)
+
+
+def test_render_card_missing_services(renderer):
+    card = renderer.render_card(1, ROW, ["Housing", "Child care"])
+    assert card.endswith("- Note: Missing requested services: Child care")
+
+
+def test_render_card_in_spanish(renderer):
+    card = renderer.render_card(1, ROW, ["Vivienda"], language="es")
+    assert card.startswith("**Opción 1:**")
+    assert "millas" in card
+
+
+def test_requested_services_drops_none_in_any_language(renderer):
+    prefs = {"services": {"Ninguno": True, "Vivienda": True, "Guardería": False}}
+    assert renderer.requested_services(prefs) == ["Vivienda"]
+    assert renderer.requested_services({"services": ["None"]}) == []
+    assert renderer.requested_services({"services": "Housing"}) == ["Housing"]
+
+
+def test_ninguno_alone_adds_no_note(renderer):
+    # Regression: "Ninguno" used to read as a requested service that every
+    # agency had, giving "All requested services available".
+    cards = renderer.render([ROW], {"services": ["Ninguno"], "language": "es"})
+    assert "- Nota:" not in cards[0]
+    assert "Todos los servicios solicitados" not in cards[0]
+
+
+def test_render_without_rows(renderer):
+    assert renderer.render([], {}) == [renderer._labels(None)["no_results"]]
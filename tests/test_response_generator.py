@@ -0,0 +1,144 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("langchain_openai")
+
+from src.rag_helper.context_budget import project_row, serialize_rows
+from src.rag_helper.langchain import ResponseGenerator
+from src.utilities.config_parser import load_config
+
+
+class RowBudget:
+    """
+    ContextBudget stand-in that fits ``rows_per_prompt`` rows, without a
+    tokenizer.
+    """
+
+    def __init__(self, rows_per_prompt: int, max_rows: int = 50):
+        self.rows_per_prompt = rows_per_prompt
+        self.max_rows = max_rows
+        self.fitted_rows = 0
+
+    def fit(self, query_results, fixed_text):
+        self.fitted_rows += len(query_results)
+        rows = [project_row(row) for row in query_results[:min(self.rows_per_prompt, self.max_rows)]]
+        return serialize_rows(rows), len(rows), 0
+
+
+def make_generator(response_mode="llm", batch_size=0, budget=None):
+    config = load_config()
+    config["llm_config"]["LangChainRAGHelper"]["response_batch_size"] = batch_size
+    generator = ResponseGenerator(
+        openai_api_key="sk-test",
+        model_name="gpt-4o-mini",
+        response_mode=response_mode,
+        config=config
+    )
+    if budget is not None:
+        generator._context_budget = budget
+    return generator
+
+
+def rows(count):
+    return [{"Agency Name": f"Agency {i}", "Distance": float(i)} for i in range(1, count + 1)]
+
+
+def test_batches_carry_rows_the_budget_drops():
+    # Regression: batches of 3 where only 2 rows fit used to skip the third
+    # row of every batch and leave gaps in the option numbers.
+    generator = make_generator(batch_size=3, budget=RowBudget(rows_per_prompt=2))
+    batches = generator._batches(rows(7), {})
+
+    assert [(offset, len(batch)) for offset, batch, _ in batches] == [(0, 2), (2, 2), (4, 2), (6, 1)]
+    assert [row for _, batch, _ in batches for row in batch] == rows(7)
+
+    numbers = []
+    for offset, batch, inputs in batches:
+        assert len(json.loads(inputs["query_results"])) == len(batch)
+        numbers.extend(range(inputs["first_option"], inputs["last_option"] + 1))
+    assert numbers == list(range(1, 8))
+
+
+def test_batches_respect_max_rows():
+    generator = make_generator(batch_size=2, budget=RowBudget(rows_per_prompt=2, max_rows=5))
+    batches = generator._batches(rows(9), {})
+    assert sum(len(batch) for _, batch, _ in batches) == 5
+
+
+class EchoChain:
+    """
+    Batch chain stand-in that answers each batch with its option range.
+    """
+
+    def batch(self, inputs, config=None, return_exceptions=False):
+        return [f"options {i['first_option']}-{i['last_option']}" for i in inputs]
+
+
+def test_batches_are_planned_once_per_request():
+    budget = RowBudget(rows_per_prompt=2)
+    generator = make_generator(batch_size=3, budget=budget)
+    generator.response_batch_chain = EchoChain()
+
+    response = generator.generate_final_response(rows(5), {})
+    assert response == "options 1-2\n\noptions 3-4\n\noptions 5-5"
+    # Each batch fits the rows from its offset once; nothing is refitted.
+    assert budget.fitted_rows == 3 + 3 + 1
+
+
+def test_no_batches_when_results_fit_one_call():
+    generator = make_generator(batch_size=5, budget=RowBudget(rows_per_prompt=5))
+    assert generator._batches(rows(5), {}) == []
+
+
+def test_template_mode_never_builds_the_context_budget():
+    generator = make_generator(response_mode="template")
+    response = generator.generate_final_response(rows(2), {"services": ["Ninguno"]})
+    assert response.startswith("**Option 1:**")
+    assert generator._context_budget is None
+
+
+def test_system_prompt_placeholders_are_filled():
+    generator = make_generator(batch_size=2, budget=RowBudget(rows_per_prompt=2))
+    prefs = {"language": "Spanish", "services": ["Ninguno", "Vivienda"]}
+    inputs = generator._batches(rows(4), prefs)[1][2]
+    messages = generator.response_batch_chain.first.format_messages(**inputs)
+    system, human = messages[0].content, messages[1].content
+
+    assert "Generate responses in Spanish" in system
+    assert "**Option [number]:**" in system
+    assert "(requested: Vivienda)" in system
+    assert "{" not in system
+    assert "options 3 to 4" in human
+
+
+class SlowChain:
+    """
+    Batch chain stand-in whose batches after the first take ``delay`` seconds.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.started = []
+
+    def invoke(self, inputs):
+        self.started.append(inputs["first_option"])
+        if inputs["first_option"] > 1:
+            time.sleep(self.delay)
+        return f"options {inputs['first_option']}-{inputs['last_option']}"
+
+
+def test_abandoned_stream_does_not_wait_for_pending_batches():
+    generator = make_generator(batch_size=1, budget=RowBudget(rows_per_prompt=1))
+    generator.max_concurrency = 1
+    generator.response_batch_chain = SlowChain(delay=0.5)
+
+    stream = generator.stream_final_response(rows(6), {})
+    assert next(stream) == "options 1-1\n\n"
+    start = time.perf_counter()
+    stream.close()
+    # At most the batch already running finishes; the queued ones are cancelled.
+    assert time.perf_counter() - start < 1.0
+    time.sleep(0.6)
+    assert len(generator.response_batch_chain.started) <= 2
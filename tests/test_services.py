@@ -0,0 +1,62 @@
+import pytest
+
+from src.rag_helper.services import ServiceVocabulary, parse_services
+from src.utilities.config_parser import load_config
+
+
+@pytest.fixture(scope="module")
+def vocabulary():
+    config = load_config()
+    return ServiceVocabulary(
+        config["wraparound_services"],
+        config["user_preferences"]["valid_options"]["services"],
+        service_bits=config.get("wraparound_service_bits")
+    )
+
+
+@pytest.mark.parametrize("cell, expected", [
+    (None, []),
+    ("", []),
+    ("Housing", ["Housing"]),
+    ("Housing, ESL , Childcare", ["Housing", "ESL", "Childcare"]),
+    ("Housing; ESL;", ["Housing", "ESL"]),
+])
+def test_parse_services(cell, expected):
+    assert parse_services(cell) == expected
+
+
+def test_canonical_maps_any_language(vocabulary):
+    assert vocabulary.canonical("Vivienda") == "Housing"
+    assert vocabulary.canonical("housing") == "Housing"
+    assert vocabulary.canonical("None") is None
+    assert vocabulary.canonical("Ninguno") is None
+
+
+def test_coverage_counts_and_missing_per_agency(vocabulary):
+    agencies = [
+        ["Housing", "Info on gov't benefits"],
+        ["Gov't benefits enrollment"],
+        ["Legal services"],
+    ]
+    covered, missing = vocabulary.coverage(
+        ["Housing", "Government benefits"],
+        [vocabulary.encode(services) for services in agencies]
+    )
+    assert covered.tolist() == [2, 1, 0]
+    assert missing == [[], ["Housing"], ["Housing", "Government benefits"]]
+
+
+def test_coverage_reports_options_as_given(vocabulary):
+    _, missing = vocabulary.coverage(["Vivienda", "Ninguno"], [vocabulary.encode(["ESL"])])
+    assert missing == [["Vivienda"]]
+
+
+def test_coverage_without_service_options(vocabulary):
+    covered, missing = vocabulary.coverage(["None"], [0, 1])
+    assert covered.tolist() == [0, 0]
+    assert missing == [[], []]
+
+
+def test_missing_ignores_unknown_agency_services(vocabulary):
+    assert vocabulary.missing(["Child care"], ["Childcare", "Something new"]) == []
+    assert vocabulary.missing(["Child care"], ["Something new"]) == ["Child care"]
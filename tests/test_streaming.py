@@ -0,0 +1,37 @@
+from src.rag_helper.streaming import iter_option_cards
+
+
+def test_cards_regrouped_across_chunks():
+    chunks = [
+        "Here are your options:\n\n**Opt", "ion 1:**\n- Agency Name: A\n",
+        "- Phone: 1\n\n**Option 2:**\n- Agency", " Name: B\n\n**Option 3:**\n- Agency Name: C",
+    ]
+    assert list(iter_option_cards(chunks)) == [
+        "Here are your options:",
+        "**Option 1:**\n- Agency Name: A\n- Phone: 1",
+        "**Option 2:**\n- Agency Name: B",
+        "**Option 3:**\n- Agency Name: C",
+    ]
+
+
+def test_card_is_yielded_when_the_next_header_arrives():
+    cards = iter_option_cards(iter(["**Option 1:**\n- A\n", "**Option 2:**\n- B"]))
+    assert next(cards) == "**Option 1:**\n- A"
+
+
+def test_localized_headers():
+    chunks = ["**Opción 1:**\n- Nombre: A\n", "**Opción 2:**\n- Nombre: B\n"]
+    assert list(iter_option_cards(chunks)) == [
+        "**Opción 1:**\n- Nombre: A",
+        "**Opción 2:**\n- Nombre: B",
+    ]
+
+
+def test_bold_field_is_not_a_header():
+    chunks = ["**Option 1:**\n- **Note:** call first\n"]
+    assert list(iter_option_cards(chunks)) == ["**Option 1:**\n- **Note:** call first"]
+
+
+def test_empty_stream():
+    assert list(iter_option_cards([])) == []
+    assert list(iter_option_cards(["", "  \n"])) == []